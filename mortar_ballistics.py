@@ -0,0 +1,490 @@
+import csv
+import json
+import os
+import re
+from bisect import bisect_right
+from collections import namedtuple
+
+import numpy as np
+
+# === Firing constraints shared by the GUI and the batch solver ===
+DZ_CORRECTION_FACTOR = 1.5
+# Solutions below this elevation are rejected (min range)
+MIN_ELEVATION_MIL = 748
+# Corrected elevations outside these limits can't be fired
+ELEVATION_LIMITS_MIL = (100, 1600)
+# Dense lookup grids: spacing and memory cap per faction table
+DENSE_RESOLUTION_M = 1.0
+DENSE_MAX_BYTES = 64 * 1024 * 1024
+
+# Arrays returned by FiringSolver.solve, one entry per mortar/target pair.
+# ring is -1 and the float fields are NaN where no ring can reach the target.
+FiringSolutions = namedtuple('FiringSolutions', [
+    'range_m', 'azimuth_mil', 'ring', 'elevation_mil', 'raw_elevation_mil',
+    'tof_s', 'dispersion_m', 'valid',
+])
+
+
+def azimuth_mils(dx_m, dy_m, mils_per_circle=6000):
+    # dy grows downwards (image rows), so north is -dy
+    azimuth_deg = (np.degrees(np.arctan2(dx_m, -dy_m)) + 360) % 360
+    return azimuth_deg / 360 * mils_per_circle
+
+
+# === Grid coordinates ===
+def parse_grid(text):
+    """(x_m, z_m) from a grid reference like "6500 3400" or "02480 03659" (Z is northing)."""
+    parts = text.strip().split()
+    if len(parts) != 2:
+        raise ValueError("Invalid format. Use: 6500 3400 or 02480 03659")
+    x_str, z_str = parts
+    if not (x_str.isdigit() and z_str.isdigit()):
+        raise ValueError("Coordinates must be numeric (meters)")
+    return int(x_str), int(z_str)
+
+
+# === Ballistic tables ===
+# One compact record per CSV row; field names match the CSV headers so a row
+# reads like the old csv.DictReader dicts (row['Range (m)'])
+BALLISTIC_FIELDS = [
+    ('Charge Rings', '<i2'),
+    ('Range (m)', '<i4'),
+    ('Elevation (mil)', '<f8'),
+    ('Time of Flight (sec)', '<f8'),
+    ('Dispersion Radius (m)', '<f8'),
+]
+TABLE_CACHE_DIR = '.ballistics_cache'
+
+
+def ballistic_dtype(shell_chars=1):
+    # 'Shell Type' is a str field sized to the longest name, so names are never truncated
+    return np.dtype([('Shell Type', f'<U{max(1, shell_chars)}')] + BALLISTIC_FIELDS)
+
+
+def is_ballistic_table(table):
+    shell_field = table.dtype.fields.get('Shell Type') if table.dtype.names else None
+    return (shell_field is not None and shell_field[0].kind == 'U'
+            and table.dtype == ballistic_dtype(shell_field[0].itemsize // 4))
+
+
+def is_ballistic_csv(csv_path):
+    """True if the CSV's header has every ballistic column (other CSVs in the tables folder are skipped)."""
+    try:
+        with open(csv_path, newline='', encoding='utf-8') as csvfile:
+            header = next(csv.reader(csvfile), [])
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return False
+    columns = {column.strip() for column in header}
+    return {'Shell Type', *(name for name, _ in BALLISTIC_FIELDS)} <= columns
+
+
+def load_ballistic_table_from_csv(csv_path):
+    # Parse a ballistic CSV into a ballistic_dtype() array, skipping rows that don't parse
+    records = []
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            try:
+                records.append((
+                    row['Shell Type'],
+                    int(row['Charge Rings']),
+                    int(row['Range (m)']),
+                    float(row['Elevation (mil)']),
+                    float(row['Time of Flight (sec)']),
+                    float(row['Dispersion Radius (m)']),
+                ))
+            except Exception:
+                continue
+    return np.array(records, dtype=ballistic_dtype(max((len(r[0]) for r in records), default=1)))
+
+
+def load_ballistic_table(csv_path, cache_dir=None):
+    """Ballistic table for csv_path, from the binary cache when it is up to date.
+
+    The cache is one .npy per CSV, named after the CSV's size and mtime so an
+    edited table is re-parsed automatically. It lives in TABLE_CACHE_DIR next
+    to the CSV unless cache_dir is given; an unwritable cache is skipped.
+    """
+    st = os.stat(csv_path)
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(csv_path)), TABLE_CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    cache_path = os.path.join(cache_dir, f"{stem}-{st.st_size}-{st.st_mtime_ns}.npy")
+    try:
+        table = np.load(cache_path)
+        if is_ballistic_table(table):
+            return table
+    except (OSError, ValueError):
+        pass
+    table = load_ballistic_table_from_csv(csv_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Older versions of this CSV only: <stem>-<size>-<mtime>.npy, not other tables sharing the prefix
+        stale = re.compile(rf"{re.escape(stem)}-\d+-\d+\.npy")
+        for name in os.listdir(cache_dir):
+            if stale.fullmatch(name):
+                os.remove(os.path.join(cache_dir, name))
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, table)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    return table
+
+
+def group_ring_data(table):
+    """Split a ballistic table into ({shell: {ring: rows}}, sorted shell names); rows stay arrays."""
+    ring_data = {}
+    shells = table['Shell Type']
+    rings = table['Charge Rings']
+    for shell in dict.fromkeys(shells.tolist()):
+        shell_rows = table[shells == shell]
+        ring_data[shell] = {int(ring): shell_rows[shell_rows['Charge Rings'] == ring]
+                           for ring in dict.fromkeys(rings[shells == shell].tolist())}
+    return ring_data, sorted(ring_data)
+
+
+def _as_rows(rows):
+    # Accept ballistic_dtype() arrays or legacy lists of row dicts; returns rows sorted by range
+    if not isinstance(rows, np.ndarray):
+        rows = [(row.get('Shell Type', ''), row['Charge Rings'], row['Range (m)'],
+                 row['Elevation (mil)'], row['Time of Flight (sec)'], row['Dispersion Radius (m)'])
+                for row in rows]
+        rows = np.array(rows, dtype=ballistic_dtype(max((len(r[0]) for r in rows), default=1)))
+    return np.sort(rows, order='Range (m)')
+
+
+# === Compiled per-shell tables ===
+class ShellTable:
+    """One shell's rings compiled at load time into sorted range arrays."""
+
+    def __init__(self, rings):
+        # (ring, range list for bisect, elevation list, rows), lowest ring first
+        self.rings = []
+        # (ring, ranges, elevations, tofs, dispersions) as float arrays for batch solving
+        self.arrays = []
+        min_ranges, max_ranges, min_elevs = [], [], []
+        for ring, rows in sorted(rings.items()):
+            rows = _as_rows(rows)
+            if len(rows):
+                min_ranges.append(int(rows['Range (m)'][0]))
+                max_ranges.append(int(rows['Range (m)'][-1]))
+                min_elevs.append(float(rows['Elevation (mil)'].min()))
+            if len(rows) < 2:
+                continue
+            ranges = rows['Range (m)'].astype(np.float64)
+            elevs = rows['Elevation (mil)']
+            self.rings.append((ring, ranges.tolist(), elevs.tolist(), rows))
+            self.arrays.append((ring, ranges, elevs, rows['Time of Flight (sec)'], rows['Dispersion Radius (m)']))
+        self.min_range = min(min_ranges) if min_ranges else None
+        self.max_range = max(max_ranges) if max_ranges else None
+        self.min_elev = min(min_elevs) if min_elevs else None
+
+    def candidates(self, dist_m, dz, dz_correction_factor=DZ_CORRECTION_FACTOR,
+                   min_elevation=MIN_ELEVATION_MIL):
+        """Every ring that can reach dist_m above min_elevation, lowest first, as (ring, (row_a, row_b))."""
+        for ring, ranges, elevs, rows in self.rings:
+            if dist_m < ranges[0] or dist_m > ranges[-1]:
+                continue
+            i = min(bisect_right(ranges, dist_m) - 1, len(ranges) - 2)
+            ratio = (dist_m - ranges[i]) / (ranges[i + 1] - ranges[i])
+            elev = elevs[i] + ratio * (elevs[i + 1] - elevs[i])
+            if elev + dz * dz_correction_factor >= min_elevation:
+                yield ring, (rows[i], rows[i + 1])
+
+    def best_ring(self, dist_m, dz, dz_correction_factor=DZ_CORRECTION_FACTOR,
+                  min_elevation=MIN_ELEVATION_MIL):
+        """Lowest ring whose bracket covers dist_m above min_elevation.
+
+        Returns (ring, (row_a, row_b)) or (None, None), like MortarApp.get_best_ring.
+        """
+        return next(self.candidates(dist_m, dz, dz_correction_factor, min_elevation), (None, None))
+
+    def bracket(self, ring, dist_m):
+        """The (row_a, row_b) of ring around dist_m, or None outside its range."""
+        for r, ranges, _, rows in self.rings:
+            if r == ring and ranges[0] <= dist_m <= ranges[-1]:
+                i = min(bisect_right(ranges, dist_m) - 1, len(ranges) - 2)
+                return rows[i], rows[i + 1]
+        return None
+
+
+def interpolate_entry(entry, dist_m):
+    # (elevation, tof, dispersion) between the two bracketing rows of a ring
+    a, b = entry
+    ratio = (dist_m - a['Range (m)']) / (b['Range (m)'] - a['Range (m)'])
+    elev = a['Elevation (mil)'] + ratio * (b['Elevation (mil)'] - a['Elevation (mil)'])
+    tof = a['Time of Flight (sec)'] + ratio * (b['Time of Flight (sec)'] - a['Time of Flight (sec)'])
+    disp = a['Dispersion Radius (m)'] + ratio * (b['Dispersion Radius (m)'] - a['Dispersion Radius (m)'])
+    return elev, tof, disp
+
+
+def compile_ring_data(ring_data):
+    # {shell: {ring: rows}} -> {shell: ShellTable}
+    return {shell: ShellTable(rings) for shell, rings in ring_data.items()}
+
+
+# === Dense precomputed lookup grids ===
+class DenseShellTable:
+    """A ShellTable resampled onto a fixed range grid.
+
+    A lookup is one index per ring plus the dz correction. Values are taken at
+    the nearest grid point, so they differ from the linear interpolation in
+    ShellTable by at most self.tolerance (half a grid step times the steepest
+    slope in the table, per quantity).
+    """
+
+    def __init__(self, shell_table, resolution_m=DENSE_RESOLUTION_M):
+        self.resolution_m = resolution_m
+        self.start = float(shell_table.min_range or 0)
+        stop = float(shell_table.max_range or 0)
+        self.size = int((stop - self.start) // resolution_m) + 1
+        grid = self.start + np.arange(self.size) * resolution_m
+        # (ring, min range, max range, elevations, tofs, dispersions), lowest ring first
+        self.rings = []
+        self.tolerance = {'elevation_mil': 0.0, 'tof_s': 0.0, 'dispersion_m': 0.0}
+        self.nbytes = 0
+        for ring, ranges, elevs, tofs, disps in shell_table.arrays:
+            columns = []
+            for key, values in (('elevation_mil', elevs), ('tof_s', tofs), ('dispersion_m', disps)):
+                column = np.interp(grid, ranges, values, left=np.nan, right=np.nan).astype(np.float32)
+                slope = np.abs(np.diff(values) / np.diff(ranges)).max()
+                error = slope * resolution_m / 2 + np.abs(values).max() * np.finfo(np.float32).eps
+                self.tolerance[key] = max(self.tolerance[key], float(error))
+                self.nbytes += column.nbytes
+                columns.append(column)
+            self.rings.append((ring, ranges[0], ranges[-1], *columns))
+
+    @staticmethod
+    def estimate_nbytes(shell_table, resolution_m=DENSE_RESOLUTION_M):
+        if shell_table.min_range is None:
+            return 0
+        size = int((shell_table.max_range - shell_table.min_range) // resolution_m) + 1
+        return size * len(shell_table.arrays) * 3 * np.dtype(np.float32).itemsize
+
+    def candidates(self, dist_m, dz, dz_correction_factor=DZ_CORRECTION_FACTOR,
+                   min_elevation=MIN_ELEVATION_MIL):
+        """Every ring that can reach dist_m above min_elevation, lowest first, as (ring, raw elevation, tof, dispersion)."""
+        i = int(round((dist_m - self.start) / self.resolution_m))
+        if i < 0 or i >= self.size:
+            return
+        for ring, lo, hi, elevs, tofs, disps in self.rings:
+            if lo <= dist_m <= hi and elevs[i] + dz * dz_correction_factor >= min_elevation:
+                yield ring, float(elevs[i]), float(tofs[i]), float(disps[i])
+
+    def lookup(self, dist_m, dz, dz_correction_factor=DZ_CORRECTION_FACTOR,
+               min_elevation=MIN_ELEVATION_MIL):
+        """Scalar lookup: (ring, raw elevation, tof, dispersion) or None."""
+        return next(self.candidates(dist_m, dz, dz_correction_factor, min_elevation), None)
+
+    def values(self, ring, dist_m):
+        """Scalar (raw elevation, tof, dispersion) for a given ring, or None outside its range."""
+        i = int(round((dist_m - self.start) / self.resolution_m))
+        if i < 0 or i >= self.size:
+            return None
+        for r, lo, hi, elevs, tofs, disps in self.rings:
+            if r == ring and lo <= dist_m <= hi:
+                return float(elevs[i]), float(tofs[i]), float(disps[i])
+        return None
+
+    def solve_range(self, dist_m, dz=0.0, dz_correction_factor=DZ_CORRECTION_FACTOR,
+                    min_elevation=MIN_ELEVATION_MIL):
+        # Same outputs as FiringSolver.solve_range
+        dist_m = np.asarray(dist_m, dtype=np.float64)
+        dz = np.broadcast_to(np.asarray(dz, dtype=np.float64), dist_m.shape)
+        ring_out = np.full(dist_m.shape, -1, dtype=np.int32)
+        elev_out = np.full(dist_m.shape, np.nan)
+        raw_out = np.full(dist_m.shape, np.nan)
+        tof_out = np.full(dist_m.shape, np.nan)
+        disp_out = np.full(dist_m.shape, np.nan)
+        i = np.clip(np.rint((dist_m - self.start) / self.resolution_m), 0, self.size - 1).astype(np.intp)
+        for ring, lo, hi, elevs, tofs, disps in self.rings:
+            elev = elevs[i].astype(np.float64)
+            corrected = elev + dz * dz_correction_factor
+            take = (ring_out < 0) & (dist_m >= lo) & (dist_m <= hi) & (corrected >= min_elevation)
+            if not take.any():
+                continue
+            ring_out[take] = ring
+            raw_out[take] = elev[take]
+            elev_out[take] = corrected[take]
+            tof_out[take] = tofs[i][take]
+            disp_out[take] = disps[i][take]
+        return ring_out, elev_out, raw_out, tof_out, disp_out
+
+
+def compile_dense_tables(compiled, resolution_m=DENSE_RESOLUTION_M, max_bytes=DENSE_MAX_BYTES):
+    """{shell: ShellTable} -> {shell: DenseShellTable}.
+
+    Raises MemoryError before allocating anything if the grids would exceed max_bytes.
+    """
+    needed = sum(DenseShellTable.estimate_nbytes(t, resolution_m) for t in compiled.values())
+    if max_bytes is not None and needed > max_bytes:
+        raise MemoryError(f"Dense tables need {needed / 1e6:.1f} MB (limit {max_bytes / 1e6:.1f} MB)")
+    return {shell: DenseShellTable(table, resolution_m) for shell, table in compiled.items()}
+
+
+# === Headless, vectorized firing solutions ===
+class FiringSolver:
+    """Batch firing solutions for one faction/shell.
+
+    ring_data is either a faction's {shell: {ring: rows}} (MortarApp.ring_data)
+    or its compiled {shell: ShellTable}. Pass a DenseShellTable as dense to
+    answer from the precomputed grid instead of interpolating.
+    """
+
+    def __init__(self, ring_data, shell, mils_per_circle=6000,
+                 dz_correction_factor=DZ_CORRECTION_FACTOR, min_elevation=MIN_ELEVATION_MIL,
+                 elevation_limits=ELEVATION_LIMITS_MIL, dense=None):
+        self.shell = shell
+        self.mils_per_circle = mils_per_circle
+        self.dz_correction_factor = dz_correction_factor
+        self.min_elevation = min_elevation
+        self.elevation_limits = elevation_limits
+        table = ring_data.get(shell, {})
+        if not isinstance(table, ShellTable):
+            table = ShellTable(table)
+        self.table = table
+        self.rings = table.arrays
+        self.dense = dense
+
+    def solve_range(self, dist_m, dz=0.0):
+        """Pick the lowest ring reaching each distance; returns ring, elevations, TOF, dispersion."""
+        if self.dense is not None:
+            return self.dense.solve_range(dist_m, dz, self.dz_correction_factor, self.min_elevation)
+        dist_m = np.asarray(dist_m, dtype=np.float64)
+        dz = np.broadcast_to(np.asarray(dz, dtype=np.float64), dist_m.shape)
+        ring_out = np.full(dist_m.shape, -1, dtype=np.int32)
+        elev_out = np.full(dist_m.shape, np.nan)
+        raw_out = np.full(dist_m.shape, np.nan)
+        tof_out = np.full(dist_m.shape, np.nan)
+        disp_out = np.full(dist_m.shape, np.nan)
+        for ring, ranges, elevs, tofs, disps in self.rings:
+            # Bracket [a, b] with a <= dist <= b, clamped so the last row is inclusive
+            i = np.clip(np.searchsorted(ranges, dist_m, side='right') - 1, 0, len(ranges) - 2)
+            a_r, b_r = ranges[i], ranges[i + 1]
+            ratio = (dist_m - a_r) / (b_r - a_r)
+            elev = elevs[i] + ratio * (elevs[i + 1] - elevs[i])
+            corrected = elev + dz * self.dz_correction_factor
+            take = ((ring_out < 0) & (dist_m >= ranges[0]) & (dist_m <= ranges[-1])
+                    & (corrected >= self.min_elevation))
+            if not take.any():
+                continue
+            ring_out[take] = ring
+            raw_out[take] = elev[take]
+            elev_out[take] = corrected[take]
+            tof_out[take] = (tofs[i] + ratio * (tofs[i + 1] - tofs[i]))[take]
+            disp_out[take] = (disps[i] + ratio * (disps[i + 1] - disps[i]))[take]
+        return ring_out, elev_out, raw_out, tof_out, disp_out
+
+    def solve(self, mortar_xy, target_xy, mortar_z=0.0, target_z=0.0, m_per_px=1.0):
+        """Solve every mortar/target pair at once.
+
+        Coordinates are (N, 2) arrays (or a single pair broadcast against the
+        other) in map pixels with y pointing down, as MortarApp stores them.
+        Pass m_per_px=1.0 for coordinates already in meters.
+        """
+        mortar_xy = np.asarray(mortar_xy, dtype=np.float64)
+        target_xy = np.asarray(target_xy, dtype=np.float64)
+        dx_m = (target_xy[..., 0] - mortar_xy[..., 0]) * m_per_px
+        dy_m = (target_xy[..., 1] - mortar_xy[..., 1]) * m_per_px
+        dist_m = np.hypot(dx_m, dy_m)
+        dz = np.asarray(target_z, dtype=np.float64) - np.asarray(mortar_z, dtype=np.float64)
+        dz = np.broadcast_to(dz, dist_m.shape)
+        ring, elev, raw, tof, disp = self.solve_range(dist_m, dz)
+        lo, hi = self.elevation_limits
+        valid = (ring >= 0) & (elev >= lo) & (elev <= hi)
+        return FiringSolutions(
+            range_m=dist_m,
+            azimuth_mil=azimuth_mils(dx_m, dy_m, self.mils_per_circle),
+            ring=ring,
+            elevation_mil=elev,
+            raw_elevation_mil=raw,
+            tof_s=tof,
+            dispersion_m=disp,
+            valid=valid,
+        )
+
+
+# === Weapon table registry ===
+# Tables are discovered as <name>.csv in TABLES_DIR; CSVs whose header lacks the
+# ballistic columns are ignored. An optional <name>.json next to each one sets
+# its metadata (keys below). Missing keys use these defaults.
+TABLES_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_METADATA_DEFAULTS = {
+    'name': None,
+    'order': 100,
+    'mils_per_circle': 6000,
+    'dz_correction_factor': DZ_CORRECTION_FACTOR,
+    'min_elevation_mil': MIN_ELEVATION_MIL,
+    'elevation_limits_mil': list(ELEVATION_LIMITS_MIL),
+}
+
+
+class WeaponTable:
+    """A ballistic table file plus its metadata; rows are loaded and compiled on first use."""
+
+    def __init__(self, path, name=None, order=100, mils_per_circle=6000,
+                 dz_correction_factor=DZ_CORRECTION_FACTOR, min_elevation_mil=MIN_ELEVATION_MIL,
+                 elevation_limits_mil=ELEVATION_LIMITS_MIL):
+        self.path = path
+        self.name = name or os.path.splitext(os.path.basename(path))[0]
+        self.order = order
+        self.mils_per_circle = mils_per_circle
+        self.dz_correction_factor = dz_correction_factor
+        self.min_elevation_mil = min_elevation_mil
+        self.elevation_limits_mil = tuple(elevation_limits_mil)
+        self.table = None
+        self.ring_data = None
+        self.shell_types = None
+        self.compiled = None
+
+    @classmethod
+    def from_file(cls, csv_path):
+        metadata = dict(TABLE_METADATA_DEFAULTS)
+        json_path = os.path.splitext(csv_path)[0] + '.json'
+        if os.path.exists(json_path):
+            with open(json_path, encoding='utf-8') as f:
+                metadata.update(json.load(f))
+        return cls(csv_path, **{key: metadata[key] for key in TABLE_METADATA_DEFAULTS})
+
+    @property
+    def loaded(self):
+        return self.table is not None
+
+    def load(self):
+        if self.table is None:
+            self.table = load_ballistic_table(self.path)
+            self.ring_data, self.shell_types = group_ring_data(self.table)
+            self.compiled = compile_ring_data(self.ring_data)
+        return self
+
+    def solver(self, shell, dense=None):
+        self.load()
+        return FiringSolver(self.compiled, shell, self.mils_per_circle, self.dz_correction_factor,
+                            self.min_elevation_mil, self.elevation_limits_mil, dense=dense)
+
+
+class TableRegistry:
+    """Every weapon table in a directory, by faction/weapon name; nothing is parsed until get()."""
+
+    def __init__(self, tables_dir=TABLES_DIR):
+        self.tables_dir = tables_dir
+        self.tables = {}
+        self.discover()
+
+    def discover(self):
+        found = []
+        for filename in sorted(os.listdir(self.tables_dir)):
+            path = os.path.join(self.tables_dir, filename)
+            if filename.lower().endswith('.csv') and is_ballistic_csv(path):
+                found.append(WeaponTable.from_file(path))
+        found.sort(key=lambda t: (t.order, t.name))
+        self.tables = {t.name: t for t in found}
+        return self
+
+    def names(self):
+        return list(self.tables)
+
+    def get(self, name):
+        """Loaded WeaponTable for name (KeyError if unknown)."""
+        return self.tables[name].load()
@@ -0,0 +1,263 @@
+"""Benchmarks for the solver, rendering and loading hot paths; no display needed.
+
+    python mortar_bench.py run --output bench.json              # 1k, 4k, 8k and 16k maps
+    python mortar_bench.py run --sizes 1024 4096 --output bench.json
+    python mortar_bench.py compare baseline.json bench.json     # exit code 1 on regressions
+
+Synthetic maps and heightmaps are generated once per size (fixed seed) into
+--data-dir and reused. Redraws go through the same Tk-free pieces the GUI's
+render_map uses (TiledMap.get_region, OverlayLayer); only the final
+PhotoImage/canvas step is left out.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from mortar_ballistics import (TableRegistry, compile_dense_tables, compile_ring_data, group_ring_data,
+                               interpolate_entry, load_ballistic_table)
+from mortar_loader import MapLoadJob
+from mortar_render import OverlayLayer, viewport_region
+from mortar_terrain import HEIGHTMAP_CACHE_DIR
+
+BENCH_SIZES = (1024, 4096, 8192, 16384)
+BENCH_DATA_DIR = '.bench_data'
+# A result is a regression when its median is this much slower than the baseline's
+REGRESSION_THRESHOLD = 0.10
+# Canvas size used for redraw sequences
+VIEW_W, VIEW_H = 1280, 800
+BATCH_PAIRS = 1000000
+SEED = 1234
+
+
+def measure(fn, repeat=5, warmup=1):
+    """Run fn repeat times after warmup runs; timing stats in seconds."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {'median_s': times[len(times) // 2], 'min_s': times[0], 'max_s': times[-1], 'runs': repeat}
+
+
+def frame_stats(times):
+    times = sorted(times)
+    return {'median_s': times[len(times) // 2], 'min_s': times[0], 'max_s': times[-1],
+            'p95_s': times[min(len(times) - 1, int(0.95 * len(times)))], 'runs': len(times)}
+
+
+# === Synthetic data ===
+def synthetic_project(size, data_dir=BENCH_DATA_DIR):
+    """Folder with map.png (size x size RGB) and heightmap.png (16-bit), generated once."""
+    folder = os.path.join(data_dir, f"project-{size}")
+    map_path = os.path.join(folder, "map.png")
+    heightmap_path = os.path.join(folder, "heightmap.png")
+    if os.path.exists(map_path) and os.path.exists(heightmap_path):
+        return folder
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(SEED)
+    # Smooth terrain at low resolution, upscaled: realistic PNG sizes without gigabytes of float math
+    n = max(64, size // 16)
+    y, x = np.mgrid[0:n, 0:n] / n
+    terrain = sum(np.sin(2 * np.pi * (fx * x + fy * y) + phase) / (fx + fy)
+                  for fx, fy, phase in rng.uniform((1, 1, 0), (8, 8, 6.28), (12, 3)))
+    terrain = (terrain - terrain.min()) / np.ptp(terrain)
+    Image.fromarray((terrain * 65535).astype(np.uint16)).resize(
+        (min(size, 2048),) * 2, Image.BILINEAR).save(heightmap_path)
+    colors = np.stack([60 + 120 * terrain, 90 + 110 * (1 - terrain), 50 + 60 * terrain], axis=-1)
+    noise = rng.integers(0, 24, (n, n, 3))
+    img = Image.fromarray(np.clip(colors + noise, 0, 255).astype(np.uint8), "RGB").resize((size, size), Image.BILINEAR)
+    img.save(map_path, compress_level=1)
+    return folder
+
+
+# === Benchmarks ===
+def bench_tables(results, registry):
+    weapon = next(iter(registry.tables.values()))
+    tmp = tempfile.mkdtemp(prefix="bench-tables-")
+    try:
+        results['tables.load_csv'] = measure(lambda: load_ballistic_table(weapon.path, cache_dir=tempfile.mkdtemp(dir=tmp)))
+        load_ballistic_table(weapon.path, cache_dir=tmp)
+        results['tables.load_cached'] = measure(lambda: load_ballistic_table(weapon.path, cache_dir=tmp), repeat=20)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    table = load_ballistic_table(weapon.path)
+    results['tables.compile'] = measure(lambda: compile_ring_data(group_ring_data(table)[0]), repeat=10)
+
+
+def bench_solver(results, registry):
+    weapon = registry.get(registry.names()[0])
+    shell = weapon.shell_types[0]
+    shell_table = weapon.compiled[shell]
+    rng = np.random.default_rng(SEED)
+    dists = rng.uniform(0, shell_table.max_range * 1.1, 10000).tolist()
+    dzs = rng.uniform(-100, 100, 10000).tolist()
+
+    def single():
+        for dist_m, dz in zip(dists, dzs):
+            ring, entry = shell_table.best_ring(dist_m, dz, weapon.dz_correction_factor, weapon.min_elevation_mil)
+            if entry is not None:
+                interpolate_entry(entry, dist_m)
+    results['solve.single_10k'] = measure(single)
+    mortars = rng.uniform(0, 5000, (BATCH_PAIRS, 2))
+    targets = mortars + rng.uniform(-2000, 2000, (BATCH_PAIRS, 2))
+    mortar_z = rng.uniform(0, 300, BATCH_PAIRS)
+    target_z = rng.uniform(0, 300, BATCH_PAIRS)
+    solver = weapon.solver(shell)
+    results['solve.batch_1m'] = measure(lambda: solver.solve(mortars, targets, mortar_z, target_z), repeat=3)
+    dense = weapon.solver(shell, compile_dense_tables(weapon.compiled)[shell])
+    results['solve.batch_1m_dense'] = measure(lambda: dense.solve(mortars, targets, mortar_z, target_z), repeat=3)
+
+
+def load_project(folder, tile_cache_bytes=None):
+    # Runs MapLoadJob to completion the way the GUI's poller consumes it; returns (map, heightmap)
+    kwargs = {} if tile_cache_bytes is None else {'tile_cache_bytes': tile_cache_bytes}
+    job = MapLoadJob(os.path.join(folder, "map.png"), os.path.join(folder, "heightmap.png"), **kwargs).start()
+    map_store = heightmap = None
+    while True:
+        kind, value = job.messages.get()
+        if kind == 'map':
+            map_store = value
+        elif kind == 'heightmap':
+            heightmap = value
+        elif kind == 'error':
+            raise RuntimeError(value)
+        elif kind in ('done', 'cancelled'):
+            return map_store, heightmap
+
+
+def redraw_sequence(map_store, size, steps=40):
+    """Zoom in towards the center, then pan across; per-frame render times."""
+    overlay = OverlayLayer()
+    times = []
+    center = size / 2
+    mortar = (center, center)
+    circles_m = ((2300, (0, 0, 255, 38)), (748, (255, 128, 0, 38)))
+    m_per_px = 10240 / size
+    for step in range(steps):
+        if step < steps // 2:
+            scale = 1024 / size * (1.08 ** step)
+            view_x = center * scale - VIEW_W / 2
+            view_y = center * scale - VIEW_H / 2
+        else:
+            view_x += VIEW_W / 8
+            view_y += VIEW_H / 16
+        w, h = int(size * scale), int(size * scale)
+        start = time.perf_counter()
+        region = viewport_region(max(0, view_x), max(0, view_y), VIEW_W, VIEW_H, w, h)
+        mx, my = int(mortar[0] * scale) - region[0], int(mortar[1] * scale) - region[1]
+        circles = [(mx, my, int(r / m_per_px * scale), fill) for r, fill in circles_m]
+        overlay.update((region, w, h), lambda: map_store.get_region(w, h, region), circles)
+        overlay.set_dispersion((mx + 200, my + 100, int(20 / m_per_px * scale), (255, 255, 255, 60)))
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_maps(results, sizes, data_dir):
+    for size in sizes:
+        label = f"{size // 1024}k"
+        folder = synthetic_project(size, data_dir)
+        tiles = os.path.join(folder, ".map_tiles")
+        heightmap_cache = os.path.join(folder, HEIGHTMAP_CACHE_DIR)
+
+        def cold():
+            shutil.rmtree(tiles, ignore_errors=True)
+            shutil.rmtree(heightmap_cache, ignore_errors=True)
+            load_project(folder)
+        results[f'load.project_cold_{label}'] = measure(cold, repeat=1 if size >= 8192 else 3, warmup=0)
+        results[f'load.project_warm_{label}'] = measure(lambda: load_project(folder), repeat=5)
+        map_store, heightmap = load_project(folder)
+        frames = redraw_sequence(map_store, size)
+        results[f'render.zoom_pan_{label}'] = frame_stats(frames)
+        rng = np.random.default_rng(SEED)
+        px, py = rng.uniform(0, size, (2, 10000))
+        results[f'terrain.sample_scalar_1k_{label}'] = measure(
+            lambda: [heightmap.sample(x, y, size, size) for x, y in zip(px[:1000], py[:1000])] and None)
+        results[f'terrain.sample_batch_10k_{label}'] = measure(lambda: heightmap.sample(px, py, size, size), repeat=20)
+        del map_store, heightmap
+
+
+def run(args):
+    registry = TableRegistry(args.tables_dir) if args.tables_dir else TableRegistry()
+    results = {}
+    started = time.time()
+    bench_tables(results, registry)
+    bench_solver(results, registry)
+    bench_maps(results, args.sizes, args.data_dir)
+    report = {
+        'meta': {'timestamp': started, 'python': platform.python_version(), 'numpy': np.__version__,
+                 'pillow': Image.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count(),
+                 'sizes': list(args.sizes)},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+    return 0
+
+
+def compare(baseline, current):
+    """[(name, baseline_s, current_s, change)] per shared result, change = current/baseline - 1."""
+    rows = []
+    for name, base in sorted(baseline['results'].items()):
+        cur = current['results'].get(name)
+        if cur is None:
+            continue
+        change = cur['median_s'] / base['median_s'] - 1 if base['median_s'] > 0 else math.inf
+        rows.append((name, base['median_s'], cur['median_s'], change))
+    return rows
+
+
+def run_compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    regressions = 0
+    for name, base_s, cur_s, change in compare(baseline, current):
+        flag = ''
+        if change > args.threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif change < -args.threshold:
+            flag = '  faster'
+        print(f"{name:40s} {base_s * 1000:10.2f} ms -> {cur_s * 1000:10.2f} ms  {change * 100:+6.1f}%{flag}")
+    missing = sorted(set(baseline['results']) - set(current['results']))
+    if missing:
+        print(f"Not in current run: {', '.join(missing)}")
+    print(f"{regressions} regression(s) over {args.threshold * 100:.0f}%")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the mortar calculator's hot paths.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help='run the benchmarks and print/write JSON results')
+    p_run.add_argument('--sizes', nargs='+', type=int, default=list(BENCH_SIZES), help='synthetic map sizes (px)')
+    p_run.add_argument('--data-dir', default=BENCH_DATA_DIR, help='where synthetic maps are generated and kept')
+    p_run.add_argument('--tables-dir', help='folder of ballistic table CSVs')
+    p_run.add_argument('--output', help='write the JSON report here')
+    p_cmp = sub.add_parser('compare', help='compare two JSON reports and flag regressions')
+    p_cmp.add_argument('baseline')
+    p_cmp.add_argument('current')
+    p_cmp.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                       help='relative slowdown that counts as a regression (default 0.10)')
+    args = parser.parse_args(argv)
+    return run(args) if args.command == 'run' else run_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
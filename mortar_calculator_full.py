@@ -1,28 +1,45 @@
 import tkinter as tk
+import tkinter.font as tkfont
 from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 import math
+import numpy as np
 import os
+import queue
 import re
-import csv
-
-# === Load Ballistic Table from CSV ===
-def load_ballistic_table_from_csv(csv_path):
-    table = []
-    with open(csv_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            # Parse numeric fields
-            try:
-                row['Charge Rings'] = int(row['Charge Rings'])
-                row['Range (m)'] = int(row['Range (m)'])
-                row['Elevation (mil)'] = float(row['Elevation (mil)'])
-                row['Time of Flight (sec)'] = float(row['Time of Flight (sec)'])
-                row['Dispersion Radius (m)'] = float(row['Dispersion Radius (m)'])
-            except Exception:
-                continue
-            table.append(row)
-    return table
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from mortar_ballistics import TableRegistry, compile_dense_tables, interpolate_entry, parse_grid
+from mortar_hits import HitProbabilityCache, rounds_for_confidence
+from mortar_loader import MapLoadJob
+from mortar_planner import plan_fire_mission
+from mortar_profile import Profiler
+from mortar_reachability import REACH_CELL_M, REACH_MODES, ReachabilityJob, solve_tile
+from mortar_render import TILE_CACHE_BYTES, ZOOM_CACHE_BYTES, OverlayLayer, raster_region, viewport_region
+from mortar_terrain import HEIGHTMAP_EXTENSIONS, MAX_ELEVATION_M, MIN_ELEVATION_M, find_obstruction
+
+# Quiet time (ms) after the last zoom/resize event before the full-quality redraw
+REDRAW_DEBOUNCE_MS = 150
+
+# Reachability heat map: poll interval for finished tiles and how many jobs to keep
+REACH_POLL_MS = 50
+REACH_CACHE_SIZE = 8
+
+# How often the Tk thread checks the background map loader for results
+LOAD_POLL_MS = 50
+
+# Hover tooltip refresh cap, and how many per-event timings to keep for hover_stats()
+HOVER_FPS = 30
+HOVER_TIMING_SAMPLES = 1000
+# Measured text widths kept (LRU); hover and HUD text changes with every move, so it's bounded
+TEXT_WIDTH_CACHE_SIZE = 256
+
+# Performance HUD (F3) refresh interval, and the order stages are listed in
+HUD_REFRESH_MS = 250
+HUD_STAGES = ('frame', 'preview', 'render_map', 'resize', 'overlay', 'composite', 'photoimage', 'draw_grid',
+              'draw_markers', 'calculate', 'draw_input_options', 'get_elevation', 'load_poll', 'load_preview', 'load')
 
 # Dispersion radius per ring (meters)
 dispersion_radius = {0: 8, 1: 13, 2: 19, 3: 27, 4: 34}
@@ -34,63 +51,169 @@ class MortarApp:
         self.display_scale = 0.5
         self.mortar = None
         self.target = None
+        # Fire mission planner: extra tubes/targets (map px), the plan is recomputed when they change
+        self.plan_mortars = []
+        self.plan_targets = []
+        self._fire_plan_cache = (None, None)
+        self._plan_items = {'tube': [], 'target': [], 'line': []}
+        self._plan_fills = {}
+        # Hit probability for the target area: Alt+click polygon (map px), else a circle of hit_radius_m
+        self.hit_radius_m = 25.0
+        self.target_polygon = []
+        self._area_item = None
+        # hit_estimator.samples trades accuracy for latency on the first query per dispersion/area
+        self.hit_estimator = HitProbabilityCache()
+        # Hover tooltip: solution under the cursor, at most HOVER_FPS updates/s, never redraws the map
+        self.hover_enabled = False
+        self._hover_xy = None
+        self._hover_job = None
+        self._hover_last = 0.0
+        self._hover_items = None
+        self._hover_text = None
+        self.hover_timings = deque(maxlen=HOVER_TIMING_SAMPLES)
         self.map_width_px = None
         self.map_height_px = None
         self.m_per_px = 1
-        self.heightmap_image = None
-        self.max_elevation_m = 512
-        self.original_img = None
+        # mortar_terrain.Heightmap; image heightmaps span min..max elevation
+        self.heightmap = None
+        self.min_elevation_m = MIN_ELEVATION_M
+        self.max_elevation_m = MAX_ELEVATION_M
+        # Check the shell's arc against the heightmap and fall back to higher rings if blocked
+        self.clearance_check = True
+        self._firing_ring_cache = (None, None)
+        self._obstruction_item = None
+        # Reachability heat map (None, 'ring' or 'elevation'), cached per mortar/shell/faction
+        self.reach_mode = None
+        self.reach_cell_m = REACH_CELL_M
+        self.reach_jobs = OrderedDict()
+        self._reach_job = None
+        self._reach_pending = []
+        self._reach_executor = None
+        self._reach_poll_job = None
+        # mortar_render.TiledMap: the map's zoom levels on disk, read through an LRU of tiles
+        # capped at map_tile_cache_bytes (a MapPyramid while only the preview is loaded)
+        self.map_pyramid = None
+        self.zoom_cache_bytes = ZOOM_CACHE_BYTES
+        self.map_tile_cache_bytes = TILE_CACHE_BYTES
+        # Background loading (mortar_loader.MapLoadJob): one independent job per kind, 'map' and 'heightmap'
+        self._load_jobs = {}
+        self._load_poll_job = None
+        # Render only the visible canvas window (plus a margin) instead of the whole scaled map
+        self.viewport_rendering = True
+        self._rendered_region = None
+        # Opt-in stage timings (mortar_profile.Profiler), shown by the F3 HUD and dumped with F4
+        self.profiler = Profiler()
+        self._hud_items = None
+        self._hud_job = None
+        self._load_started = None
+        # Map region with range circles composited in, rebuilt only when its inputs change
+        self.overlay_layer = OverlayLayer(self.profiler)
+        # Coalesced redraws: a NEAREST preview on idle, then a full pass once input settles
+        self.redraw_debounce_ms = REDRAW_DEBOUNCE_MS
+        self._preview_job = None
+        self._refine_job = None
+        self._preview_shown = False
+        # Retained canvas scene: items are created once and moved with coords/itemconfig
+        self._item_coords = {}
+        self._grid_items = []
+        self._grid_key = None
+        self._marker_items = None
+        self._inputbox_built = False
+        self._shell_menu_types = None
+        self._calc_items = None
+        self._calc_text = None
+        self._text_widths = OrderedDict()
         self.tk_img = None
+        self._map_item = None
         self.layer_entities = []
-        # Ballistics tables for both Russian and NATO
-        self.ballistic_tables = {'Russian': [], 'NATO': []}
-        self.ring_data = {'Russian': {}, 'NATO': {}}
-        self.shell_types = {'Russian': [], 'NATO': []}
+        # Every <name>.csv (+ optional <name>.json metadata) next to this script; each
+        # table is parsed and compiled the first time it's selected
+        self.table_registry = TableRegistry()
+        self._best_ring_cache = (None, None)
+        # Optional "compiled" mode (Tables: Dense button): 1 m lookup grids built on first use,
+        # {table: {shell: DenseShellTable}}; calculate, hover and the heat map read from them
+        self.use_dense_tables = False
+        self.dense_tables = {}
         self.selected_shell_type = tk.StringVar()
-        self.selected_table = tk.StringVar(value='Russian')
+        self.selected_table = tk.StringVar(value=next(iter(self.table_registry.names()), ''))
         self.load_all_ballistics()
         self._build_gui()
 
     def load_all_ballistics(self):
-        # Load Russian table
-        ru_path = os.path.join(os.path.dirname(__file__), 'rutable.csv')
-        nato_path = os.path.join(os.path.dirname(__file__), 'natotable.csv')
-        if os.path.exists(ru_path):
-            self.ballistic_tables['Russian'] = load_ballistic_table_from_csv(ru_path)
-            self.ring_data['Russian'] = {}
-            shell_types = set()
-            for row in self.ballistic_tables['Russian']:
-                shell = row['Shell Type']
-                ring = row['Charge Rings']
-                shell_types.add(shell)
-                self.ring_data['Russian'].setdefault(shell, {})
-                self.ring_data['Russian'][shell].setdefault(ring, []).append(row)
-            self.shell_types['Russian'] = sorted(shell_types)
-        if os.path.exists(nato_path):
-            self.ballistic_tables['NATO'] = load_ballistic_table_from_csv(nato_path)
-            self.ring_data['NATO'] = {}
-            shell_types = set()
-            for row in self.ballistic_tables['NATO']:
-                shell = row['Shell Type']
-                ring = row['Charge Rings']
-                shell_types.add(shell)
-                self.ring_data['NATO'].setdefault(shell, {})
-                self.ring_data['NATO'][shell].setdefault(ring, []).append(row)
-            self.shell_types['NATO'] = sorted(shell_types)
+        # Rescan the tables folder; only the selected table is loaded (from the binary cache when the CSV hasn't changed)
+        self.table_registry.discover()
+        self.dense_tables.clear()
+        self._best_ring_cache = (None, None)
+        self._firing_ring_cache = (None, None)
+        weapon = self.get_weapon_table()
         # Set default shell type
-        if self.shell_types['Russian']:
-            self.selected_shell_type.set(self.shell_types['Russian'][0])
+        if weapon is not None and weapon.shell_types:
+            self.selected_shell_type.set(weapon.shell_types[0])
 
     def get_current_table(self):
-        return self.selected_table.get() if self.selected_table.get() in self.ballistic_tables else 'Russian'
+        names = self.table_registry.names()
+        if self.selected_table.get() in self.table_registry.tables or not names:
+            return self.selected_table.get()
+        return names[0]
+
+    def get_weapon_table(self, table=None):
+        # Loaded WeaponTable (rows, compiled shells, mils/dz/elevation metadata), or None if there is none
+        table = table or self.get_current_table()
+        if table not in self.table_registry.tables:
+            return None
+        return self.table_registry.get(table)
 
     def get_current_shell_types(self):
-        table = self.get_current_table()
-        return self.shell_types[table]
+        weapon = self.get_weapon_table()
+        return weapon.shell_types if weapon is not None else []
 
     def get_current_ring_data(self):
-        table = self.get_current_table()
-        return self.ring_data[table]
+        weapon = self.get_weapon_table()
+        return weapon.ring_data if weapon is not None else {}
+
+    def get_current_shell(self):
+        shell_types = self.get_current_shell_types()
+        return self.selected_shell_type.get() if self.selected_shell_type.get() else (shell_types[0] if shell_types else "HE")
+
+    def get_current_shell_table(self):
+        # Compiled ShellTable for the selected faction/shell, or None
+        weapon = self.get_weapon_table()
+        return weapon.compiled.get(self.get_current_shell()) if weapon is not None else None
+
+    def get_dense_tables(self, table=None):
+        # Build the dense grids for a faction on first use; None if over the memory cap
+        table = table or self.get_current_table()
+        if table not in self.dense_tables:
+            try:
+                dense = compile_dense_tables(self.get_weapon_table(table).compiled)
+            except MemoryError as e:
+                self.output.insert(tk.END, f"Dense tables disabled for {table}: {e}\n")
+                dense = None
+            else:
+                nbytes = sum(t.nbytes for t in dense.values())
+                self.output.insert(tk.END, f"Dense tables for {table}: {nbytes / 1024:.0f} KB\n")
+            self.dense_tables[table] = dense
+        return self.dense_tables[table]
+
+    def get_dense_shell_table(self):
+        # DenseShellTable for the selected faction/shell when dense mode is on, else None
+        if not self.use_dense_tables or self.get_weapon_table() is None:
+            return None
+        return (self.get_dense_tables() or {}).get(self.get_current_shell())
+
+    def toggle_dense_tables(self):
+        self.use_dense_tables = not self.use_dense_tables
+        self.btn_dense.config(text=f"Tables: {'Dense' if self.use_dense_tables else 'Exact'}")
+        self.update_view()
+
+    def get_solver(self, table=None, shell=None):
+        # Headless batch solver for the selected (or given) faction and shell
+        table = table or self.get_current_table()
+        shell = shell or self.get_current_shell()
+        dense = None
+        if self.use_dense_tables:
+            dense = (self.get_dense_tables(table) or {}).get(shell)
+        return self.get_weapon_table(table).solver(shell, dense)
 
     def _build_gui(self):
         # --- Scrollable Canvas Setup ---
@@ -103,8 +226,8 @@ class MortarApp:
         self.canvas = tk.Canvas(self.canvas_frame, width=800, height=600, bg="gray",
                                xscrollcommand=self.hbar.set, yscrollcommand=self.vbar.set)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.hbar.config(command=self.canvas.xview)
-        self.vbar.config(command=self.canvas.yview)
+        self.hbar.config(command=self.on_xscroll)
+        self.vbar.config(command=self.on_yscroll)
 
         # Input widgets for the canvas (top left)
         self.map_width_m = tk.IntVar(value=5120)
@@ -122,21 +245,36 @@ class MortarApp:
         self.btn_set_gps = tk.Button(self.canvas, text="Set Mortar From GPS", command=self.set_mortar_from_coords, width=18, **button_style)
         self.btn_load_project = tk.Button(self.canvas, text="Load Project Folder", command=self.load_project_folder, width=20, **button_style)
         self.btn_reset = tk.Button(self.canvas, text="Reset", command=self.reset_positions, width=10, **button_style)
+        self.btn_heatmap = tk.Button(self.canvas, text="Heat Map: Off", command=self.toggle_heatmap, width=20, **button_style)
+        self.btn_clear_plan = tk.Button(self.canvas, text="Clear Plan", command=self.clear_plan, width=10, **button_style)
+        self.btn_hover = tk.Button(self.canvas, text="Hover: Off", command=self.toggle_hover, width=20, **button_style)
+        self.btn_dense = tk.Button(self.canvas, text="Tables: Exact", command=self.toggle_dense_tables, width=20, **button_style)
+        self.btn_cancel_load = tk.Button(self.canvas, text="Cancel Load", command=self.cancel_loading, width=12, **button_style)
 
         self.canvas.bind("<Button-1>", self.handle_left_click)
+        self.canvas.bind("<Shift-Button-1>", lambda e: self.add_plan_point(e, 'plan_mortars'))
+        self.canvas.bind("<Control-Button-1>", lambda e: self.add_plan_point(e, 'plan_targets'))
+        self.canvas.bind("<Alt-Button-1>", lambda e: self.add_plan_point(e, 'target_polygon'))
         self.canvas.bind("<B3-Motion>", self.on_pan)
+        self.canvas.bind("<Motion>", self.on_motion)
+        self.canvas.bind("<Leave>", lambda e: self.on_motion(None))
         self.canvas.bind("<ButtonPress-3>", self.on_pan_start)
         self.canvas.bind("<MouseWheel>", self.on_mousewheel)  # Windows
         self.canvas.bind("<Button-4>", self.on_mousewheel)    # Linux scroll up
         self.canvas.bind("<Button-5>", self.on_mousewheel)    # Linux scroll down
 
-        self.canvas.bind('<Configure>', lambda e: self.update_view())
+        self.canvas.bind('<Configure>', lambda e: self.request_redraw())
+        self.root.bind("<F3>", lambda e: self.toggle_perf_hud())
+        self.root.bind("<F4>", lambda e: self.dump_trace())
         self.layer_entities = []
         self._click_state = 0
         self._pan_start = None
         # Add output text box at the bottom of the window
         self.output = tk.Text(self.root, height=6, width=80, bg="#181818", fg="#fff", font=("Consolas", 10))
         self.output.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+        self.calc_font = tkfont.Font(root=self.root, family="Consolas", size=10)
+        # Hover tooltip and performance HUD
+        self.hover_font = tkfont.Font(root=self.root, family="Consolas", size=9)
 
     def handle_left_click(self, e):
         if not self.map_width_px or not self.map_height_px:
@@ -157,8 +295,58 @@ class MortarApp:
         self.mortar = None
         self.target = None
         self._click_state = 0
+        self.plan_mortars = []
+        self.plan_targets = []
+        self.target_polygon = []
+        self.update_view()
+
+    def add_plan_point(self, e, points):
+        # Shift+click adds a planner tube, Ctrl+click a planner target, Alt+click a hit-area vertex
+        if not self.map_width_px or not self.map_height_px:
+            messagebox.showwarning("No Map", "Please load a map first.")
+            return
+        getattr(self, points).append((int(self.canvas.canvasx(e.x) / self.display_scale),
+                       int(self.canvas.canvasy(e.y) / self.display_scale)))
+        self.update_view()
+
+    def clear_plan(self):
+        self.plan_mortars = []
+        self.plan_targets = []
         self.update_view()
 
+    def get_fire_plan(self):
+        # Solution matrix, tube assignment and TOT schedule for the planner points; None without both
+        if not (self.plan_mortars and self.plan_targets) or self.get_weapon_table() is None:
+            return None
+        key = (tuple(self.plan_mortars), tuple(self.plan_targets), self.get_current_table(), self.get_current_shell(),
+               self.heightmap, self.m_per_px, self.use_dense_tables)
+        if self._fire_plan_cache[0] == key:
+            return self._fire_plan_cache[1]
+        mortar_z = target_z = 0.0
+        if self.heightmap is not None:
+            mortars = np.array(self.plan_mortars, dtype=np.float64)
+            targets = np.array(self.plan_targets, dtype=np.float64)
+            mortar_z = self.heightmap.sample(mortars[:, 0], mortars[:, 1], self.map_width_px, self.map_height_px)
+            target_z = self.heightmap.sample(targets[:, 0], targets[:, 1], self.map_width_px, self.map_height_px)
+        plan = plan_fire_mission(self.get_solver(), self.plan_mortars, self.plan_targets, mortar_z, target_z,
+                                 self.m_per_px)
+        self._fire_plan_cache = (key, plan)
+        self.show_fire_plan(plan)
+        return plan
+
+    def show_fire_plan(self, plan):
+        assigned = int((plan.assignment >= 0).sum())
+        lines = [f"FIRE PLAN: {len(self.plan_mortars)} tubes, {len(self.plan_targets)} targets, "
+                 f"{assigned} assigned, waves every {plan.wave_interval_s:.1f} s"]
+        for r in plan.schedule:
+            lines.append(f"T+{r.fire_time_s:6.1f}s  TUBE {r.tube + 1:>2} -> TGT {r.target + 1:>3}  "
+                         f"RING {r.ring}  ELEV {r.elevation_mil:.0f}  AZ {r.azimuth_mil:.0f}  "
+                         f"TOF {r.tof_s:.1f}s  IMPACT T+{r.impact_time_s:.1f}s")
+        for target in np.flatnonzero(plan.assignment < 0):
+            lines.append(f"TGT {target + 1:>3}: no tube in range")
+        self.output.delete(1.0, tk.END)
+        self.output.insert(tk.END, "\n".join(lines) + "\n")
+
     def on_pan_start(self, event):
         self._pan_start = (event.x, event.y, self.canvas.xview()[0], self.canvas.yview()[0])
 
@@ -173,6 +361,21 @@ class MortarApp:
         # Move view by delta
         self.canvas.xview_moveto(max(0, min(1, xview0 - dx / max(1, w))))
         self.canvas.yview_moveto(max(0, min(1, yview0 - dy / max(1, h))))
+        self.ensure_view_rendered()
+
+    def on_xscroll(self, *args):
+        # Scrollbar drags move the view like panning does
+        self.canvas.xview(*args)
+        self.ensure_view_rendered()
+
+    def on_yscroll(self, *args):
+        self.canvas.yview(*args)
+        self.ensure_view_rendered()
+
+    def ensure_view_rendered(self):
+        # Re-render once the view leaves the region drawn last time
+        if self.viewport_rendering and self.map_pyramid is not None and not self.is_view_rendered():
+            self.render_map()
 
     def on_mousewheel(self, event):
         # Smoother zoom: smaller factor, always center on cursor
@@ -199,61 +402,178 @@ class MortarApp:
         map_x = canvas_x / self.display_scale
         map_y = canvas_y / self.display_scale
         self.display_scale = new_scale
-        self.update_view()
-        # After update, move the view so the point under the cursor stays under the cursor
+        # Move the view first so the point under the cursor stays under the cursor,
+        # then redraw (the viewport renderer needs the final view position)
         new_canvas_x = map_x * self.display_scale
         new_canvas_y = map_y * self.display_scale
         w = int(self.map_width_px * self.display_scale) if self.map_width_px else 800
         h = int(self.map_height_px * self.display_scale) if self.map_height_px else 600
+        self.canvas.config(scrollregion=(0, 0, w, h))
         # Calculate new scroll fractions to keep cursor under mouse
         x_frac = max(0, min(1, (new_canvas_x - event.x) / max(1, w)))
         y_frac = max(0, min(1, (new_canvas_y - event.y) / max(1, h)))
         self.canvas.xview_moveto(x_frac)
         self.canvas.yview_moveto(y_frac)
+        self.request_redraw()
 
     def load_map(self):
-        path = filedialog.askopenfilename(filetypes=[("PNG", "*.png")])
+        path = filedialog.askopenfilename(filetypes=[("Map image", "*.png *.jpg *.jpeg"), ("PNG", "*.png")])
+        if not path:
+            return
+        self.start_loading(map_path=path)
+
+    def load_heightmap(self):
+        path = filedialog.askopenfilename(filetypes=[("Heightmap", " ".join("*" + ext for ext in HEIGHTMAP_EXTENSIONS)), ("PNG", "*.png")])
         if not path:
             return
-        img = Image.open(path)
-        self.original_img = img
-        self.map_width_px, self.map_height_px = img.width, img.height
-        # Set initial display_scale so image fits within 1024x1024
+        self.start_loading(heightmap_path=path)
+
+    def start_loading(self, map_path=None, heightmap_path=None):
+        # Decode on worker threads; _poll_loading applies the results as they arrive.
+        # Maps and heightmaps load as separate jobs, so picking a heightmap doesn't
+        # interrupt a map that's still decoding; a new load of the same kind replaces
+        # (and cancels) the one in progress
+        if map_path:
+            self._load_started = time.perf_counter()
+            self._start_load_job('map', MapLoadJob(map_path, None, self.zoom_cache_bytes,
+                                                   tile_cache_bytes=self.map_tile_cache_bytes))
+        if heightmap_path:
+            self._start_load_job('heightmap', MapLoadJob(None, heightmap_path, min_elevation_m=self.min_elevation_m,
+                                                         max_elevation_m=self.max_elevation_m))
+
+    def _start_load_job(self, kind, job):
+        previous = self._load_jobs.get(kind)
+        if previous is not None:
+            previous.cancel()
+        self._load_jobs[kind] = job.start()
+        if self._inputbox_built:
+            self.canvas.itemconfigure("cancelload", state="normal")
+        if self._load_poll_job is None:
+            self._load_poll_job = self.root.after(LOAD_POLL_MS, self._poll_loading)
+
+    def cancel_loading(self, quiet=False):
+        if not self._load_jobs:
+            return
+        for kind, job in list(self._load_jobs.items()):
+            job.cancel()
+            self._finish_loading(kind)
+        if not quiet:
+            self.output.insert(tk.END, "Loading cancelled.\n")
+
+    def _finish_loading(self, kind):
+        self._load_jobs.pop(kind, None)
+        if self._inputbox_built and not self._load_jobs:
+            self.canvas.itemconfigure("cancelload", state="hidden")
+
+    def _poll_loading(self):
+        self._load_poll_job = None
+        if not self._load_jobs:
+            return
+        redraw = False
+        with self.profiler.stage('load_poll'):
+            for job_kind, job in list(self._load_jobs.items()):
+                redraw = self._drain_load_job(job_kind, job) or redraw
+        if redraw:
+            self.update_view()
+        if self._load_jobs:
+            self._load_poll_job = self.root.after(LOAD_POLL_MS, self._poll_loading)
+
+    def _drain_load_job(self, job_kind, job):
+        # Apply one job's queued messages; True if anything on screen changed
+        redraw = False
+        while self._load_jobs.get(job_kind) is job:
+            try:
+                kind, value = job.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'size':
+                self.set_map_size(*value)
+            elif kind in ('preview', 'map'):
+                # The coarse preview pyramid stands in for the map until the full one is ready
+                self.map_pyramid = value
+                redraw = True
+                if kind == 'preview':
+                    # Time to first image on screen
+                    self.profiler.record('load_preview', time.perf_counter() - self._load_started)
+            elif kind == 'heightmap':
+                self.heightmap = value
+                redraw = True
+            elif kind == 'progress':
+                self.output.insert(tk.END, value + "\n")
+                self.output.see(tk.END)
+            elif kind == 'done':
+                self.output.insert(tk.END, f"Loaded in {value:.1f} s\n")
+                self.output.see(tk.END)
+                self.profiler.record('load', value)
+                self._finish_loading(job_kind)
+            elif kind == 'error':
+                self._finish_loading(job_kind)
+                messagebox.showerror("Load", f"Failed to load: {value}")
+            elif kind == 'cancelled':
+                self._finish_loading(job_kind)
+        return redraw
+
+    def set_map_size(self, width_px, height_px):
+        # New map dimensions: fit the initial view within 1024x1024 and rescale meters per pixel
+        self.map_width_px, self.map_height_px = width_px, height_px
         max_dim = max(self.map_width_px, self.map_height_px)
         if max_dim > 1024:
             self.display_scale = 1024 / max_dim
         else:
             self.display_scale = 1.0
-        display_img = img.resize(
-            (int(img.width * self.display_scale), int(img.height * self.display_scale)),
-            resample=Image.BILINEAR
-        )
-        self.tk_img = ImageTk.PhotoImage(display_img)
-        self.canvas.config(width=display_img.width, height=display_img.height)
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.tk_img)
+        w, h = int(width_px * self.display_scale), int(height_px * self.display_scale)
+        self.canvas.config(width=w, height=h)
         mpp_x = self.map_width_m.get() / self.map_width_px
         mpp_y = self.map_height_m.get() / self.map_height_px
         self.m_per_px = (mpp_x + mpp_y) / 2
         self.draw_grid()
 
-    def load_heightmap(self):
-        path = filedialog.askopenfilename(filetypes=[("PNG", "*.png")])
-        if not path:
-            return
-        img = Image.open(path).convert("L")
-        self.heightmap_image = img
-
     def draw_grid(self):
         if not self.map_width_px or not self.map_height_px:
             return
-        spacing = 1000 / self.m_per_px * self.display_scale
-        self.canvas.delete("grid")
-        for x in range(0, int(self.map_width_px * self.display_scale), int(spacing)):
-            self.canvas.create_line(x, 0, x, int(self.map_height_px * self.display_scale),
-                                    fill="white", dash=(2, 2), tags="grid")
-        for y in range(0, int(self.map_height_px * self.display_scale), int(spacing)):
-            self.canvas.create_line(0, y, int(self.map_width_px * self.display_scale), y,
-                                    fill="white", dash=(2, 2), tags="grid")
+        w = int(self.map_width_px * self.display_scale)
+        h = int(self.map_height_px * self.display_scale)
+        spacing = max(1, int(1000 / self.m_per_px * self.display_scale))
+        if self._grid_key == (w, h, spacing):
+            return
+        self._grid_key = (w, h, spacing)
+        lines = [(x, 0, x, h) for x in range(0, w, spacing)] + [(0, y, w, y) for y in range(0, h, spacing)]
+        # Reuse the existing grid lines, creating more only when the grid gets denser
+        created = len(self._grid_items) < len(lines)
+        while len(self._grid_items) < len(lines):
+            self._grid_items.append(self.canvas.create_line(0, 0, 0, 0, fill="white", dash=(2, 2), tags="grid"))
+        if created:
+            self.canvas.tag_lower("grid")
+            self.canvas.tag_lower("map")
+        for item, line in zip(self._grid_items, lines):
+            self._update_item(item, line)
+        for item in self._grid_items[len(lines):]:
+            self._update_item(item, None)
+
+    def _update_item(self, item, coords):
+        # Move a retained canvas item, or hide it when coords is None; skips no-op updates
+        if self._item_coords.get(item) == coords:
+            return
+        if coords is None:
+            self.canvas.itemconfigure(item, state="hidden")
+        else:
+            if self._item_coords.get(item) is None:
+                self.canvas.itemconfigure(item, state="normal")
+            self.canvas.coords(item, *coords)
+        self._item_coords[item] = coords
+
+    def measure_text(self, text, font=None):
+        # Pixel width of text in font (default calc_font), through a small LRU
+        font = font or self.calc_font
+        key = (str(font), text)
+        width = self._text_widths.get(key)
+        if width is None:
+            width = self._text_widths[key] = font.measure(text)
+            if len(self._text_widths) > TEXT_WIDTH_CACHE_SIZE:
+                self._text_widths.popitem(last=False)
+        else:
+            self._text_widths.move_to_end(key)
+        return width
 
     def set_mortar(self, e):
         if not self.map_width_px or not self.map_height_px:
@@ -276,15 +596,7 @@ class MortarApp:
 
     def set_mortar_from_coords(self):
         try:
-            text = self.coord_var.get().strip()
-            parts = text.split()
-            if len(parts) != 2:
-                raise ValueError("Invalid format. Use: 6500 3400 or 02480 03659")
-            x_str, z_str = parts[0], parts[1]
-            if not (x_str.isdigit() and z_str.isdigit()):
-                raise ValueError("Coordinates must be numeric (meters)")
-            x_m = int(x_str)
-            z_m = int(z_str)
+            x_m, z_m = parse_grid(self.coord_var.get())
             # Check if coordinates are within map bounds
             map_w_m = self.map_width_m.get()
             map_h_m = self.map_height_m.get()
@@ -306,104 +618,306 @@ class MortarApp:
             self.output.insert(tk.END, f"Failed to parse coords: {e}\n")
 
     def update_view(self):
-        # Only delete specific tags, not 'all', to preserve overlays and grid
-        self.canvas.delete("marker")
-        self.canvas.delete("layer_marker")
-        self.canvas.delete("layer")
-        self.canvas.delete("grid")
-        self.canvas.delete("inputbox")
-        self.canvas.delete("calcbox")
-        # Redraw the map image at the current scale
-        if self.original_img is not None:
-            w = int(self.map_width_px * self.display_scale)
-            h = int(self.map_height_px * self.display_scale)
-            display_img = self.original_img.resize((w, h), resample=Image.BILINEAR)
-            # Draw effective range circles if mortar is set (true alpha)
-            if self.mortar:
-                from PIL import ImageDraw
-                overlay_img = Image.new("RGBA", (w, h), (0, 0, 0, 0))
-                draw = ImageDraw.Draw(overlay_img)
-                mx, my = int(self.mortar[0] * self.display_scale), int(self.mortar[1] * self.display_scale)
-                # Get min/max range for current shell
-                table = self.get_current_table()
-                shell = self.selected_shell_type.get() if self.selected_shell_type.get() else (self.shell_types[table][0] if self.shell_types[table] else "HE")
-                shell_rows = [row for ring_rows in self.ring_data[table].get(shell, {}).values() for row in ring_rows]
-                if shell_rows:
-                    min_range = min(row["Range (m)"] for row in shell_rows)
-                    max_range = max(row["Range (m)"] for row in shell_rows)
-                else:
-                    min_range = 748
-                    max_range = 2300
-                # Max range circle (blue)
-                r_px = int(max_range / self.m_per_px * self.display_scale)
-                draw.ellipse([mx - r_px, my - r_px, mx + r_px, my + r_px], fill=(0, 0, 255, int(255 * 0.15)))
-                # Min range circle (red/orange)
-                min_r_px = int(min_range / self.m_per_px * self.display_scale)
-                draw.ellipse([mx - min_r_px, my - min_r_px, mx + min_r_px, my + min_r_px], fill=(255, 128, 0, int(255 * 0.15)))
-                # Dispersion circle at target (if available)
-                if self.mortar and self.target:
-                    dx_m = (self.target[0] - self.mortar[0]) * self.m_per_px
-                    dy_m = (self.target[1] - self.mortar[1]) * self.m_per_px
-                    dist_m = math.hypot(dx_m, dy_m)
-                    mortar_z = self.get_elevation(*self.mortar)
-                    target_z = self.get_elevation(*self.target)
-                    dz = target_z - mortar_z
-                    dz_correction_factor = 1.5
-                    ring, entry = self.get_best_ring(dist_m, dz, dz_correction_factor)
-                    if ring is not None and self.target and entry is not None:
-                        a, b = entry
-                        ratio = (dist_m - a["Range (m)"]) / (b["Range (m)"] - a["Range (m)"])
-                        disp_a = a["Dispersion Radius (m)"]
-                        disp_b = b["Dispersion Radius (m)"]
-                        disp_m = disp_a + ratio * (disp_b - disp_a)
-                        tx, ty = int(self.target[0] * self.display_scale), int(self.target[1] * self.display_scale)
-                        disp_px = int(disp_m / self.m_per_px * self.display_scale)
-                        draw.ellipse([tx - disp_px, ty - disp_px, tx + disp_px, ty + disp_px], fill=(255,255,255,60))
-                # Composite overlay onto map
-                display_img = display_img.convert("RGBA")
-                display_img = Image.alpha_composite(display_img, overlay_img)
-            self.tk_img = ImageTk.PhotoImage(display_img)
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.tk_img)
-            self.canvas.config(scrollregion=(0, 0, w, h))
-        self.draw_grid()
-        # Draw mortar/target/line as before
+        # Canvas items persist between frames; each step below only moves/updates them
+        stage = self.profiler.stage
+        with stage('frame'):
+            # Redraw the map image at the current scale
+            with stage('render_map'):
+                self.render_map()
+            with stage('draw_grid'):
+                self.draw_grid()
+            with stage('draw_markers'):
+                self.draw_markers()
+            # Always show calculation box
+            with stage('calculate'):
+                self.calculate()
+            # Always show input options box
+            with stage('draw_input_options'):
+                self.draw_input_options()
+
+    def request_redraw(self):
+        # Coalesce bursts of wheel/<Configure> events into one cheap preview
+        # when idle and one full redraw after redraw_debounce_ms of quiet
+        if self._preview_job is None:
+            self._preview_job = self.root.after_idle(self._redraw_preview)
+        if self._refine_job is not None:
+            self.root.after_cancel(self._refine_job)
+        self._refine_job = self.root.after(self.redraw_debounce_ms, self._redraw_full)
+
+    def _redraw_preview(self):
+        self._preview_job = None
+        with self.profiler.stage('preview'):
+            self.render_map(preview=True)
+            self.draw_grid()
+            self.draw_markers()
+
+    def _redraw_full(self):
+        self._refine_job = None
+        if self._preview_job is not None:
+            self.root.after_cancel(self._preview_job)
+            self._preview_job = None
+        self.update_view()
+
+    def draw_markers(self):
+        # Mortar/target markers and the line between them, created hidden on first use
+        if self._marker_items is None:
+            self._marker_items = (
+                self.canvas.create_oval(0, 0, 0, 0, fill="red", tags="marker", state="hidden"),
+                self.canvas.create_oval(0, 0, 0, 0, fill="blue", tags="marker", state="hidden"),
+                self.canvas.create_line(0, 0, 0, 0, fill="white", width=2, tags="marker", state="hidden"),
+            )
+        mortar_item, target_item, line_item = self._marker_items
+        mortar_xy = target_xy = None
         if self.mortar:
             mx, my = int(self.mortar[0] * self.display_scale), int(self.mortar[1] * self.display_scale)
-            self.canvas.create_oval(mx - 5, my - 5, mx + 5, my + 5, fill="red", tags="marker")
+            mortar_xy = (mx - 5, my - 5, mx + 5, my + 5)
         if self.target:
             tx, ty = int(self.target[0] * self.display_scale), int(self.target[1] * self.display_scale)
-            self.canvas.create_oval(tx - 5, ty - 5, tx + 5, ty + 5, fill="blue", tags="marker")
-        if self.mortar and self.target:
-            mx, my = int(self.mortar[0] * self.display_scale), int(self.mortar[1] * self.display_scale)
-            tx, ty = int(self.target[0] * self.display_scale), int(self.target[1] * self.display_scale)
-            self.canvas.create_line(mx, my, tx, ty, fill="white", width=2, tags="marker")
-        # Always show calculation box
-        self.calculate()
-        # Always show input options box
-        self.draw_input_options()
+            target_xy = (tx - 5, ty - 5, tx + 5, ty + 5)
+        self._update_item(mortar_item, mortar_xy)
+        self._update_item(target_item, target_xy)
+        self._update_item(line_item, (mx, my, tx, ty) if self.mortar and self.target else None)
+        self.draw_plan()
+        # Hit-probability polygon outline (closed once it has 3 vertices)
+        if self._area_item is None and self.target_polygon:
+            self._area_item = self.canvas.create_line(0, 0, 0, 0, fill="yellow", width=2, tags="marker", state="hidden")
+        if self._area_item is not None:
+            coords = None
+            if len(self.target_polygon) >= 2:
+                closed = self.target_polygon + self.target_polygon[:1] if len(self.target_polygon) >= 3 else self.target_polygon
+                coords = tuple(v * self.display_scale for xy in closed for v in xy)
+            self._update_item(self._area_item, coords)
+
+    def _plan_item(self, kind, index, create):
+        # Retained pool per marker kind; items past the current count are hidden, not deleted
+        pool = self._plan_items[kind]
+        while len(pool) <= index:
+            pool.append(create())
+        return pool[index]
+
+    def draw_plan(self):
+        plan = self.get_fire_plan()
+        s = self.display_scale
+        tubes = [(x * s, y * s) for x, y in self.plan_mortars]
+        targets = [(x * s, y * s) for x, y in self.plan_targets]
+        for i, (x, y) in enumerate(tubes):
+            item = self._plan_item('tube', i, lambda: self.canvas.create_rectangle(
+                0, 0, 0, 0, fill="orange", outline="black", tags="marker", state="hidden"))
+            self._update_item(item, (x - 5, y - 5, x + 5, y + 5))
+        for j, (x, y) in enumerate(targets):
+            item = self._plan_item('target', j, lambda: self.canvas.create_polygon(
+                0, 0, 0, 0, 0, 0, fill="cyan", outline="black", tags="marker", state="hidden"))
+            self._update_item(item, (x, y - 6, x + 6, y, x, y + 6, x - 6, y))
+            fill = "gray" if plan is not None and plan.assignment[j] < 0 else "cyan"
+            if self._plan_fills.get(item) != fill:
+                self.canvas.itemconfigure(item, fill=fill)
+                self._plan_fills[item] = fill
+        lines = []
+        if plan is not None:
+            lines = [(tubes[tube][0], tubes[tube][1], targets[j][0], targets[j][1])
+                     for j, tube in enumerate(plan.assignment) if tube >= 0]
+        for k, coords in enumerate(lines):
+            item = self._plan_item('line', k, lambda: self.canvas.create_line(
+                0, 0, 0, 0, fill="lime", dash=(4, 2), tags="marker", state="hidden"))
+            self._update_item(item, coords)
+        for kind, used in (('tube', len(tubes)), ('target', len(targets)), ('line', len(lines))):
+            for item in self._plan_items[kind][used:]:
+                self._update_item(item, None)
+
+    def get_render_region(self, w, h):
+        # Part of the (w, h) scaled map to render, in canvas pixels
+        view_w = self.canvas.winfo_width()
+        view_h = self.canvas.winfo_height()
+        if not self.viewport_rendering or view_w <= 1 or view_h <= 1:
+            return 0, 0, w, h
+        return viewport_region(self.canvas.xview()[0] * w, self.canvas.yview()[0] * h, view_w, view_h, w, h)
+
+    def is_view_rendered(self):
+        if self._rendered_region is None:
+            return False
+        w = int(self.map_width_px * self.display_scale)
+        h = int(self.map_height_px * self.display_scale)
+        rx0, ry0, rx1, ry1 = self._rendered_region
+        vx0, vy0, vx1, vy1 = viewport_region(self.canvas.xview()[0] * w, self.canvas.yview()[0] * h,
+                                             self.canvas.winfo_width(), self.canvas.winfo_height(), w, h, margin=0)
+        return rx0 <= vx0 and ry0 <= vy0 and vx1 <= rx1 and vy1 <= ry1
+
+    def render_map(self, preview=False):
+        if self.map_pyramid is None:
+            return
+        w = int(self.map_width_px * self.display_scale)
+        h = int(self.map_height_px * self.display_scale)
+        self.canvas.config(scrollregion=(0, 0, w, h))
+        rx0, ry0, rx1, ry1 = self.get_render_region(w, h)
+        region = (rx0, ry0, rx1, ry1)
+        if preview:
+            # Fast path while zooming: NEAREST resample, no overlay
+            self._show_map_image(self.map_pyramid.get_region(w, h, region, resample=Image.NEAREST), region)
+            self._preview_shown = True
+            return
+        # Range circles (cached with the map region); coordinates are relative to the region
+        circles = []
+        dispersion = None
+        reach_job = self.get_reachability_job() if self.reach_mode and self.mortar else None
+
+        def images():
+            # The heat map replaces the flat min/max range circles; only rasterized when the overlay is rebuilt
+            if reach_job is None:
+                return []
+            placed = raster_region(reach_job.to_image(self.reach_mode), reach_job.box, self.display_scale, region)
+            return [placed] if placed is not None else []
+        if self.mortar:
+            mx, my = int(self.mortar[0] * self.display_scale) - rx0, int(self.mortar[1] * self.display_scale) - ry0
+            # Get min/max range for current shell
+            shell_table = self.get_current_shell_table()
+            if shell_table is not None and shell_table.min_range is not None:
+                min_range = shell_table.min_range
+                max_range = shell_table.max_range
+            else:
+                min_range = 748
+                max_range = 2300
+            # Max range circle (blue)
+            r_px = int(max_range / self.m_per_px * self.display_scale)
+            min_r_px = int(min_range / self.m_per_px * self.display_scale)
+            if reach_job is None:
+                circles.append((mx, my, r_px, (0, 0, 255, int(255 * 0.15))))
+                # Min range circle (red/orange)
+                circles.append((mx, my, min_r_px, (255, 128, 0, int(255 * 0.15))))
+            # Dispersion circle at target (if available)
+            if self.target and shell_table is not None:
+                dx_m = (self.target[0] - self.mortar[0]) * self.m_per_px
+                dy_m = (self.target[1] - self.mortar[1]) * self.m_per_px
+                dist_m = math.hypot(dx_m, dy_m)
+                mortar_z = self.get_elevation(*self.mortar)
+                target_z = self.get_elevation(*self.target)
+                dz = target_z - mortar_z
+                dz_correction_factor = self.get_weapon_table().dz_correction_factor
+                ring, entry, _, _ = self.get_firing_ring(dist_m, dz, mortar_z, target_z, dz_correction_factor)
+                if ring is not None and entry is not None:
+                    disp_m = self.ring_values(ring, entry, dist_m)[2]
+                    tx, ty = int(self.target[0] * self.display_scale) - rx0, int(self.target[1] * self.display_scale) - ry0
+                    disp_px = int(disp_m / self.m_per_px * self.display_scale)
+                    dispersion = (tx, ty, disp_px, (255, 255, 255, 60))
+        key = (self.map_pyramid, region, w, h, self.mortar, self.get_current_table(), self.get_current_shell(), self.m_per_px,
+               self.reach_mode, reach_job, reach_job.done if reach_job is not None else None)
+        changed = self.overlay_layer.update(key, lambda: self.map_pyramid.get_region(w, h, region), circles, images)
+        changed = self.overlay_layer.set_dispersion(dispersion) or changed
+        if not changed and not self._preview_shown and self._map_item is not None:
+            return
+        self._show_map_image(self.overlay_layer.image, region)
+        self._preview_shown = False
+
+    def toggle_heatmap(self):
+        # Off -> ring -> elevation -> off
+        modes = (None,) + REACH_MODES
+        self.reach_mode = modes[(modes.index(self.reach_mode) + 1) % len(modes)]
+        self.btn_heatmap.config(text=f"Heat Map: {(self.reach_mode or 'off').title()}")
+        self.update_view()
+
+    def get_reachability_job(self):
+        # Cached per mortar position, faction, shell and terrain; starts computing on first request
+        table = self.get_current_table()
+        shell = self.get_current_shell()
+        key = (self.mortar, table, shell, self.heightmap, self.m_per_px, self.reach_cell_m, self.use_dense_tables)
+        job = self.reach_jobs.get(key)
+        if job is None:
+            job = ReachabilityJob(self.get_solver(table, shell), self.mortar, self.get_elevation(*self.mortar),
+                                  self.map_width_px, self.map_height_px, self.m_per_px, self.heightmap, self.reach_cell_m)
+            self.reach_jobs[key] = job
+            while len(self.reach_jobs) > REACH_CACHE_SIZE:
+                self.reach_jobs.popitem(last=False)
+        self.reach_jobs.move_to_end(key)
+        if job is not self._reach_job:
+            self._start_reachability(job)
+        return job
+
+    def _start_reachability(self, job):
+        # Stream tiles from a process pool (or in-process when the heightmap can't be shared by file)
+        for future in self._reach_pending:
+            if not isinstance(future, tuple):
+                future.cancel()
+        self._reach_job = job
+        self._reach_pending = []
+        if job.complete:
+            return
+        executor = None
+        if self.heightmap is None or self.heightmap.file_backed:
+            try:
+                if self._reach_executor is None:
+                    self._reach_executor = ProcessPoolExecutor()
+                executor = self._reach_executor
+            except (OSError, NotImplementedError):
+                executor = None
+        for tile in job.tiles:
+            self._reach_pending.append(executor.submit(solve_tile, job.spec, tile) if executor else tile)
+        if self._reach_poll_job is None:
+            self._reach_poll_job = self.root.after(REACH_POLL_MS, self._poll_reachability)
+
+    def _poll_reachability(self):
+        self._reach_poll_job = None
+        job = self._reach_job
+        still_pending = []
+        stored = 0
+        for item in self._reach_pending:
+            if isinstance(item, tuple):
+                # In-process tiles: a few per tick so the UI stays responsive
+                if stored < 4:
+                    job.store(solve_tile(job.spec, item))
+                    stored += 1
+                else:
+                    still_pending.append(item)
+            elif item.done():
+                if not item.cancelled():
+                    job.store(item.result())
+                    stored += 1
+            else:
+                still_pending.append(item)
+        self._reach_pending = still_pending
+        if stored:
+            self.render_map()
+        if still_pending:
+            self._reach_poll_job = self.root.after(REACH_POLL_MS, self._poll_reachability)
+
+    def _show_map_image(self, display_img, region):
+        with self.profiler.stage('photoimage'):
+            photo = ImageTk.PhotoImage(display_img)
+            # One retained map item: swap its image and move it instead of recreating it each frame
+            if self._map_item is None:
+                self._map_item = self.canvas.create_image(region[0], region[1], anchor=tk.NW, image=photo, tags="map")
+                self.canvas.tag_lower("map")
+            else:
+                self.canvas.itemconfigure(self._map_item, image=photo)
+                self.canvas.coords(self._map_item, region[0], region[1])
+            # Keep a reference, or Tk drops the image
+            self.tk_img = photo
+        self._rendered_region = region
 
     def draw_input_options(self):
-        self.canvas.delete("inputbox")
+        # The input box is laid out once; later frames only refresh the shell menu
+        shell_types = self.get_current_shell_types()
+        if not self._inputbox_built:
+            self._build_input_box(shell_types)
+        if shell_types != self._shell_menu_types:
+            menu = self.shell_dropdown['menu']
+            menu.delete(0, 'end')
+            for s in shell_types:
+                menu.add_command(label=s, command=tk._setit(self.selected_shell_type, s, lambda _: self.update_view()))
+            self.canvas.itemconfigure("shellrow", state="normal" if shell_types else "hidden")
+            self._shell_menu_types = list(shell_types)
+
+    def _build_input_box(self, shell_types):
         widgets = [self.entry_map_width, self.entry_map_height, self.entry_gps,
-                   self.btn_load_map, self.btn_load_heightmap, self.btn_set_gps, self.btn_load_project, self.btn_reset]
+                   self.btn_load_map, self.btn_load_heightmap, self.btn_set_gps, self.btn_load_project, self.btn_reset,
+                   self.btn_clear_plan, self.btn_hover, self.btn_dense]
         # Add table (faction) dropdown
-        if not hasattr(self, 'table_dropdown'):
-            self.table_dropdown = tk.OptionMenu(self.canvas, self.selected_table, 'Russian', 'NATO', command=self.on_table_change)
-            self.table_dropdown.config(bg='#222', fg='#0f0', activebackground='#333', activeforeground='#0f0', highlightbackground='#222', highlightcolor='#0f0', bd=1, relief='raised', font=("Consolas", 10, "bold"))
+        self.table_dropdown = tk.OptionMenu(self.canvas, self.selected_table, *(self.table_registry.names() or [""]), command=self.on_table_change)
+        self.table_dropdown.config(bg='#222', fg='#0f0', activebackground='#333', activeforeground='#0f0', highlightbackground='#222', highlightcolor='#0f0', bd=1, relief='raised', font=("Consolas", 10, "bold"))
         widgets.append(self.table_dropdown)
-        # Add shell type dropdown
-        shell_types = self.get_current_shell_types()
-        if shell_types:
-            if not hasattr(self, 'shell_dropdown'):
-                self.shell_dropdown = tk.OptionMenu(self.canvas, self.selected_shell_type, *shell_types, command=lambda _: self.update_view())
-                self.shell_dropdown.config(bg='#222', fg='#0f0', activebackground='#333', activeforeground='#0f0', highlightbackground='#222', highlightcolor='#0f0', bd=1, relief='raised', font=("Consolas", 10, "bold"))
-            else:
-                menu = self.shell_dropdown['menu']
-                menu.delete(0, 'end')
-                for s in shell_types:
-                    menu.add_command(label=s, command=tk._setit(self.selected_shell_type, s, lambda _: self.update_view()))
-            widgets.append(self.shell_dropdown)
-        self.root.update_idletasks()
+        # Add shell type dropdown (its menu is filled by draw_input_options)
+        self.shell_dropdown = tk.OptionMenu(self.canvas, self.selected_shell_type, *(shell_types or [""]), command=lambda _: self.update_view())
+        self.shell_dropdown.config(bg='#222', fg='#0f0', activebackground='#333', activeforeground='#0f0', highlightbackground='#222', highlightcolor='#0f0', bd=1, relief='raised', font=("Consolas", 10, "bold"))
+        self._shell_menu_types = list(shell_types)
+        widgets.append(self.shell_dropdown)
         max_w = 0
         total_h = 20
         for wdg in widgets:
@@ -432,15 +946,28 @@ class MortarApp:
         self.canvas.create_window(box_x+190, y_offset, anchor="nw", window=self.btn_set_gps, tags="inputbox")
         y_offset += self.entry_gps.winfo_reqheight() + 10
         self.canvas.create_window(box_x+190, y_offset, anchor="nw", window=self.btn_load_project, tags="inputbox")
+        # Only shown while a background load is running
+        self.canvas.create_window(box_x+10, y_offset, anchor="nw", window=self.btn_cancel_load, tags=("inputbox", "cancelload"),
+                                  state="normal" if self._load_jobs else "hidden")
         y_offset += self.btn_load_project.winfo_reqheight() + 10
         self.canvas.create_window(box_x+10, y_offset, anchor="nw", window=self.btn_reset, tags="inputbox")
+        self.canvas.create_window(box_x+190, y_offset, anchor="nw", window=self.btn_heatmap, tags="inputbox")
         y_offset += self.btn_reset.winfo_reqheight() + 10
+        self.canvas.create_window(box_x+10, y_offset, anchor="nw", window=self.btn_clear_plan, tags="inputbox")
+        self.canvas.create_window(box_x+190, y_offset, anchor="nw", window=self.btn_hover, tags="inputbox")
+        y_offset += self.btn_clear_plan.winfo_reqheight() + 10
+        self.canvas.create_window(box_x+190, y_offset, anchor="nw", window=self.btn_dense, tags="inputbox")
+        y_offset += self.btn_dense.winfo_reqheight() + 4
+        self.canvas.create_text(box_x+10, y_offset, anchor="nw", text="Shift/Ctrl/Alt+click: tube/target/hit area",
+                                fill="white", font=("Consolas", 9), tags="inputbox")
+        y_offset += 20
         self.canvas.create_text(box_x+10, y_offset, anchor="nw", text="Faction:", fill="white", font=("Consolas", 10), tags="inputbox")
         self.canvas.create_window(box_x+110, y_offset, anchor="nw", window=self.table_dropdown, tags="inputbox")
         y_offset += self.table_dropdown.winfo_reqheight() + 10
-        if shell_types:
-            self.canvas.create_text(box_x+10, y_offset, anchor="nw", text="Shell Type:", fill="white", font=("Consolas", 10), tags="inputbox")
-            self.canvas.create_window(box_x+110, y_offset, anchor="nw", window=self.shell_dropdown, tags="inputbox")
+        state = "normal" if shell_types else "hidden"
+        self.canvas.create_text(box_x+10, y_offset, anchor="nw", text="Shell Type:", fill="white", font=("Consolas", 10), tags=("inputbox", "shellrow"), state=state)
+        self.canvas.create_window(box_x+110, y_offset, anchor="nw", window=self.shell_dropdown, tags=("inputbox", "shellrow"), state=state)
+        self._inputbox_built = True
 
     def on_table_change(self, *_):
         # Update shell dropdown when table/faction changes
@@ -450,42 +977,49 @@ class MortarApp:
         self.update_view()
 
     def calculate(self):
-        if not (self.mortar and self.target):
+        if not (self.mortar and self.target) or self.get_weapon_table() is None:
+            if self._calc_items is not None:
+                for item in self._calc_items:
+                    self._update_item(item, None)
+                self._calc_text = None
+            self.draw_obstruction(None)
             return
         dx_m = (self.target[0] - self.mortar[0]) * self.m_per_px
         dy_m = (self.target[1] - self.mortar[1]) * self.m_per_px
         dist_m = math.hypot(dx_m, dy_m)
         table = self.get_current_table()
-        mils_per_circle = 6400 if table == 'NATO' else 6000
+        weapon = self.get_weapon_table()
+        mils_per_circle = weapon.mils_per_circle
         azimuth_deg = (math.degrees(math.atan2(dx_m, -dy_m)) + 360) % 360
         azimuth_mil = (azimuth_deg / 360) * mils_per_circle
         mortar_z = self.get_elevation(*self.mortar)
         target_z = self.get_elevation(*self.target)
         dz = target_z - mortar_z
-        dz_correction_factor = 1.5
-        ring, entry = self.get_best_ring(dist_m, dz, dz_correction_factor)
-        shell = self.selected_shell_type.get() if self.selected_shell_type.get() else (self.get_current_shell_types()[0] if self.get_current_shell_types() else "HE")
-        shell_rows = [row for ring_rows in self.get_current_ring_data().get(shell, {}).values() for row in ring_rows]
-        if shell_rows:
-            min_range = min(row["Range (m)"] for row in shell_rows)
-            max_range = max(row["Range (m)"] for row in shell_rows)
-            min_elev = min(row["Elevation (mil)"] for row in shell_rows)
+        dz_correction_factor = weapon.dz_correction_factor
+        ring, entry, obstruction, blocked_rings = self.get_firing_ring(dist_m, dz, mortar_z, target_z, dz_correction_factor)
+        shell = self.get_current_shell()
+        shell_table = self.get_current_shell_table()
+        if shell_table is not None and shell_table.min_range is not None:
+            min_range = shell_table.min_range
+            max_range = shell_table.max_range
+            min_elev = shell_table.min_elev
         else:
             min_range = 748
             max_range = 2300
-            min_elev = 748
-        if ring is None or entry is None:
+            min_elev = weapon.min_elevation_mil
+        if obstruction is not None:
+            calc_text = (
+                f"No ring clears the terrain.\n"
+                f"Obstruction at {obstruction[2]:.0f} m from mortar\n"
+                f"Terrain: {obstruction[3]:.1f} m, shell: {obstruction[4]:.1f} m\n"
+            )
+        elif ring is None or entry is None:
             calc_text = f"No valid firing solution found above {min_elev:.0f} mils.\nMax table range: {max_range:.0f}m."
         else:
-            a, b = entry
-            ratio = (dist_m - a["Range (m)"]) / (b["Range (m)"] - a["Range (m)"])
-            elev = a["Elevation (mil)"] + ratio * (b["Elevation (mil)"] - a["Elevation (mil)"])
-            tof = a["Time of Flight (sec)"] + ratio * (b["Time of Flight (sec)"] - a["Time of Flight (sec)"])
+            elev, tof, disp_m = self.ring_values(ring, entry, dist_m)
             corrected_elev = elev + dz * dz_correction_factor
-            disp_a = a["Dispersion Radius (m)"]
-            disp_b = b["Dispersion Radius (m)"]
-            disp_m = disp_a + ratio * (disp_b - disp_a)
-            if corrected_elev < 100 or corrected_elev > 1600:
+            min_limit, max_limit = weapon.elevation_limits_mil
+            if corrected_elev < min_limit or corrected_elev > max_limit:
                 calc_text = (
                     f"Elevation out of range: {corrected_elev:.0f} mils\n"
                     f"Try a different ring or check elevation difference.\n"
@@ -506,88 +1040,292 @@ class MortarApp:
                     f"Elevation Delta: {dz:.1f} m\n"
                     f"dz Correction: {dz * dz_correction_factor:+.1f} mils\n"
                 )
+                for blocked_ring, blocked_at in blocked_rings:
+                    calc_text += f"Ring {blocked_ring} blocked by terrain at {blocked_at[2]:.0f} m\n"
+                area, area_name = self.get_target_area()
+                hit = self.hit_estimator.estimate(disp_m, area)
+                calc_text += f"Hit Chance ({area_name}): {hit.probability * 100:.0f}%"
+                if hit.probability > 0:
+                    calc_text += (f", ~{hit.expected_rounds:.1f} rounds/hit, "
+                                  f"{rounds_for_confidence(hit.probability)} for 90%")
+                calc_text += "\n"
+        self.draw_obstruction(blocked_rings[0][1] if blocked_rings else None)
         # Dynamically size the calculation box to fit text
-        self.canvas.delete("calcbox")
         win_w = self.canvas.winfo_width()
         lines = calc_text.split("\n")
-        font = ("Consolas", 10)
-        self.root.update_idletasks()
         # Estimate width/height
-        text_w = max([self.canvas.create_text(0, 0, text=line, font=font, anchor="nw", tags="calcbox", state="hidden") or self.canvas.bbox("calcbox")[2] for line in lines if line])
+        text_w = max(self.measure_text(line) for line in lines if line)
         text_h = 20 * len(lines)
         box_w = min(max(300, text_w + 40), win_w - 20)
         box_h = max(60, text_h + 20)
         # Anchor to top-right of window (not affected by pan/zoom)
         box_x = win_w - box_w - 10
         box_y = 10
-        self.canvas.create_rectangle(box_x, box_y, box_x+box_w, box_y+box_h, fill="#222", outline="#fff", tags="calcbox")
-        self.canvas.create_text(box_x+box_w/2, box_y+10, anchor="n", text=calc_text, fill="white", font=font, tags="calcbox")
-        # Also clear the output textbox
-        self.output.delete(1.0, tk.END)
-        self.output.insert(tk.END, calc_text + "\n")
+        if self._calc_items is None:
+            self._calc_items = (
+                self.canvas.create_rectangle(0, 0, 0, 0, fill="#222", outline="#fff", tags="calcbox", state="hidden"),
+                self.canvas.create_text(0, 0, anchor="n", fill="white", font=self.calc_font, tags="calcbox", state="hidden"),
+            )
+        rect_item, text_item = self._calc_items
+        self._update_item(rect_item, (box_x, box_y, box_x+box_w, box_y+box_h))
+        self._update_item(text_item, (box_x+box_w/2, box_y+10))
+        if calc_text != self._calc_text:
+            self.canvas.itemconfigure(text_item, text=calc_text)
+            # Also clear the output textbox
+            self.output.delete(1.0, tk.END)
+            self.output.insert(tk.END, calc_text + "\n")
+            self._calc_text = calc_text
+
+    def toggle_hover(self):
+        self.hover_enabled = not self.hover_enabled
+        self.btn_hover.config(text=f"Hover: {'On' if self.hover_enabled else 'Off'}")
+        if not self.hover_enabled:
+            self.hide_hover()
+            stats = self.hover_stats()
+            if stats:
+                self.output.insert(tk.END, f"Hover: {stats['events']} updates, p50 {stats['p50_ms']:.2f} ms, "
+                                           f"p95 {stats['p95_ms']:.2f} ms, max {stats['max_ms']:.2f} ms\n")
+
+    def hide_hover(self):
+        # Drop any pending update and hide the tooltip now (on_motion ignores events while hover is off)
+        if self._hover_job is not None:
+            self.root.after_cancel(self._hover_job)
+            self._hover_job = None
+        self._hover_xy = None
+        if self._hover_items is not None:
+            for item in self._hover_items:
+                self._update_item(item, None)
+
+    def on_motion(self, e):
+        # Remember only the latest position; the update runs at most HOVER_FPS times a second
+        if not self.hover_enabled:
+            return
+        self._hover_xy = None if e is None else (e.x, e.y)
+        if self._hover_job is None:
+            wait_ms = max(0, int((self._hover_last + 1.0 / HOVER_FPS - time.perf_counter()) * 1000))
+            self._hover_job = self.root.after(wait_ms, self._update_hover)
+
+    def _update_hover(self):
+        self._hover_job = None
+        start = time.perf_counter()
+        self._hover_last = start
+        text = xy = None
+        if self._hover_xy is not None and self.mortar and self.map_width_px and self.get_weapon_table() is not None:
+            cx, cy = self.canvas.canvasx(self._hover_xy[0]), self.canvas.canvasy(self._hover_xy[1])
+            text = self.hover_text(cx / self.display_scale, cy / self.display_scale)
+            xy = (cx + 16, cy + 16)
+        if self._hover_items is None:
+            if text is None:
+                return
+            self._hover_items = (
+                self.canvas.create_rectangle(0, 0, 0, 0, fill="#222", outline="#0f0", tags="hover", state="hidden"),
+                self.canvas.create_text(0, 0, anchor="nw", fill="#0f0", font=self.hover_font, tags="hover", state="hidden"),
+            )
+        rect_item, text_item = self._hover_items
+        if text is not None and text != self._hover_text:
+            self.canvas.itemconfigure(text_item, text=text)
+            self._hover_text = text
+        self._update_item(text_item, xy)
+        if xy is not None:
+            lines = text.split("\n")
+            w = max(self.measure_text(line, self.hover_font) for line in lines)
+            self._update_item(rect_item, (xy[0] - 4, xy[1] - 3, xy[0] + w + 4, xy[1] + 15 * len(lines) + 3))
+            self.canvas.tag_raise("hover")
+        else:
+            self._update_item(rect_item, None)
+        self.hover_timings.append(time.perf_counter() - start)
+
+    def hover_text(self, px, py):
+        # Ring/elevation/TOF from the mortar to map pixel (px, py); no clearance check, no caching
+        weapon = self.get_weapon_table()
+        shell_table = self.get_current_shell_table()
+        if shell_table is None or not (0 <= px <= self.map_width_px and 0 <= py <= self.map_height_px):
+            return None
+        dx_m = (px - self.mortar[0]) * self.m_per_px
+        dy_m = (py - self.mortar[1]) * self.m_per_px
+        dist_m = math.hypot(dx_m, dy_m)
+        dz = self.get_elevation(px, py) - self.get_elevation(*self.mortar)
+        azimuth_mil = ((math.degrees(math.atan2(dx_m, -dy_m)) + 360) % 360) / 360 * weapon.mils_per_circle
+        dense = self.get_dense_shell_table()
+        if dense is not None:
+            found = dense.lookup(dist_m, dz, weapon.dz_correction_factor, weapon.min_elevation_mil)
+            ring, elev, tof = found[:3] if found is not None else (None, None, None)
+        else:
+            ring, entry = shell_table.best_ring(dist_m, dz, weapon.dz_correction_factor, weapon.min_elevation_mil)
+            if ring is not None:
+                elev, tof, _ = interpolate_entry(entry, dist_m)
+        if ring is None:
+            return f"{dist_m:.0f} m  AZ {azimuth_mil:.0f}\nNo solution"
+        elev += dz * weapon.dz_correction_factor
+        lo, hi = weapon.elevation_limits_mil
+        if not lo <= elev <= hi:
+            return f"{dist_m:.0f} m  AZ {azimuth_mil:.0f}\nElevation {elev:.0f} out of range"
+        return f"{dist_m:.0f} m  AZ {azimuth_mil:.0f}\nRING {ring}  ELEV {elev:.0f}  TOF {tof:.1f}s"
+
+    def hover_stats(self):
+        # Per-update cost of the hover tooltip (ms), or None before the first update
+        if not self.hover_timings:
+            return None
+        samples = sorted(self.hover_timings)
+        pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+        return {'events': len(samples), 'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'max_ms': samples[-1] * 1000}
+
+    def toggle_perf_hud(self):
+        # F3: stage timings on/off together with the HUD; the recorded trace is kept for dump_trace
+        self.profiler.enabled = not self.profiler.enabled
+        if self.profiler.enabled:
+            self._draw_perf_hud()
+        else:
+            if self._hud_job is not None:
+                self.root.after_cancel(self._hud_job)
+                self._hud_job = None
+            if self._hud_items is not None:
+                for item in self._hud_items:
+                    self._update_item(item, None)
+
+    def _draw_perf_hud(self):
+        # Bottom-left of the visible window, refreshed every HUD_REFRESH_MS while profiling
+        self._hud_job = None
+        if not self.profiler.enabled:
+            return
+        if self._hud_items is None:
+            self._hud_items = (
+                self.canvas.create_rectangle(0, 0, 0, 0, fill="#111", outline="#0f0", tags="perfhud", state="hidden"),
+                self.canvas.create_text(0, 0, anchor="sw", fill="#0f0", font=self.hover_font, tags="perfhud", state="hidden"),
+            )
+        rect_item, text_item = self._hud_items
+        lines = ["ms (F4: save trace)"] + self.profiler.summary_lines(HUD_STAGES)
+        self.canvas.itemconfigure(text_item, text="\n".join(lines))
+        x = self.canvas.canvasx(10)
+        y = self.canvas.canvasy(self.canvas.winfo_height() - 10)
+        w = max(self.measure_text(line, self.hover_font) for line in lines)
+        self._update_item(text_item, (x, y))
+        self._update_item(rect_item, (x - 4, y - 15 * len(lines) - 3, x + w + 4, y + 3))
+        self.canvas.tag_raise("perfhud")
+        self._hud_job = self.root.after(HUD_REFRESH_MS, self._draw_perf_hud)
+
+    def dump_trace(self):
+        # F4: save the session's stage timings as a trace-event JSON file
+        if not self.profiler.trace:
+            self.output.insert(tk.END, "No timings recorded yet (F3 turns on profiling).\n")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".json", initialfile="mortar-trace.json",
+                                            filetypes=[("Trace (JSON)", "*.json")])
+        if not path:
+            return
+        try:
+            count = self.profiler.dump(path)
+        except OSError as e:
+            messagebox.showerror("Trace", f"Failed to save trace: {e}")
+            return
+        self.output.insert(tk.END, f"Saved {count} timing events to {path}\n")
+
+    def get_target_area(self):
+        # (area, label) for mortar_hits: meters relative to the target (the aim point)
+        if len(self.target_polygon) >= 3:
+            tx, ty = self.target
+            vertices = [((x - tx) * self.m_per_px, (y - ty) * self.m_per_px) for x, y in self.target_polygon]
+            return ('polygon', vertices), "polygon"
+        return ('circle', self.hit_radius_m), f"{self.hit_radius_m:.0f} m circle"
+
+    def draw_obstruction(self, obstruction):
+        # Orange X where the lowest ring's arc hits the terrain
+        if self._obstruction_item is None:
+            if obstruction is None:
+                return
+            self._obstruction_item = self.canvas.create_line(0, 0, 0, 0, fill="orange", width=3, tags="marker", state="hidden")
+        coords = None
+        if obstruction is not None:
+            ox, oy = obstruction[0] * self.display_scale, obstruction[1] * self.display_scale
+            coords = (ox - 6, oy - 6, ox + 6, oy + 6, ox, oy, ox - 6, oy + 6, ox + 6, oy - 6)
+        self._update_item(self._obstruction_item, coords)
 
     def get_elevation(self, px, py):
         # Return elevation from heightmap if available, else 0
-        if self.heightmap_image is not None and self.map_width_px and self.map_height_px:
-            # Map px,py (map image) to hx,hy (heightmap image)
-            hx = int(px / self.map_width_px * self.heightmap_image.width)
-            hy = int(py / self.map_height_px * self.heightmap_image.height)
-            hx = min(max(hx, 0), self.heightmap_image.width - 1)
-            hy = min(max(hy, 0), self.heightmap_image.height - 1)
-            return (self.heightmap_image.getpixel((hx, hy)) / 255.0) * self.max_elevation_m
+        if self.heightmap is not None and self.map_width_px and self.map_height_px:
+            # Bilinear sample; px,py (map image) are scaled to the heightmap's own size
+            with self.profiler.stage('get_elevation'):
+                return float(self.heightmap.sample(px, py, self.map_width_px, self.map_height_px))
         return 0.0
 
-    def get_best_ring(self, dist_m, dz, dz_correction_factor=1.5):
-        table = self.get_current_table()
-        shell = self.selected_shell_type.get() if self.selected_shell_type.get() else (self.shell_types[table][0] if self.shell_types[table] else "HE")
-        best_ring = None
-        best_entry = None
-        for ring, data in self.ring_data[table].get(shell, {}).items():
-            for i in range(len(data) - 1):
-                a, b = data[i], data[i + 1]
-                if a["Range (m)"] <= dist_m <= b["Range (m)"]:
-                    ratio = (dist_m - a["Range (m)"]) / (b["Range (m)"] - a["Range (m)"])
-                    elev = a["Elevation (mil)"] + ratio * (b["Elevation (mil)"] - a["Elevation (mil)"])
-                    corrected_elev = elev + dz * dz_correction_factor
-                    # Only accept solutions above 748 mils (min range)
-                    if corrected_elev >= 748:
-                        if best_ring is None or ring < best_ring:
-                            best_ring = ring
-                            best_entry = (a, b)
-        return best_ring, best_entry
+    def ring_candidates(self, dist_m, dz, dz_correction_factor):
+        # (ring, entry) for every ring that can fire, lowest first; the dense grid picks the rings when enabled
+        weapon = self.get_weapon_table()
+        shell_table = self.get_current_shell_table()
+        if shell_table is None:
+            return
+        dense = self.get_dense_shell_table()
+        if dense is None:
+            yield from shell_table.candidates(dist_m, dz, dz_correction_factor, weapon.min_elevation_mil)
+            return
+        for ring, *_ in dense.candidates(dist_m, dz, dz_correction_factor, weapon.min_elevation_mil):
+            yield ring, shell_table.bracket(ring, dist_m)
+
+    def ring_values(self, ring, entry, dist_m):
+        # (raw elevation, tof, dispersion) from the dense grid when enabled, else interpolated within entry
+        dense = self.get_dense_shell_table()
+        values = dense.values(ring, dist_m) if dense is not None else None
+        return values if values is not None else interpolate_entry(entry, dist_m)
+
+    def get_best_ring(self, dist_m, dz, dz_correction_factor=None):
+        # Bisection over the compiled table (or the dense grid); update_view and calculate
+        # ask for the same solution on every redraw, so the last answer is reused
+        weapon = self.get_weapon_table()
+        if dz_correction_factor is None:
+            dz_correction_factor = weapon.dz_correction_factor
+        key = (self.get_current_table(), self.get_current_shell(), self.use_dense_tables, dist_m, dz,
+               dz_correction_factor)
+        if self._best_ring_cache[0] == key:
+            return self._best_ring_cache[1]
+        result = next(self.ring_candidates(dist_m, dz, dz_correction_factor), (None, None))
+        self._best_ring_cache = (key, result)
+        return result
+
+    def get_firing_ring(self, dist_m, dz, mortar_z, target_z, dz_correction_factor=None):
+        # get_best_ring plus the terrain clearance check. Returns (ring, entry, obstruction, blocked_rings)
+        # where obstruction is find_obstruction()'s result for the lowest ring when no ring clears
+        weapon = self.get_weapon_table()
+        if dz_correction_factor is None:
+            dz_correction_factor = weapon.dz_correction_factor
+        ring, entry = self.get_best_ring(dist_m, dz, dz_correction_factor)
+        if ring is None or not self.clearance_check or self.heightmap is None:
+            return ring, entry, None, []
+        key = (self.get_current_table(), self.get_current_shell(), self.use_dense_tables, self.mortar, self.target,
+               self.heightmap, self.m_per_px, dz_correction_factor)
+        if self._firing_ring_cache[0] == key:
+            return self._firing_ring_cache[1]
+        first_obstruction = None
+        blocked_rings = []
+        result = None
+        for candidate, candidate_entry in self.ring_candidates(dist_m, dz, dz_correction_factor):
+            tof = self.ring_values(candidate, candidate_entry, dist_m)[1]
+            obstruction = find_obstruction(self.heightmap, self.mortar, self.target, self.map_width_px,
+                                           self.map_height_px, self.m_per_px, mortar_z, target_z, tof)
+            if obstruction is None:
+                result = (candidate, candidate_entry, None, blocked_rings)
+                break
+            blocked_rings.append((candidate, obstruction))
+            first_obstruction = first_obstruction or obstruction
+        if result is None:
+            result = (None, None, first_obstruction, blocked_rings)
+        self._firing_ring_cache = (key, result)
+        return result
 
     def load_project_folder(self):
         folder = filedialog.askdirectory(title="Select Arma Project Folder")
         if not folder:
             return
-        # Load map.png
+        # map.png and heightmap.png (or .r16/.asc), whichever exist
         map_path = os.path.join(folder, "map.png")
-        if os.path.exists(map_path):
-            img = Image.open(map_path)
-            self.original_img = img
-            self.map_width_px, self.map_height_px = img.width, img.height
-            max_dim = max(self.map_width_px, self.map_height_px)
-            if max_dim > 1024:
-                self.display_scale = 1024 / max_dim
-            else:
-                self.display_scale = 1.0
-            display_img = img.resize(
-                (int(img.width * self.display_scale), int(img.height * self.display_scale)),
-                resample=Image.BILINEAR
-            )
-            self.tk_img = ImageTk.PhotoImage(display_img)
-            self.canvas.config(width=display_img.width, height=display_img.height)
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.tk_img)
-            mpp_x = self.map_width_m.get() / self.map_width_px
-            mpp_y = self.map_height_m.get() / self.map_height_px
-            self.m_per_px = (mpp_x + mpp_y) / 2
-            self.draw_grid()
-        # Load heightmap.png
-        heightmap_path = os.path.join(folder, "heightmap.png")
-        if os.path.exists(heightmap_path):
-            img = Image.open(heightmap_path).convert("L")
-            self.heightmap_image = img
-        self.update_view()
+        heightmap_path = None
+        for ext in HEIGHTMAP_EXTENSIONS:
+            if os.path.exists(os.path.join(folder, "heightmap" + ext)):
+                heightmap_path = os.path.join(folder, "heightmap" + ext)
+                break
+        if not os.path.exists(map_path) and heightmap_path is None:
+            self.output.insert(tk.END, f"No map.png or heightmap in {folder}\n")
+            return
+        self.start_loading(map_path if os.path.exists(map_path) else None, heightmap_path)
 
 if __name__ == "__main__":
     root = tk.Tk()
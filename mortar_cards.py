@@ -0,0 +1,452 @@
+"""Annotated fire-mission map cards rendered with PIL only (no tkinter/ImageTk imports).
+
+Each card shows the map with the same layers as the GUI (range circles,
+dispersion circle, 1 km grid, mortar/target markers) and the firing
+solution burned into a box in the top-right corner:
+
+    python mortar_cards.py missions.csv --map map.png --heightmap heightmap.png --map-size 10240 10240 --out cards
+    python mortar_cards.py missions.jsonl --map map.png --crop mission --size 800 --workers 4 --out cards
+
+CSV rows are "mortar grid, target grid[, id]" ("X Z" meters, as in the GPS
+box); JSONL lines are objects with "mortar", "target" and an optional "id".
+Cards are rendered across a process pool. Workers open the map's tile cache
+(memory-mapped, so the decoded map is shared through the OS page cache) and
+render one mortar's cards in a row, so with --crop mortar the map region and
+range circles are composited once per mortar and only the dispersion circle
+changes between cards. A cards.csv manifest lists every card's solution.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import ImageDraw, ImageFont
+
+from mortar_ballistics import TableRegistry, parse_grid
+from mortar_cli import ROUNDING, solution_fields
+from mortar_loader import open_tiled_map
+from mortar_render import OverlayLayer
+
+# Longest side of a card (px)
+CARD_SIZE = 1024
+# Map shown around the mortar's max range / around the mortar-target pair (m)
+CARD_MARGIN_M = 150
+# Grid line spacing (m), as drawn by MortarApp.draw_grid
+GRID_M = 1000
+# Cards per task sent to a worker (all from the same mortar)
+CARDS_PER_TASK = 32
+CROP_MODES = ('mortar', 'mission', 'full')
+# Encoder settings per output format; zlib level 1 saves PNGs ~4x faster than PIL's default for ~20% more bytes
+SAVE_OPTIONS = {'png': {'compress_level': 1}, 'jpg': {'quality': 90}}
+CARD_FIELDS = ['id', 'file', 'mortar_x', 'mortar_z', 'target_x', 'target_z', 'range_m', 'azimuth_mil', 'ring',
+               'elevation_mil', 'tof_s', 'dispersion_m', 'valid', 'error']
+# Same colors as the GUI's canvas items
+MAX_RANGE_FILL = (0, 0, 255, int(255 * 0.15))
+MIN_RANGE_FILL = (255, 128, 0, int(255 * 0.15))
+DISPERSION_FILL = (255, 255, 255, 60)
+
+
+def load_font(size):
+    # Consolas like the GUI where it exists, else a common monospace font, else PIL's built-in one
+    for name in ("consola.ttf", "DejaVuSansMono.ttf", "LiberationMono-Regular.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def dashed_line(draw, x0, y0, x1, y1, fill, dash=(2, 2)):
+    """Axis-aligned dashed line (PIL has no dash pattern), like the canvas's dash=(2, 2)."""
+    on, off = dash
+    if x0 == x1:
+        for y in range(int(y0), int(y1), on + off):
+            draw.line([(x0, y), (x0, min(y + on - 1, y1))], fill=fill)
+    else:
+        for x in range(int(x0), int(x1), on + off):
+            draw.line([(x, y0), (min(x + on - 1, x1), y0)], fill=fill)
+
+
+def crop_box(crop, mortar, target, map_w_px, map_h_px, reach_px, margin_px):
+    """Map-pixel box (x0, y0, x1, y1) shown on a card.
+
+    'mortar' is a square around the mortar's max range (the same for all of its
+    targets), 'mission' a square around the mortar and target, 'full' the whole map.
+    """
+    if crop == 'full':
+        return 0.0, 0.0, float(map_w_px), float(map_h_px)
+    if crop == 'mortar':
+        cx, cy = mortar
+        half = reach_px + margin_px
+    else:
+        cx, cy = (mortar[0] + target[0]) / 2, (mortar[1] + target[1]) / 2
+        half = max(abs(mortar[0] - target[0]), abs(mortar[1] - target[1])) / 2 + margin_px
+    return max(0.0, cx - half), max(0.0, cy - half), min(float(map_w_px), cx + half), min(float(map_h_px), cy + half)
+
+
+class CardRenderer:
+    """The GUI's map composition drawn offscreen into a PIL image.
+
+    map_store is a TiledMap or MapPyramid of the whole map, map_size_m its
+    (width, height) in meters. Coordinates are map pixels (y down), as
+    MortarApp stores them. The map region plus range circles is kept in an
+    OverlayLayer between renders, so cards that share a crop, scale and
+    mortar only redraw the dispersion circle, markers and text.
+    """
+
+    def __init__(self, map_store, map_size_m, weapon, shell, heightmap=None, font_size=None):
+        self.map_store = map_store
+        self.map_w_px, self.map_h_px = map_store.width, map_store.height
+        self.mpp_x = map_size_m[0] / self.map_w_px
+        self.mpp_y = map_size_m[1] / self.map_h_px
+        self.m_per_px = (self.mpp_x + self.mpp_y) / 2
+        self.map_size_m = tuple(map_size_m)
+        self.weapon = weapon
+        self.shell = shell
+        self.solver = weapon.solver(shell)
+        self.heightmap = heightmap
+        self.font_size = font_size
+        self.overlay_layer = OverlayLayer()
+        self._fonts = {}
+
+    def __getstate__(self):
+        # The overlay and fonts are per process; map_store and heightmap travel by file
+        state = self.__dict__.copy()
+        state['overlay_layer'] = None
+        state['_fonts'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.overlay_layer = OverlayLayer()
+
+    def font(self, size):
+        font = self._fonts.get(size)
+        if font is None:
+            font = self._fonts[size] = load_font(size)
+        return font
+
+    def grid_to_px(self, x_m, z_m):
+        # Same conversion as MortarApp.set_mortar_from_coords (grid Z grows north)
+        return x_m / self.mpp_x, self.map_h_px - z_m / self.mpp_y
+
+    def elevation(self, px, py):
+        if self.heightmap is None:
+            return np.zeros(np.shape(px))
+        return self.heightmap.sample(px, py, self.map_w_px, self.map_h_px)
+
+    def solve(self, mortars_px, targets_px):
+        """FiringSolutions plus mortar/target elevations for (N, 2) pixel arrays."""
+        mortars_px = np.asarray(mortars_px, dtype=np.float64).reshape(-1, 2)
+        targets_px = np.asarray(targets_px, dtype=np.float64).reshape(-1, 2)
+        mortar_z = self.elevation(mortars_px[:, 0], mortars_px[:, 1])
+        target_z = self.elevation(targets_px[:, 0], targets_px[:, 1])
+        return self.solver.solve(mortars_px, targets_px, mortar_z, target_z, self.m_per_px), mortar_z, target_z
+
+    def region_for(self, box, size=CARD_SIZE):
+        """(scale, region) rendering the map-pixel box with its longest side at size px."""
+        x0, y0, x1, y1 = box
+        scale = size / max(1e-9, x1 - x0, y1 - y0)
+        w, h = int(self.map_w_px * scale), int(self.map_h_px * scale)
+        region = (round(x0 * scale), round(y0 * scale), min(w, round(x1 * scale)), min(h, round(y1 * scale)))
+        return scale, region
+
+    def render(self, region, scale, mortar=None, target=None, dispersion_m=None, text=None):
+        """The composition inside region (canvas pixels at scale) as an RGB image.
+
+        region and scale mean what they do in MortarApp.render_map, so
+        render(viewport, app.display_scale, app.mortar, app.target, ...)
+        matches what the canvas shows.
+        """
+        w, h = int(self.map_w_px * scale), int(self.map_h_px * scale)
+        rx0, ry0, rx1, ry1 = region
+        shell_table = self.weapon.compiled.get(self.shell)
+        circles = []
+        if mortar is not None:
+            mx, my = int(mortar[0] * scale) - rx0, int(mortar[1] * scale) - ry0
+            if shell_table is not None and shell_table.min_range is not None:
+                min_range, max_range = shell_table.min_range, shell_table.max_range
+            else:
+                min_range, max_range = 748, 2300
+            circles.append((mx, my, int(max_range / self.m_per_px * scale), MAX_RANGE_FILL))
+            circles.append((mx, my, int(min_range / self.m_per_px * scale), MIN_RANGE_FILL))
+        key = (self.map_store, region, w, h, mortar, self.weapon.name, self.shell, self.m_per_px)
+        if self.overlay_layer.update(key, lambda: self.map_store.get_region(w, h, region), circles):
+            # The grid is static for the region, so it's baked into the cached composite
+            self.draw_grid(ImageDraw.Draw(self.overlay_layer.image), region, scale)
+        dispersion = None
+        if target is not None and dispersion_m is not None and np.isfinite(dispersion_m):
+            tx, ty = int(target[0] * scale) - rx0, int(target[1] * scale) - ry0
+            dispersion = (tx, ty, int(dispersion_m / self.m_per_px * scale), DISPERSION_FILL)
+        self.overlay_layer.set_dispersion(dispersion)
+        img = self.overlay_layer.image.convert("RGB")
+        draw = ImageDraw.Draw(img)
+        self.draw_markers(draw, region, scale, mortar, target)
+        if text:
+            self.draw_text_box(draw, img.width, text)
+        return img
+
+    def draw_grid(self, draw, region, scale):
+        # White dashed line every GRID_M meters, as MortarApp.draw_grid
+        rx0, ry0, rx1, ry1 = region
+        spacing = max(1, int(GRID_M / self.m_per_px * scale))
+        for x in range(-(-rx0 // spacing) * spacing, rx1, spacing):
+            dashed_line(draw, x - rx0, 0, x - rx0, ry1 - ry0, "white")
+        for y in range(-(-ry0 // spacing) * spacing, ry1, spacing):
+            dashed_line(draw, 0, y - ry0, rx1 - rx0, y - ry0, "white")
+
+    def draw_markers(self, draw, region, scale, mortar, target):
+        # Red mortar, blue target and the white line between them, as MortarApp.draw_markers
+        rx0, ry0 = region[:2]
+        points = {}
+        for name, xy, fill in (('mortar', mortar, "red"), ('target', target, "blue")):
+            if xy is None:
+                continue
+            x, y = int(xy[0] * scale) - rx0, int(xy[1] * scale) - ry0
+            draw.ellipse([x - 5, y - 5, x + 5, y + 5], fill=fill, outline="black")
+            points[name] = (x, y)
+        if len(points) == 2:
+            draw.line([points['mortar'], points['target']], fill="white", width=2)
+
+    def draw_text_box(self, draw, width, text):
+        # Top-right box like the GUI's calculation box
+        font = self.font(self.font_size or max(10, width // 64))
+        left, top, right, bottom = draw.multiline_textbbox((0, 0), text, font=font, spacing=4)
+        box_w, box_h = right - left + 20, bottom - top + 20
+        box_x = max(0, width - box_w - 10)
+        draw.rectangle([box_x, 10, box_x + box_w, 10 + box_h], fill="#222", outline="#fff")
+        draw.multiline_text((box_x + 10 - left, 20 - top), text, fill="white", font=font, spacing=4)
+
+    def render_card(self, mortar, target, text=None, dispersion_m=None, crop='mortar', size=CARD_SIZE,
+                    margin_m=CARD_MARGIN_M):
+        """One mission card for mortar/target map pixels."""
+        shell_table = self.weapon.compiled.get(self.shell)
+        max_range = shell_table.max_range if shell_table is not None and shell_table.max_range else 2300
+        box = crop_box(crop, mortar, target, self.map_w_px, self.map_h_px, max_range / self.m_per_px,
+                       margin_m / self.m_per_px)
+        scale, region = self.region_for(box, size)
+        return self.render(region, scale, mortar, target, dispersion_m, text)
+
+
+def card_text(row, faction, shell, mortar_z, target_z, dz_correction_factor):
+    """Solution box text in the GUI's calculation-box wording."""
+    lines = []
+    if row['id']:
+        lines.append(f"MISSION: {row['id']}")
+    lines += [f"MORTAR: {row['mortar_x']:.0f} {row['mortar_z']:.0f}",
+              f"TARGET: {row['target_x']:.0f} {row['target_z']:.0f}",
+              f"FACTION: {faction}", f"SHELL: {shell}",
+              f"RANGE (M): {row['range_m']:.0f}", f"AZIMUTH: {row['azimuth_mil']:.0f} mils"]
+    if not row['valid']:
+        lines.append("No valid firing solution.")
+        return "\n".join(lines)
+    dz = target_z - mortar_z
+    lines += [f"CHARGE RING: {row['ring']}",
+              f"ELEV (MIL): {row['elevation_mil']:.0f}",
+              f"TIME OF FLIGHT (SEC): {row['tof_s']:.2f}",
+              f"Dispersion Radius: {row['dispersion_m']:.1f} m",
+              f"Mortar Elevation: {mortar_z:.1f} m",
+              f"Target Elevation: {target_z:.1f} m",
+              f"Elevation Delta: {dz:.1f} m",
+              f"dz Correction: {dz * dz_correction_factor:+.1f} mils"]
+    return "\n".join(lines)
+
+
+def read_missions(lines, fmt='csv'):
+    """Yield (mortar_xz, target_xz, label, error) per input line, like mortar_cli.read_targets."""
+    rows = csv.reader(lines) if fmt == 'csv' else lines
+    for row in rows:
+        label = ''
+        try:
+            if fmt == 'csv':
+                if not row or not ''.join(row).strip():
+                    continue
+                if len(row) < 2:
+                    raise ValueError("Expected mortar and target grid columns.")
+                mortar, target, label = row[0], row[1], ','.join(row[2:])
+            else:
+                if not row.strip():
+                    continue
+                item = json.loads(row)
+                label = str(item.get('id', ''))
+                mortar, target = item['mortar'], item['target']
+            mortar_xz, target_xz = parse_grid(str(mortar)), parse_grid(str(target))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            yield None, None, label, str(e)
+            continue
+        yield mortar_xz, target_xz, label, ''
+
+
+def card_tasks(missions, per_task=CARDS_PER_TASK):
+    """Numbered missions grouped by mortar, then split into tasks of at most per_task cards."""
+    groups = {}
+    for index, mission in enumerate(missions):
+        groups.setdefault(mission[0], []).append((index,) + tuple(mission))
+    for group in groups.values():
+        for start in range(0, len(group), per_task):
+            yield group[start:start + per_task]
+
+
+def card_filename(index, label, image_format='png'):
+    safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_')[:40]
+    return f"{index:05d}{'-' + safe if safe else ''}.{image_format}"
+
+
+def render_cards(renderer, task, out_dir, crop='mortar', size=CARD_SIZE, image_format='png'):
+    """Solve and render one task's cards into out_dir; returns a manifest row per card."""
+    rows = []
+    ok = [m for m in task if not m[4]]
+    if ok:
+        mortars = np.array([renderer.grid_to_px(*m[1]) for m in ok])
+        targets = np.array([renderer.grid_to_px(*m[2]) for m in ok])
+        sol, mortar_z, target_z = renderer.solve(mortars, targets)
+    solved = {m[0]: j for j, m in enumerate(ok)}
+    for index, mortar_xz, target_xz, label, error in task:
+        row = dict.fromkeys(CARD_FIELDS)
+        row.update(id=label, valid=False, error=error, file='')
+        j = solved.get(index)
+        if j is not None:
+            row.update(mortar_x=mortar_xz[0], mortar_z=mortar_xz[1], target_x=target_xz[0], target_z=target_xz[1])
+            row.update(solution_fields(sol, j))
+            text = card_text(row, renderer.weapon.name, renderer.shell, float(mortar_z[j]), float(target_z[j]),
+                             renderer.weapon.dz_correction_factor)
+            try:
+                img = renderer.render_card(tuple(mortars[j]), tuple(targets[j]), text, row['dispersion_m'], crop, size)
+                name = card_filename(index, label, image_format)
+                img.save(os.path.join(out_dir, name), **SAVE_OPTIONS[image_format])
+                row['file'] = name
+            except (OSError, ValueError) as e:
+                row['error'] = str(e)
+        rows.append((index, row))
+    return rows
+
+
+# Per-process renderer, set by _init_worker
+_worker_renderer = None
+
+
+def _init_worker(renderer):
+    global _worker_renderer
+    _worker_renderer = renderer
+
+
+def _render_task(task, out_dir, crop, size, image_format):
+    return render_cards(_worker_renderer, task, out_dir, crop, size, image_format)
+
+
+def export_cards(renderer, missions, out_dir, crop='mortar', size=CARD_SIZE, image_format='png', workers=None,
+                 per_task=CARDS_PER_TASK):
+    """Render a card per mission into out_dir; yields (index, manifest row) as tasks finish.
+
+    missions are read_missions() tuples. workers=0 renders in this process;
+    otherwise a ProcessPoolExecutor(workers) gets a pickled copy of renderer,
+    whose map and heightmap are reopened from their cache files.
+    """
+    if crop not in CROP_MODES:
+        raise ValueError(f"crop must be one of {CROP_MODES}")
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = card_tasks(missions, per_task)
+    if workers == 0:
+        for task in tasks:
+            yield from render_cards(renderer, task, out_dir, crop, size, image_format)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(renderer,)) as pool:
+        # Keep a bounded number of tasks in flight so huge mission lists aren't queued all at once
+        pending = []
+        limit = 4 * (workers or os.cpu_count() or 1)
+        for task in itertools.chain(tasks, [None]):
+            if task is not None:
+                pending.append(pool.submit(_render_task, task, out_dir, crop, size, image_format))
+            while pending and (len(pending) >= limit or task is None):
+                yield from pending.pop(0).result()
+
+
+def write_manifest(rows, path):
+    """cards.csv: one line per mission in input order."""
+    rows = [row for _, row in sorted(rows, key=lambda item: item[0])]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(CARD_FIELDS)
+        for row in rows:
+            for key, digits in ROUNDING.items():
+                if row[key] is not None:
+                    row[key] = round(row[key], digits)
+            writer.writerow([row[key] for key in CARD_FIELDS])
+    return rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render annotated map cards for a list of fire missions.")
+    parser.add_argument('missions', nargs='?', default='-', help='CSV or JSONL file of missions, or - for stdin (default)')
+    parser.add_argument('--map', required=True, help='map image (its tile cache is built on first use)')
+    parser.add_argument('--out', default='cards', help='output folder (default: cards)')
+    parser.add_argument('--faction', help='weapon table name (default: first in the tables folder)')
+    parser.add_argument('--shell', help='shell type (default: first in the table)')
+    parser.add_argument('--tables-dir', help='folder of ballistic table CSVs')
+    parser.add_argument('--heightmap', help='heightmap covering the map (.png, .r16, .asc)')
+    parser.add_argument('--map-size', nargs=2, type=float, default=(5120.0, 5120.0), metavar=('W', 'H'),
+                        help='map width and height in meters (default: 5120 5120)')
+    parser.add_argument('--min-elevation-m', type=float, help='heightmap black level in meters')
+    parser.add_argument('--max-elevation-m', type=float, help='heightmap white level in meters')
+    parser.add_argument('--input-format', choices=('auto', 'csv', 'jsonl'), default='auto',
+                        help='missions file format (auto: by extension, csv for stdin)')
+    parser.add_argument('--crop', choices=CROP_MODES, default='mortar',
+                        help="'mortar': the mortar's full range (default), 'mission': mortar and target, 'full': whole map")
+    parser.add_argument('--size', type=int, default=CARD_SIZE, help='longest side of a card in px')
+    parser.add_argument('--image-format', choices=('png', 'jpg'), default='png')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU, 0: no pool)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    registry = TableRegistry(args.tables_dir) if args.tables_dir else TableRegistry()
+    names = registry.names()
+    faction = args.faction or (names[0] if names else None)
+    if faction not in registry.tables:
+        sys.exit(f"Unknown faction {faction!r}; available: {', '.join(names)}")
+    weapon = registry.get(faction)
+    shell = args.shell or (weapon.shell_types[0] if weapon.shell_types else None)
+    if shell not in weapon.compiled:
+        sys.exit(f"Unknown shell {shell!r} for {faction}; available: {', '.join(weapon.shell_types)}")
+    heightmap = None
+    if args.heightmap:
+        from mortar_terrain import MAX_ELEVATION_M, MIN_ELEVATION_M, load_heightmap
+        lo = MIN_ELEVATION_M if args.min_elevation_m is None else args.min_elevation_m
+        hi = MAX_ELEVATION_M if args.max_elevation_m is None else args.max_elevation_m
+        heightmap = load_heightmap(args.heightmap, lo, hi)
+    try:
+        map_store = open_tiled_map(args.map)
+    except OSError as e:
+        sys.exit(f"--map: {e}")
+    renderer = CardRenderer(map_store, args.map_size, weapon, shell, heightmap)
+    fmt = args.input_format
+    if fmt == 'auto':
+        fmt = 'jsonl' if args.missions.lower().endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+    infile = sys.stdin if args.missions == '-' else open(args.missions, newline='', encoding='utf-8')
+    try:
+        missions = list(read_missions(infile, fmt))
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+    results = []
+    for index, row in export_cards(renderer, missions, args.out, args.crop, args.size, args.image_format, args.workers):
+        results.append((index, row))
+        if len(results) % 100 == 0:
+            print(f"{len(results)}/{len(missions)} cards", file=sys.stderr)
+    rows = write_manifest(results, os.path.join(args.out, 'cards.csv'))
+    failed = sum(1 for row in rows if not row['file'])
+    print(f"Wrote {len(rows) - failed} cards to {args.out} ({failed} without a card, see cards.csv)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
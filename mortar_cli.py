@@ -0,0 +1,196 @@
+"""Command-line firing solutions, no GUI (no tkinter/ImageTk imports).
+
+Targets are read from a CSV or JSONL file (or stdin) as grid references in
+the same "X Z" meters format as the GUI's GPS box, and solutions are
+streamed to stdout in chunks, so memory use doesn't grow with the input:
+
+    python mortar_cli.py --mortar "6500 3400" --faction NATO --shell HE targets.csv
+    cat targets.jsonl | python mortar_cli.py --mortar "6500 3400" --format jsonl --heightmap hm.png -
+
+CSV rows are either an "X Z" field or X,Z columns; anything after is kept
+as a label. JSONL lines are a "X Z" string or an object with "grid" (or
+"x" and "z") plus an optional "id".
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+
+import numpy as np
+
+from mortar_ballistics import TableRegistry, compile_dense_tables, parse_grid
+
+# Targets solved per vectorized call
+CHUNK_ROWS = 4096
+OUTPUT_FIELDS = ['x', 'z', 'id', 'range_m', 'azimuth_mil', 'ring', 'elevation_mil', 'tof_s', 'dispersion_m',
+                 'valid', 'error']
+
+
+def read_targets(lines, fmt='csv'):
+    """Yield (x_m, z_m, label, error) per input line; unparsable lines keep their error instead."""
+    rows = csv.reader(lines) if fmt == 'csv' else lines
+    for row in rows:
+        label = ''
+        try:
+            if fmt == 'csv':
+                if not row or not ''.join(row).strip():
+                    continue
+                if len(row) == 1 or len(row[0].split()) > 1:
+                    # "X Z" grid in the first field, like mortar_cards.read_missions
+                    grid, label = row[0], ','.join(row[1:])
+                else:
+                    grid, label = f"{row[0]} {row[1]}", ','.join(row[2:])
+            else:
+                if not row.strip():
+                    continue
+                item = json.loads(row)
+                if isinstance(item, dict):
+                    label = str(item.get('id', ''))
+                    grid = item['grid'] if 'grid' in item else f"{item['x']} {item['z']}"
+                else:
+                    grid = item
+            x_m, z_m = parse_grid(str(grid))
+        except (ValueError, KeyError, TypeError) as e:
+            yield None, None, label, str(e)
+            continue
+        yield x_m, z_m, label, ''
+
+
+def chunked(iterable, size=CHUNK_ROWS):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def solve_targets(targets, solver, mortar_xz, map_size_m, heightmap=None, chunk_rows=CHUNK_ROWS):
+    """Yield an output dict per target, solving chunk_rows targets per vectorized call.
+
+    Grid Z grows north, so map y (down) is map height - Z, as in the GUI.
+    """
+    map_w_m, map_h_m = map_size_m
+    mortar = (mortar_xz[0], map_h_m - mortar_xz[1])
+    mortar_z = 0.0
+    if heightmap is not None:
+        mortar_z = float(heightmap.sample(mortar[0], mortar[1], map_w_m, map_h_m))
+    for chunk in chunked(targets, chunk_rows):
+        ok = [i for i, t in enumerate(chunk) if not t[3]]
+        sol = None
+        if ok:
+            xy = np.array([(chunk[i][0], map_h_m - chunk[i][1]) for i in ok], dtype=np.float64)
+            target_z = 0.0
+            if heightmap is not None:
+                target_z = heightmap.sample(xy[:, 0], xy[:, 1], map_w_m, map_h_m)
+            sol = solver.solve(mortar, xy, mortar_z, target_z, m_per_px=1.0)
+        solved = dict(zip(ok, range(len(ok))))
+        for i, (x_m, z_m, label, error) in enumerate(chunk):
+            row = dict.fromkeys(OUTPUT_FIELDS)
+            row.update(x=x_m, z=z_m, id=label, valid=False, error=error)
+            j = solved.get(i)
+            if j is not None:
+                row.update(solution_fields(sol, j))
+            yield row
+
+
+def solution_fields(sol, j):
+    """Output fields for pair j of a FiringSolutions; ring/elevation/TOF/dispersion are None if it can't be fired."""
+    fields = {'range_m': float(sol.range_m[j]), 'azimuth_mil': float(sol.azimuth_mil[j]), 'ring': None,
+              'elevation_mil': None, 'tof_s': None, 'dispersion_m': None, 'valid': False}
+    if sol.valid[j]:
+        fields.update(ring=int(sol.ring[j]), elevation_mil=float(sol.elevation_mil[j]),
+                      tof_s=float(sol.tof_s[j]), dispersion_m=float(sol.dispersion_m[j]), valid=True)
+    return fields
+
+
+# Decimal places per output column
+ROUNDING = {'range_m': 1, 'azimuth_mil': 1, 'elevation_mil': 1, 'tof_s': 2, 'dispersion_m': 1}
+
+
+def write_rows(rows, out, fmt='csv'):
+    """Write solution dicts to out as CSV (with a header) or JSONL."""
+    writer = csv.writer(out, lineterminator='\n') if fmt == 'csv' else None
+    if writer is not None:
+        writer.writerow(OUTPUT_FIELDS)
+    for row in rows:
+        for key, digits in ROUNDING.items():
+            if row[key] is not None:
+                row[key] = round(row[key], digits)
+        if writer is not None:
+            writer.writerow([row[key] for key in OUTPUT_FIELDS])
+        else:
+            out.write(json.dumps(row) + '\n')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Stream mortar firing solutions for a list of target grid references.")
+    parser.add_argument('targets', nargs='?', default='-', help='CSV or JSONL file of targets, or - for stdin (default)')
+    parser.add_argument('--mortar', help='mortar grid reference, e.g. "6500 3400" (required unless --list)')
+    parser.add_argument('--faction', help='weapon table name (default: first in the tables folder)')
+    parser.add_argument('--shell', help='shell type (default: first in the table)')
+    parser.add_argument('--tables-dir', help='folder of ballistic table CSVs')
+    parser.add_argument('--heightmap', help='heightmap covering the map (.png, .r16, .asc)')
+    parser.add_argument('--map-size', nargs=2, type=float, default=(5120.0, 5120.0), metavar=('W', 'H'),
+                        help='map width and height in meters (default: 5120 5120)')
+    parser.add_argument('--min-elevation-m', type=float, help='heightmap black level in meters')
+    parser.add_argument('--max-elevation-m', type=float, help='heightmap white level in meters')
+    parser.add_argument('--input-format', choices=('auto', 'csv', 'jsonl'), default='auto',
+                        help='target file format (auto: by extension, csv for stdin)')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv', help='output format')
+    parser.add_argument('--dense', action='store_true', help='answer from the 1 m dense lookup grids')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='targets solved per vectorized batch')
+    parser.add_argument('--list', action='store_true', help='list factions and shells, then exit')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    registry = TableRegistry(args.tables_dir) if args.tables_dir else TableRegistry()
+    if args.list:
+        for name in registry.names():
+            print(f"{name}: {', '.join(registry.get(name).shell_types)}")
+        return 0
+    names = registry.names()
+    faction = args.faction or (names[0] if names else None)
+    if faction not in registry.tables:
+        sys.exit(f"Unknown faction {faction!r}; available: {', '.join(names)}")
+    weapon = registry.get(faction)
+    shell = args.shell or (weapon.shell_types[0] if weapon.shell_types else None)
+    if shell not in weapon.compiled:
+        sys.exit(f"Unknown shell {shell!r} for {faction}; available: {', '.join(weapon.shell_types)}")
+    if args.mortar is None:
+        sys.exit("--mortar is required")
+    dense = compile_dense_tables(weapon.compiled).get(shell) if args.dense else None
+    solver = weapon.solver(shell, dense)
+    try:
+        mortar_xz = parse_grid(args.mortar)
+    except ValueError as e:
+        sys.exit(f"--mortar: {e}")
+    heightmap = None
+    if args.heightmap:
+        # Only pulled in when needed; mortar_terrain imports PIL.Image (not ImageTk)
+        from mortar_terrain import MAX_ELEVATION_M, MIN_ELEVATION_M, load_heightmap
+        lo = MIN_ELEVATION_M if args.min_elevation_m is None else args.min_elevation_m
+        hi = MAX_ELEVATION_M if args.max_elevation_m is None else args.max_elevation_m
+        heightmap = load_heightmap(args.heightmap, lo, hi)
+    fmt = args.input_format
+    if fmt == 'auto':
+        fmt = 'jsonl' if args.targets.lower().endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+    infile = sys.stdin if args.targets == '-' else open(args.targets, newline='', encoding='utf-8')
+    try:
+        rows = solve_targets(read_targets(infile, fmt), solver, mortar_xz, args.map_size, heightmap, args.chunk_rows)
+        write_rows(rows, sys.stdout, args.format)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Downstream closed early (e.g. piped into head)
+        sys.stderr.close()
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import math
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+# Impact points drawn per estimate (more = steadier numbers, slower first query)
+HIT_SAMPLES = 20000
+# Points sampled per vectorized batch
+HIT_BATCH = 65536
+# Dispersions are rounded to this step (m) so nearby ranges share one cached estimate
+DISPERSION_STEP_M = 0.1
+HIT_CACHE_SIZE = 512
+# How the table's "Dispersion Radius (m)" is read:
+#   'uniform' - every round lands inside the radius, evenly over the disk (how the overlay draws it)
+#   'normal'  - circular normal where the radius is the CEP (half the rounds land inside it)
+DISPERSION_MODELS = ('uniform', 'normal')
+
+# probability of one round landing in the area; expected_rounds = 1 / probability (inf if 0);
+# std_error is the Monte Carlo standard error of probability
+HitEstimate = namedtuple('HitEstimate', ['probability', 'expected_rounds', 'std_error', 'samples'])
+
+
+def sample_impacts(rng, n, dispersion_m, model='uniform'):
+    """(n, 2) impact offsets (m) around the aim point."""
+    if model == 'normal':
+        # CEP = sigma * sqrt(2 ln 2)
+        sigma = dispersion_m / math.sqrt(2 * math.log(2))
+        return rng.normal(0.0, sigma, (n, 2))
+    r = dispersion_m * np.sqrt(rng.random(n))
+    theta = rng.random(n) * (2 * math.pi)
+    return np.column_stack((r * np.cos(theta), r * np.sin(theta)))
+
+
+def points_in_polygon(points, polygon):
+    """Even-odd rule for many points against one polygon [(x, y), ...]; loops over edges only."""
+    x, y = points[:, 0], points[:, 1]
+    inside = np.zeros(len(points), dtype=bool)
+    poly = np.asarray(polygon, dtype=np.float64)
+    for (x0, y0), (x1, y1) in zip(poly, np.roll(poly, -1, axis=0)):
+        crosses = (y0 > y) != (y1 > y)
+        if not crosses.any():
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_at = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses & (x < x_at)
+    return inside
+
+
+def in_area(points, area):
+    """area is ('circle', radius_m) around the aim point or ('polygon', [(x, y), ...]) in m relative to it."""
+    kind, shape = area
+    if kind == 'circle':
+        return np.einsum('ij,ij->i', points, points) <= shape * shape
+    return points_in_polygon(points, shape)
+
+
+def hit_probability(dispersion_m, area, samples=HIT_SAMPLES, model='uniform', seed=0, batch=HIT_BATCH):
+    """Monte Carlo chance that one round aimed at the origin lands in area."""
+    if dispersion_m <= 0:
+        hit = bool(in_area(np.zeros((1, 2)), area)[0])
+        return HitEstimate(float(hit), 1.0 if hit else math.inf, 0.0, 1)
+    rng = np.random.default_rng(seed)
+    hits = 0
+    done = 0
+    while done < samples:
+        n = min(batch, samples - done)
+        hits += int(np.count_nonzero(in_area(sample_impacts(rng, n, dispersion_m, model), area)))
+        done += n
+    p = hits / done
+    return HitEstimate(p, 1.0 / p if p > 0 else math.inf, math.sqrt(p * (1 - p) / done), done)
+
+
+def rounds_for_confidence(probability, confidence=0.9):
+    """Rounds needed for at least one hit with the given confidence."""
+    if probability <= 0:
+        return math.inf
+    if probability >= 1:
+        return 1
+    return math.ceil(math.log(1 - confidence) / math.log(1 - probability))
+
+
+def area_key(area, precision_m=0.5):
+    # Hashable, rounded form of an area for the cache
+    kind, shape = area
+    if kind == 'circle':
+        return kind, round(shape / precision_m)
+    return kind, tuple((round(x / precision_m), round(y / precision_m)) for x, y in shape)
+
+
+class HitProbabilityCache:
+    """hit_probability() memoized per (dispersion, area).
+
+    The estimate depends only on the dispersion radius and the area, so the
+    key holds the dispersion itself (rounded to dispersion_step_m) rather
+    than the ring or range it came from: another faction or shell with a
+    different dispersion never reuses a stale result. samples is the
+    accuracy/latency knob: the standard error is about 0.5 / sqrt(samples).
+    """
+
+    def __init__(self, samples=HIT_SAMPLES, model='uniform', dispersion_step_m=DISPERSION_STEP_M,
+                 cache_size=HIT_CACHE_SIZE):
+        if model not in DISPERSION_MODELS:
+            raise ValueError(f"model must be one of {DISPERSION_MODELS}")
+        self.samples = samples
+        self.model = model
+        self.dispersion_step_m = dispersion_step_m
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def estimate(self, dispersion_m, area):
+        steps = round(dispersion_m / self.dispersion_step_m)
+        key = (steps, area_key(area), self.model, self.samples)
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            return result
+        result = hit_probability(steps * self.dispersion_step_m, area, self.samples, self.model)
+        self._cache[key] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        self._cache.clear()
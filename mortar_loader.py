@@ -0,0 +1,159 @@
+import math
+import os
+import queue
+import threading
+import time
+
+from PIL import Image
+
+from mortar_render import TILE_CACHE_BYTES, ZOOM_CACHE_BYTES, MapPyramid, TiledMap, map_tile_cache_path
+from mortar_terrain import MAX_ELEVATION_M, MIN_ELEVATION_M, load_heightmap
+
+# Longest side of the coarse preview shown before the full map is decoded
+PREVIEW_SIZE = 1024
+# Maps are local files the user picked; PIL's default bomb limit (~179M px) rejects 16k maps
+MAX_MAP_PIXELS = 16384 * 16384
+if Image.MAX_IMAGE_PIXELS is not None and Image.MAX_IMAGE_PIXELS < MAX_MAP_PIXELS:
+    Image.MAX_IMAGE_PIXELS = MAX_MAP_PIXELS
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+def open_tiled_map(map_path, tile_cache_bytes=TILE_CACHE_BYTES):
+    """The map's TiledMap, decoding it and writing the tile cache only if there isn't one yet."""
+    cache_path = map_tile_cache_path(map_path)
+    tiled = TiledMap.load(cache_path, tile_cache_bytes)
+    with Image.open(map_path) as img:
+        if tiled is not None and (tiled.width, tiled.height) == img.size:
+            return tiled
+        img.load()
+        return TiledMap.build(img, cache_path, tile_cache_bytes)
+
+
+def reduce_to_fit(img, max_size):
+    # Integer box-reduce so the longest side is at most max_size (fast, no resampling filter)
+    factor = int(math.ceil(max(img.size) / max_size))
+    return img.reduce(factor) if factor > 1 else img
+
+
+def draft_preview(path, max_size=PREVIEW_SIZE):
+    """Coarse copy decoded at reduced size, or None if the format can't do that.
+
+    JPEG decoders can scale by 1/2../1/8 while decoding (Image.draft), so the
+    preview costs a fraction of a full decode. PNG has no such mode.
+    """
+    img = Image.open(path)
+    if img.format != "JPEG":
+        img.close()
+        return None
+    img.draft("RGB", (max_size, max_size))
+    return reduce_to_fit(img, max_size)
+
+
+class MapLoadJob:
+    """Decodes a map and/or heightmap on a worker thread.
+
+    Results arrive on .messages as (kind, value) tuples, in this order:
+    ('size', (w, h)) as soon as the header is read, ('preview', MapPyramid)
+    of a coarse copy, ('map', TiledMap) (a MapPyramid if the tile cache
+    can't be written), ('heightmap', Heightmap), then ('done', seconds).
+    ('progress', text) can arrive at any point; ('error', text) and
+    ('cancelled', None) end the job early. The Tk thread polls the queue,
+    so nothing here touches Tk. A thread is enough: PIL releases the GIL
+    while decoding and resizing, and the decoded map stays in this process.
+    """
+
+    def __init__(self, map_path=None, heightmap_path=None, cache_bytes=ZOOM_CACHE_BYTES,
+                 min_elevation_m=MIN_ELEVATION_M, max_elevation_m=MAX_ELEVATION_M,
+                 preview_size=PREVIEW_SIZE, tile_cache_bytes=TILE_CACHE_BYTES):
+        self.map_path = map_path
+        self.heightmap_path = heightmap_path
+        self.cache_bytes = cache_bytes
+        self.tile_cache_bytes = tile_cache_bytes
+        self.min_elevation_m = min_elevation_m
+        self.max_elevation_m = max_elevation_m
+        self.preview_size = preview_size
+        self.messages = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="map-loader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        # Takes effect at the next step boundary; a decode already running finishes first
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def _post(self, kind, value=None):
+        self.messages.put((kind, value))
+
+    def _check(self):
+        if self._cancel.is_set():
+            raise LoadCancelled()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            if self.map_path:
+                self._load_map()
+            if self.heightmap_path:
+                self._check()
+                name = os.path.basename(self.heightmap_path)
+                self._post('progress', f"Loading heightmap {name}...")
+                self._post('heightmap', load_heightmap(self.heightmap_path, self.min_elevation_m, self.max_elevation_m))
+        except LoadCancelled:
+            self._post('cancelled')
+        except (OSError, ValueError, MemoryError, Image.DecompressionBombError) as e:
+            self._post('error', str(e))
+        except Exception as e:
+            # Anything else still has to end the job, or the poller waits on a dead thread
+            self._post('error', f"{type(e).__name__}: {e}")
+        else:
+            self._post('done', time.perf_counter() - start)
+
+    def _load_map(self):
+        name = os.path.basename(self.map_path)
+        with Image.open(self.map_path) as header:
+            size = header.size
+        self._post('size', size)
+        # Already tiled: nothing to decode
+        cache_path = map_tile_cache_path(self.map_path)
+        tiled = TiledMap.load(cache_path, self.tile_cache_bytes)
+        if tiled is not None and (tiled.width, tiled.height) == size:
+            self._post('progress', f"Using tile cache for {name}")
+            self._post('map', tiled)
+            return
+        preview = draft_preview(self.map_path, self.preview_size)
+        if preview is not None:
+            self._post('preview', MapPyramid(preview, self.cache_bytes))
+        self._check()
+        self._post('progress', f"Decoding {name} ({size[0]}x{size[1]})...")
+        # load() closes the file once the image is decoded
+        img = Image.open(self.map_path)
+        img.load()
+        self._check()
+        if preview is None:
+            self._post('preview', MapPyramid(reduce_to_fit(img, self.preview_size), self.cache_bytes))
+
+        def on_level(width, height):
+            self._check()
+            self._post('progress', f"Building zoom level {width}x{height}...")
+        try:
+            self._post('progress', f"Writing tile cache for {name}...")
+            tiled = TiledMap.build(img, cache_path, self.tile_cache_bytes, on_level=on_level)
+        except OSError as e:
+            self._post('progress', f"Tile cache unavailable ({e}), keeping the map in memory")
+            tiled = MapPyramid(img, self.cache_bytes, on_level=on_level)
+        del img
+        self._post('map', tiled)
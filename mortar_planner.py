@@ -0,0 +1,102 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Seconds between two rounds from the same tube (reload and re-lay)
+RELOAD_S = 4.0
+# Extra dispersion (m) a tube's next mission is worth when spreading targets across tubes
+LOAD_PENALTY_M = 10.0
+
+# One round of a time-on-target schedule; times are seconds after the first round is fired
+ScheduledRound = namedtuple('ScheduledRound', [
+    'tube', 'target', 'wave', 'fire_time_s', 'impact_time_s',
+    'ring', 'elevation_mil', 'azimuth_mil', 'tof_s', 'dispersion_m',
+])
+# solutions is the (tubes, targets) FiringSolutions matrix; assignment[j] is target j's tube or -1
+FirePlan = namedtuple('FirePlan', ['solutions', 'assignment', 'schedule', 'wave_interval_s'])
+
+
+def solution_matrix(solver, mortars_xy, targets_xy, mortar_z=0.0, target_z=0.0, m_per_px=1.0):
+    """FiringSolutions for every mortar/target pair in one call; each field is (n_mortars, n_targets).
+
+    mortar_z/target_z are scalars or one value per mortar/target.
+    """
+    mortars = np.asarray(mortars_xy, dtype=np.float64).reshape(-1, 1, 2)
+    targets = np.asarray(targets_xy, dtype=np.float64).reshape(1, -1, 2)
+    mortar_z = np.asarray(mortar_z, dtype=np.float64)
+    target_z = np.asarray(target_z, dtype=np.float64)
+    if mortar_z.ndim:
+        mortar_z = mortar_z.reshape(-1, 1)
+    if target_z.ndim:
+        target_z = target_z.reshape(1, -1)
+    return solver.solve(mortars, targets, mortar_z, target_z, m_per_px)
+
+
+def assign_tubes(solutions, load_penalty_m=LOAD_PENALTY_M):
+    """Pick one tube per target: the tightest dispersion among tubes that can reach it.
+
+    Targets with the fewest capable tubes are assigned first so they aren't
+    crowded out, and every mission already given to a tube adds load_penalty_m
+    to its cost so work spreads across the battery. Returns an int array of
+    tube indices per target, -1 where no tube can fire.
+    """
+    valid = np.asarray(solutions.valid)
+    n_tubes, n_targets = valid.shape
+    dispersion = np.where(valid, solutions.dispersion_m, np.inf)
+    assignment = np.full(n_targets, -1, dtype=np.intp)
+    load = np.zeros(n_tubes)
+    reach = valid.sum(axis=0)
+    order = np.lexsort((dispersion.min(axis=0) if n_tubes else np.zeros(n_targets), reach))
+    for target in order:
+        if not reach[target]:
+            continue
+        cost = dispersion[:, target] + load * load_penalty_m
+        tube = int(np.argmin(cost))
+        assignment[target] = tube
+        load[tube] += 1
+    return assignment
+
+
+def time_on_target_schedule(solutions, assignment, reload_s=RELOAD_S):
+    """Fire times so every round of a wave lands at the same moment.
+
+    A tube's first mission is in wave 0, its second in wave 1 and so on.
+    Waves are wave_interval_s apart: the spread of flight times plus
+    reload_s, so one tube's consecutive rounds are never closer than
+    reload_s. Wave 0 impacts at the longest flight time, so the first
+    round leaves at t = 0. Returns (rounds sorted by fire time, wave_interval_s).
+    """
+    targets = np.flatnonzero(assignment >= 0)
+    if not targets.size:
+        return [], 0.0
+    tubes = assignment[targets]
+    tof = np.asarray(solutions.tof_s)[tubes, targets]
+    wave_interval = float(tof.max() - tof.min()) + reload_s
+    impact0 = float(tof.max())
+    # Longest flights first within each tube
+    order = np.lexsort((-tof, tubes))
+    wave = np.zeros(targets.size, dtype=np.intp)
+    for k in range(1, order.size):
+        if tubes[order[k]] == tubes[order[k - 1]]:
+            wave[order[k]] = wave[order[k - 1]] + 1
+    impact = impact0 + wave * wave_interval
+    fire = impact - tof
+    rounds = [
+        ScheduledRound(int(tubes[i]), int(targets[i]), int(wave[i]), float(fire[i]), float(impact[i]),
+                       int(solutions.ring[tubes[i], targets[i]]),
+                       float(solutions.elevation_mil[tubes[i], targets[i]]),
+                       float(solutions.azimuth_mil[tubes[i], targets[i]]),
+                       float(tof[i]), float(solutions.dispersion_m[tubes[i], targets[i]]))
+        for i in range(targets.size)
+    ]
+    rounds.sort(key=lambda r: (r.fire_time_s, r.tube))
+    return rounds, wave_interval
+
+
+def plan_fire_mission(solver, mortars_xy, targets_xy, mortar_z=0.0, target_z=0.0, m_per_px=1.0,
+                      reload_s=RELOAD_S, load_penalty_m=LOAD_PENALTY_M):
+    """Solution matrix, tube assignment and time-on-target schedule in one go."""
+    solutions = solution_matrix(solver, mortars_xy, targets_xy, mortar_z, target_z, m_per_px)
+    assignment = assign_tubes(solutions, load_penalty_m)
+    schedule, wave_interval = time_on_target_schedule(solutions, assignment, reload_s)
+    return FirePlan(solutions, assignment, schedule, wave_interval)
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# Timings kept per stage for the rolling p50/p95
+PROFILE_WINDOW = 240
+# Events kept for the session trace (oldest dropped first)
+TRACE_MAX_EVENTS = 200000
+
+_DISABLED = nullcontext()
+
+
+def percentile(sorted_samples, q):
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start, self.start)
+        return False
+
+
+class Profiler:
+    """Opt-in stage timer: rolling per-stage timings plus a session trace.
+
+        with profiler.stage('draw_grid'):
+            ...
+
+    While disabled, stage() hands back one shared no-op context manager, so
+    instrumented code costs an attribute check per call. dump() writes the
+    trace in Chrome's trace-event format (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, enabled=False, window=PROFILE_WINDOW, max_events=TRACE_MAX_EVENTS):
+        self.enabled = enabled
+        self.window = window
+        self.timings = {}
+        self.trace = deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _DISABLED
+        return _Stage(self, name)
+
+    def record(self, name, seconds, start=None):
+        """Add one timing; start (perf_counter) defaults to seconds before now."""
+        if not self.enabled:
+            return
+        samples = self.timings.get(name)
+        if samples is None:
+            samples = self.timings[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+        if start is None:
+            start = time.perf_counter() - seconds
+        self.trace.append((name, start, seconds, threading.get_ident()))
+
+    def stats(self):
+        """{stage: {'count', 'last_ms', 'p50_ms', 'p95_ms', 'max_ms'}} over the rolling window."""
+        result = {}
+        for name, samples in self.timings.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            result[name] = {'count': len(ordered), 'last_ms': samples[-1] * 1000,
+                            'p50_ms': percentile(ordered, 0.5) * 1000, 'p95_ms': percentile(ordered, 0.95) * 1000,
+                            'max_ms': ordered[-1] * 1000}
+        return result
+
+    def summary_lines(self, order=()):
+        """A header plus one 'stage  last  p50  p95' line (ms) per stage, stages in order first."""
+        stats = self.stats()
+        names = [n for n in order if n in stats] + sorted(n for n in stats if n not in order)
+        lines = [f"{'stage':18s} {'last':>7s} {'p50':>7s} {'p95':>7s}"]
+        for name in names:
+            s = stats[name]
+            lines.append(f"{name[:18]:18s} {s['last_ms']:7.1f} {s['p50_ms']:7.1f} {s['p95_ms']:7.1f}")
+        return lines
+
+    def reset(self):
+        self.timings.clear()
+        self.trace.clear()
+
+    def dump(self, path):
+        """Write the session trace (plus rolling stats) as trace-event JSON; returns the event count."""
+        pid = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'ts': round((start - self.origin) * 1e6, 1),
+                   'dur': round(seconds * 1e6, 1), 'pid': pid, 'tid': tid}
+                  for name, start, seconds, tid in list(self.trace)]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'stats': self.stats()}, f)
+        return len(events)
+
+
+# Shared by code that can be profiled but has no profiler of its own
+NULL_PROFILER = Profiler()
@@ -0,0 +1,102 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+# Ground resolution of the reachability raster (m per cell) and tile size (cells)
+REACH_CELL_M = 20.0
+REACH_TILE_CELLS = 64
+# Ring colors for the "ring" view (RGBA), cycled for rings beyond the list
+RING_COLORS = [
+    (0, 200, 255, 90), (0, 255, 120, 90), (255, 230, 0, 90),
+    (255, 140, 0, 90), (255, 0, 200, 90), (160, 90, 255, 90),
+]
+NO_SOLUTION_COLOR = (255, 0, 0, 70)
+REACH_MODES = ('ring', 'elevation')
+
+# Cell states in ReachabilityJob.ring besides ring numbers
+NOT_SOLVED = -2
+NO_SOLUTION = -1
+
+
+def solve_tile(spec, tile):
+    """Solve one tile of a ReachabilityJob; runs in worker processes, so spec is plain picklable data."""
+    solver, heightmap, mortar_px, mortar_z, map_width_px, map_height_px, m_per_px, origin, cell_px = spec
+    ix, iy, nx, ny = tile
+    xs = origin[0] + (ix + np.arange(nx) + 0.5) * cell_px
+    ys = origin[1] + (iy + np.arange(ny) + 0.5) * cell_px
+    px, py = np.meshgrid(xs, ys)
+    target_z = 0.0
+    if heightmap is not None:
+        target_z = heightmap.sample(px, py, map_width_px, map_height_px)
+    sol = solver.solve(mortar_px, np.stack([px, py], axis=-1), mortar_z, target_z, m_per_px)
+    ring = np.where(sol.valid, sol.ring, NO_SOLUTION).astype(np.int8)
+    elevation = np.where(sol.valid, sol.elevation_mil, np.nan).astype(np.float32)
+    return tile, ring, elevation
+
+
+class ReachabilityJob:
+    """Firing solution for every cell within max range of one mortar, split into tiles.
+
+    Cells start as NOT_SOLVED and are filled in by store() as tiles finish,
+    so partial results can be drawn while the rest is still being computed.
+    """
+
+    def __init__(self, solver, mortar_px, mortar_z, map_width_px, map_height_px, m_per_px,
+                 heightmap=None, cell_m=REACH_CELL_M, tile_cells=REACH_TILE_CELLS):
+        self.cell_px = cell_m / m_per_px
+        reach_px = (solver.table.max_range or 0) / m_per_px
+        x0 = max(0.0, mortar_px[0] - reach_px)
+        y0 = max(0.0, mortar_px[1] - reach_px)
+        x1 = min(float(map_width_px), mortar_px[0] + reach_px)
+        y1 = min(float(map_height_px), mortar_px[1] + reach_px)
+        self.nx = max(1, int(math.ceil((x1 - x0) / self.cell_px)))
+        self.ny = max(1, int(math.ceil((y1 - y0) / self.cell_px)))
+        # Map pixel box covered by the raster
+        self.box = (x0, y0, x0 + self.nx * self.cell_px, y0 + self.ny * self.cell_px)
+        self.spec = (solver, heightmap, tuple(mortar_px), mortar_z, map_width_px, map_height_px,
+                     m_per_px, (x0, y0), self.cell_px)
+        self.ring = np.full((self.ny, self.nx), NOT_SOLVED, dtype=np.int8)
+        self.elevation = np.full((self.ny, self.nx), np.nan, dtype=np.float32)
+        self.tiles = [(ix, iy, min(tile_cells, self.nx - ix), min(tile_cells, self.ny - iy))
+                      for iy in range(0, self.ny, tile_cells) for ix in range(0, self.nx, tile_cells)]
+        self.done = 0
+        self._image = None
+        self._image_key = None
+
+    @property
+    def complete(self):
+        return self.done == len(self.tiles)
+
+    def store(self, result):
+        (ix, iy, nx, ny), ring, elevation = result
+        self.ring[iy:iy + ny, ix:ix + nx] = ring
+        self.elevation[iy:iy + ny, ix:ix + nx] = elevation
+        self.done += 1
+
+    def solve_all(self):
+        # In-process fallback (and what the CLI/benchmarks use)
+        for tile in self.tiles:
+            self.store(solve_tile(self.spec, tile))
+        return self
+
+    def to_image(self, mode='ring'):
+        """RGBA raster, one pixel per cell, rebuilt only when new tiles have arrived."""
+        if self._image_key == (mode, self.done):
+            return self._image
+        rgba = np.zeros((self.ny, self.nx, 4), dtype=np.uint8)
+        rgba[self.ring == NO_SOLUTION] = NO_SOLUTION_COLOR
+        solved = self.ring >= 0
+        if mode == 'elevation':
+            elev = self.elevation[solved]
+            if elev.size:
+                lo, hi = float(elev.min()), float(elev.max())
+                t = (elev - lo) / max(hi - lo, 1.0)
+                # Low elevation blue, high elevation yellow
+                rgba[solved] = np.stack([255 * t, 80 + 175 * t, 255 * (1 - t), np.full_like(t, 110)], axis=-1).astype(np.uint8)
+        else:
+            palette = np.array(RING_COLORS, dtype=np.uint8)
+            rgba[solved] = palette[self.ring[solved] % len(palette)]
+        self._image = Image.fromarray(rgba, "RGBA")
+        self._image_key = (mode, self.done)
+        return self._image
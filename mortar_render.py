@@ -0,0 +1,370 @@
+import math
+import os
+import re
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from mortar_profile import NULL_PROFILER
+
+# Memory budget for recently used exact zoom scales
+ZOOM_CACHE_BYTES = 256 * 1024 * 1024
+# Stop building pyramid levels below this size (px, longest side)
+PYRAMID_MIN_SIZE = 256
+# Extra pixels rendered around the visible canvas so small pans don't redraw
+RENDER_MARGIN_PX = 256
+
+
+def image_nbytes(img):
+    return img.width * img.height * len(img.getbands())
+
+
+# === Zoom pyramid ===
+class MapPyramid:
+    """Pre-downscaled copies of a map plus an LRU cache of exact display sizes.
+
+    Each level is half the size of the one before, so any zoom is resampled
+    from a source at most twice its size instead of from the full map.
+    """
+
+    def __init__(self, img, cache_bytes=ZOOM_CACHE_BYTES, min_size=PYRAMID_MIN_SIZE, on_level=None):
+        # on_level(width, height) is called after each level is built (progress reporting/cancelling)
+        if img.mode not in ("L", "RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+        self.width, self.height = img.width, img.height
+        self.levels = [img]
+        while max(self.levels[-1].size) // 2 >= min_size:
+            self.levels.append(self.levels[-1].reduce(2))
+            if on_level is not None:
+                on_level(*self.levels[-1].size)
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+
+    def level_for(self, w, h):
+        # Smallest level that is still at least (w, h), so we only ever downsample
+        for level in reversed(self.levels):
+            if level.width >= w and level.height >= h:
+                return level
+        return self.levels[0]
+
+    def get(self, w, h, resample=Image.BILINEAR):
+        """Map resized to (w, h). Callers must not modify the returned image."""
+        w, h = max(1, w), max(1, h)
+        key = (w, h, resample)
+        img = self._cache.get(key)
+        if img is not None:
+            self._cache.move_to_end(key)
+            return img
+        level = self.level_for(w, h)
+        if level.size == (w, h):
+            return level
+        img = level.resize((w, h), resample=resample)
+        nbytes = image_nbytes(img)
+        if nbytes <= self.cache_bytes:
+            self._cache[key] = img
+            self._cached_bytes += nbytes
+            while self._cached_bytes > self.cache_bytes:
+                _, old = self._cache.popitem(last=False)
+                self._cached_bytes -= image_nbytes(old)
+        return img
+
+    def get_region(self, w, h, box, resample=Image.BILINEAR):
+        """Only the box (x0, y0, x1, y1) of the map as it would look resized to (w, h)."""
+        x0, y0, x1, y1 = box
+        if (x0, y0, x1, y1) == (0, 0, w, h):
+            return self.get(w, h, resample)
+        level = self.level_for(w, h)
+        fx, fy = level.width / w, level.height / h
+        return level.resize((max(1, x1 - x0), max(1, y1 - y0)), resample=resample,
+                            box=(x0 * fx, y0 * fy, x1 * fx, y1 * fy))
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._cached_bytes = 0
+
+
+# === Tiled on-disk map store ===
+# Tile edge (px) and memory budget for decoded tiles kept in RAM
+TILE_SIZE = 512
+TILE_CACHE_BYTES = 256 * 1024 * 1024
+# Tile caches live in this folder next to the map image
+TILE_CACHE_DIR = ".map_tiles"
+# Rows of the previous level reduced per step while building a level (even, so 2x2 boxes never straddle bands)
+BUILD_BAND_ROWS = 2048
+
+
+def map_tile_cache_path(map_path, cache_dir=None):
+    # One directory per map version, named after the image's size and mtime like the ballistic table cache
+    st = os.stat(map_path)
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(map_path)), TILE_CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(map_path))[0]
+    return os.path.join(cache_dir, f"{stem}-{st.st_size}-{st.st_mtime_ns}")
+
+
+class TiledMap:
+    """Map pyramid stored on disk as raw pixel arrays and read back tile by tile.
+
+    Each level is a memory-mapped .npy (half the size of the one before, as in
+    MapPyramid). Rendering only reads the TILE_SIZE tiles that overlap the
+    requested region, and decoded tiles are kept in an LRU capped at
+    cache_bytes, so the map never has to fit in RAM. Drop-in for MapPyramid
+    as far as get()/get_region() go.
+    """
+
+    def __init__(self, arrays, mode, cache_bytes=TILE_CACHE_BYTES, tile_size=TILE_SIZE, path=None):
+        self.arrays = arrays
+        self.mode = mode
+        self.cache_bytes = cache_bytes
+        self.tile_size = tile_size
+        self.path = path
+        self.height, self.width = arrays[0].shape[:2]
+        self._tiles = OrderedDict()
+        self._cached_bytes = 0
+
+    @classmethod
+    def load(cls, cache_path, cache_bytes=TILE_CACHE_BYTES, tile_size=TILE_SIZE):
+        """Open a complete tile cache, or None if there isn't one."""
+        try:
+            names = sorted((n for n in os.listdir(cache_path) if n.startswith("level") and n.endswith(".npy")),
+                           key=lambda n: int(n[5:-4]))
+            arrays = [np.load(os.path.join(cache_path, n), mmap_mode="r") for n in names]
+        except (OSError, ValueError):
+            return None
+        if not arrays:
+            return None
+        mode = {2: "L", 3: "RGB", 4: "RGBA"}[arrays[0].shape[2] if arrays[0].ndim == 3 else 2]
+        return cls(arrays, mode, cache_bytes, tile_size, cache_path)
+
+    @classmethod
+    def build(cls, img, cache_path, cache_bytes=TILE_CACHE_BYTES, tile_size=TILE_SIZE,
+              min_size=PYRAMID_MIN_SIZE, on_level=None):
+        """Write img and its reduced levels to cache_path and open the result.
+
+        Levels after the first are built from the previous level on disk, a band
+        of rows at a time. The cache is written to a temporary directory and
+        renamed into place, so an interrupted build (OSError, or whatever
+        on_level raises to cancel) never leaves a partial cache behind.
+        """
+        if img.mode not in ("L", "RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+        mode = img.mode
+        channels = () if mode == "L" else (len(mode),)
+        parent = os.path.dirname(cache_path)
+        os.makedirs(parent, exist_ok=True)
+        stem = os.path.basename(cache_path).rsplit("-", 2)[0]
+        tmp_path = cache_path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            level = np.lib.format.open_memmap(os.path.join(tmp_path, "level0.npy"), mode="w+", dtype=np.uint8,
+                                              shape=(img.height, img.width) + channels)
+            for y in range(0, img.height, BUILD_BAND_ROWS):
+                level[y:y + BUILD_BAND_ROWS] = np.asarray(img.crop((0, y, img.width, min(img.height, y + BUILD_BAND_ROWS))))
+            level.flush()
+            del img
+            index = 0
+            while max(level.shape[:2]) // 2 >= min_size:
+                index += 1
+                h, w = (level.shape[0] + 1) // 2, (level.shape[1] + 1) // 2
+                reduced = np.lib.format.open_memmap(os.path.join(tmp_path, f"level{index}.npy"), mode="w+",
+                                                    dtype=np.uint8, shape=(h, w) + channels)
+                for y in range(0, level.shape[0], BUILD_BAND_ROWS):
+                    band = Image.fromarray(np.ascontiguousarray(level[y:y + BUILD_BAND_ROWS]), mode)
+                    reduced[y // 2:y // 2 + (band.height + 1) // 2] = np.asarray(band.reduce(2))
+                reduced.flush()
+                level = reduced
+                if on_level is not None:
+                    on_level(w, h)
+            del level
+            # Replace older versions of this map's cache (only <stem>-<size>-<mtime>, not other maps sharing the prefix)
+            stale = re.compile(rf"{re.escape(stem)}-\d+-\d+(\.tmp)?")
+            for name in os.listdir(parent):
+                if stale.fullmatch(name) and os.path.join(parent, name) not in (cache_path, tmp_path):
+                    shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+            shutil.rmtree(cache_path, ignore_errors=True)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return cls.load(cache_path, cache_bytes, tile_size)
+
+    def level_for(self, w, h):
+        # Index of the smallest level that is still at least (w, h)
+        for index in range(len(self.arrays) - 1, -1, -1):
+            lh, lw = self.arrays[index].shape[:2]
+            if lw >= w and lh >= h:
+                return index
+        return 0
+
+    def tile(self, index, tx, ty):
+        """Tile (tx, ty) of level index as an image, from the LRU or read from disk."""
+        key = (index, tx, ty)
+        img = self._tiles.get(key)
+        if img is not None:
+            self._tiles.move_to_end(key)
+            return img
+        t = self.tile_size
+        img = Image.fromarray(np.array(self.arrays[index][ty * t:(ty + 1) * t, tx * t:(tx + 1) * t]), self.mode)
+        nbytes = image_nbytes(img)
+        if nbytes <= self.cache_bytes:
+            self._tiles[key] = img
+            self._cached_bytes += nbytes
+            while self._cached_bytes > self.cache_bytes:
+                _, old = self._tiles.popitem(last=False)
+                self._cached_bytes -= image_nbytes(old)
+        return img
+
+    def read(self, index, box):
+        """Pixels of level index inside the integer box (x0, y0, x1, y1), assembled from tiles."""
+        x0, y0, x1, y1 = box
+        t = self.tile_size
+        img = Image.new(self.mode, (max(1, x1 - x0), max(1, y1 - y0)))
+        for ty in range(y0 // t, (y1 - 1) // t + 1):
+            for tx in range(x0 // t, (x1 - 1) // t + 1):
+                img.paste(self.tile(index, tx, ty), (tx * t - x0, ty * t - y0))
+        return img
+
+    def get_region(self, w, h, box, resample=Image.BILINEAR):
+        """Only the box (x0, y0, x1, y1) of the map as it would look resized to (w, h)."""
+        x0, y0, x1, y1 = box
+        index = self.level_for(w, h)
+        lh, lw = self.arrays[index].shape[:2]
+        fx, fy = lw / w, lh / h
+        src = (x0 * fx, y0 * fy, x1 * fx, y1 * fy)
+        # Whole source pixels around the box plus the filter's reach, then resample within them
+        pad = int(math.ceil(max(fx, fy))) + 1
+        sx0, sy0 = max(0, int(src[0]) - pad), max(0, int(src[1]) - pad)
+        sx1, sy1 = min(lw, int(math.ceil(src[2])) + pad), min(lh, int(math.ceil(src[3])) + pad)
+        patch = self.read(index, (sx0, sy0, sx1, sy1))
+        return patch.resize((max(1, x1 - x0), max(1, y1 - y0)), resample=resample,
+                            box=(src[0] - sx0, src[1] - sy0, src[2] - sx0, src[3] - sy0))
+
+    def get(self, w, h, resample=Image.BILINEAR):
+        """Whole map resized to (w, h)."""
+        w, h = max(1, w), max(1, h)
+        return self.get_region(w, h, (0, 0, w, h), resample)
+
+    def clear_cache(self):
+        self._tiles.clear()
+        self._cached_bytes = 0
+
+    def __getstate__(self):
+        # Worker processes reopen the cache files (sharing the OS page cache), not a copy of the pixels
+        if self.path is None:
+            return self.__dict__.copy()
+        return {'path': self.path, 'cache_bytes': self.cache_bytes, 'tile_size': self.tile_size}
+
+    def __setstate__(self, state):
+        if 'arrays' not in state:
+            tiled = TiledMap.load(state['path'], state['cache_bytes'], state['tile_size'])
+            if tiled is None:
+                raise OSError(f"Tile cache {state['path']} is missing")
+            state = tiled.__dict__
+        self.__dict__.update(state)
+
+
+def raster_region(raster, raster_box, scale, region):
+    """Crop of a low-res raster covering map-pixel raster_box, scaled for a display region.
+
+    Returns (image, (x, y)) with the offset relative to the region, or None if
+    the raster is outside it.
+    """
+    bx0, by0, bx1, by1 = (v * scale for v in raster_box)
+    rx0, ry0, rx1, ry1 = region
+    x0, y0 = int(max(bx0, rx0)), int(max(by0, ry0))
+    x1, y1 = int(math.ceil(min(bx1, rx1))), int(math.ceil(min(by1, ry1)))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    fx = raster.width / (bx1 - bx0)
+    fy = raster.height / (by1 - by0)
+    src = (max(0.0, (x0 - bx0) * fx), max(0.0, (y0 - by0) * fy),
+           min(float(raster.width), (x1 - bx0) * fx), min(float(raster.height), (y1 - by0) * fy))
+    img = raster.resize((x1 - x0, y1 - y0), resample=Image.NEAREST, box=src)
+    return img, (x0 - rx0, y0 - ry0)
+
+
+def viewport_region(view_x, view_y, view_w, view_h, w, h, margin=RENDER_MARGIN_PX):
+    # Visible window of a (w, h) scaled map plus a margin, clamped to the map
+    x0 = min(max(0, int(view_x) - margin), w)
+    y0 = min(max(0, int(view_y) - margin), h)
+    x1 = max(min(w, int(view_x + view_w) + margin), x0)
+    y1 = max(min(h, int(view_y + view_h) + margin), y0)
+    return x0, y0, x1, y1
+
+
+# === Cached range overlay layer ===
+class OverlayLayer:
+    """Map region with the range circles composited in, kept between frames.
+
+    The composite is only rebuilt when its key (region, scale, mortar, shell,
+    faction...) changes. The dispersion circle is drawn into a small patch
+    whose original pixels are restored before the next one is drawn, so
+    moving only the target touches just its bounding box. Rebuilds are
+    timed as the 'resize', 'overlay' and 'composite' stages of profiler.
+    """
+
+    def __init__(self, profiler=NULL_PROFILER):
+        self.profiler = profiler
+        self.key = None
+        self.image = None
+        self._dispersion = None
+        self._patch = None
+
+    def update(self, key, get_base, circles, images=()):
+        """Rebuild the composite if key changed. Returns True if redrawn.
+
+        circles are (cx, cy, r, rgba); images are RGBA (image, (x, y)) pasted under them,
+        or a callable returning them, called only on a rebuild.
+        """
+        if key == self.key and self.image is not None:
+            return False
+        with self.profiler.stage('resize'):
+            img = get_base()
+        if callable(images):
+            with self.profiler.stage('overlay'):
+                images = images()
+        if circles or images:
+            with self.profiler.stage('overlay'):
+                img = img.convert("RGBA")
+                overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
+                for layer, xy in images:
+                    overlay.paste(layer, xy)
+                draw = ImageDraw.Draw(overlay)
+                for cx, cy, r, fill in circles:
+                    draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=fill)
+            with self.profiler.stage('composite'):
+                img = Image.alpha_composite(img, overlay)
+        self.key = key
+        self.image = img
+        self._dispersion = None
+        self._patch = None
+        return True
+
+    def set_dispersion(self, circle):
+        """Draw (cx, cy, r, rgba) or clear with None. Returns True if the image changed."""
+        if circle == self._dispersion:
+            return False
+        if self._patch is not None:
+            x, y, saved = self._patch
+            self.image.paste(saved, (x, y))
+            self._patch = None
+        self._dispersion = circle
+        if circle is None:
+            return True
+        if self.image.mode != "RGBA":
+            # Never draw into a shared pyramid image
+            self.image = self.image.convert("RGBA")
+        cx, cy, r, fill = circle
+        x0, y0 = max(0, cx - r), max(0, cy - r)
+        x1, y1 = min(self.image.width, cx + r + 1), min(self.image.height, cy + r + 1)
+        if x1 <= x0 or y1 <= y0:
+            return True
+        saved = self.image.crop((x0, y0, x1, y1))
+        overlay = Image.new("RGBA", saved.size, (0, 0, 0, 0))
+        ImageDraw.Draw(overlay).ellipse([cx - r - x0, cy - r - y0, cx + r - x0, cy + r - y0], fill=fill)
+        self.image.paste(Image.alpha_composite(saved, overlay), (x0, y0))
+        self._patch = (x0, y0, saved)
+        return True
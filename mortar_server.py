@@ -0,0 +1,317 @@
+"""Local HTTP/JSON firing-solution service (asyncio, standard library only).
+
+Loads the ballistic tables and an optional heightmap once and answers
+requests from any number of clients on the LAN:
+
+    python mortar_server.py --heightmap heightmap.png --map-size 10240 10240 --port 8765
+
+POST /solve      {"faction": "NATO", "shell": "HE", "mortar": "6500 3400", "targets": ["7000 4000", ...]}
+                 or a list of such objects (one batch); "target" may be used for a single target.
+                 Coordinates are "X Z" grid strings or [x, z] meter pairs.
+POST /elevation  {"points": ["6500 3400", [7000, 4000], ...]}
+GET  /tables     factions and their shells
+GET  /stats      request counts, cache hit rate and latency percentiles per endpoint
+
+Solutions are cached in an LRU keyed on coordinates quantized to
+--quantize-m meters (the solution is computed for the quantized point).
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from mortar_ballistics import TableRegistry, parse_grid
+from mortar_cli import solution_fields
+
+DEFAULT_PORT = 8765
+# Solutions kept in the LRU, and the coordinate grid they're snapped to (m)
+SOLUTION_CACHE_SIZE = 100000
+QUANTIZE_M = 1.0
+# Latency samples kept per endpoint for the percentiles
+LATENCY_WINDOW = 10000
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class RequestError(ValueError):
+    pass
+
+
+def parse_point(value):
+    # "X Z" grid string or [x, z] in meters
+    if isinstance(value, str):
+        return parse_grid(value)
+    try:
+        x_m, z_m = value
+        x_m, z_m = float(x_m), float(z_m)
+    except (TypeError, ValueError):
+        raise RequestError(f"Bad coordinate {value!r}; use \"X Z\" or [x, z]") from None
+    # JSON allows Infinity/NaN (and 1e999 parses to inf); they'd overflow quantize()
+    if not (math.isfinite(x_m) and math.isfinite(z_m)):
+        raise RequestError(f"Coordinate {value!r} is not a finite number")
+    return x_m, z_m
+
+
+class SolverService:
+    """Batched, cached firing solutions over one set of tables and one heightmap."""
+
+    def __init__(self, registry=None, heightmap=None, map_size_m=(5120.0, 5120.0),
+                 cache_size=SOLUTION_CACHE_SIZE, quantize_m=QUANTIZE_M):
+        self.registry = registry or TableRegistry()
+        self.heightmap = heightmap
+        self.map_width_m, self.map_height_m = map_size_m
+        self.cache_size = cache_size
+        self.quantize_m = quantize_m
+        self._cache = OrderedDict()
+        self._solvers = {}
+        self.hits = 0
+        self.misses = 0
+        self.latencies = {}
+        self.counts = {}
+
+    def quantize(self, point):
+        q = self.quantize_m
+        return (round(point[0] / q) * q, round(point[1] / q) * q) if q > 0 else tuple(point)
+
+    def solver(self, faction, shell):
+        key = (faction, shell)
+        solver = self._solvers.get(key)
+        if solver is None:
+            if faction not in self.registry.tables:
+                raise RequestError(f"Unknown faction {faction!r}")
+            weapon = self.registry.get(faction)
+            if shell not in weapon.compiled:
+                raise RequestError(f"Unknown shell {shell!r} for {faction}")
+            solver = self._solvers[key] = weapon.solver(shell)
+        return solver
+
+    def elevations(self, points):
+        """Terrain elevation (m) at grid points; 0 everywhere without a heightmap."""
+        if self.heightmap is None or not points:
+            return [0.0] * len(points)
+        xz = np.array(points, dtype=np.float64)
+        z = self.heightmap.sample(xz[:, 0], self.map_height_m - xz[:, 1], self.map_width_m, self.map_height_m)
+        return [float(v) for v in np.atleast_1d(z)]
+
+    def solve(self, jobs):
+        """Solutions for (faction, shell, mortar_xz, target_xz) tuples, in order.
+
+        Cache misses are grouped per faction/shell and solved in one vectorized call each.
+        """
+        keys = [(faction, shell, self.quantize(mortar), self.quantize(target))
+                for faction, shell, mortar, target in jobs]
+        results = [None] * len(keys)
+        misses = {}
+        for i, key in enumerate(keys):
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                results[i] = cached
+                self.hits += 1
+            else:
+                misses.setdefault(key[:2], []).append(i)
+                self.misses += 1
+        for (faction, shell), indices in misses.items():
+            solver = self.solver(faction, shell)
+            mortars = [keys[i][2] for i in indices]
+            targets = [keys[i][3] for i in indices]
+            m_xy = np.array([(x, self.map_height_m - z) for x, z in mortars], dtype=np.float64)
+            t_xy = np.array([(x, self.map_height_m - z) for x, z in targets], dtype=np.float64)
+            mortar_z = np.array(self.elevations(mortars))
+            target_z = np.array(self.elevations(targets))
+            sol = solver.solve(m_xy, t_xy, mortar_z, target_z, m_per_px=1.0)
+            for j, i in enumerate(indices):
+                fields = solution_fields(sol, j)
+                fields.update(mortar_elevation_m=float(mortar_z[j]), target_elevation_m=float(target_z[j]))
+                results[i] = fields
+                self._cache[keys[i]] = fields
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
+
+    def handle_solve(self, body):
+        requests = body if isinstance(body, list) else [body]
+        jobs = []
+        shape = []
+        for request in requests:
+            if not isinstance(request, dict):
+                raise RequestError("Each request must be a JSON object")
+            names = self.registry.names()
+            faction = request.get('faction') or (names[0] if names else None)
+            shell = request.get('shell')
+            if shell is None and faction in self.registry.tables:
+                shell_types = self.registry.get(faction).shell_types
+                shell = shell_types[0] if shell_types else None
+            if 'mortar' not in request:
+                raise RequestError("Missing 'mortar'")
+            mortar = parse_point(request['mortar'])
+            targets = request.get('targets', [request['target']] if 'target' in request else None)
+            if not isinstance(targets, list):
+                raise RequestError("Missing 'targets' (list) or 'target'")
+            self.solver(faction, shell)
+            shape.append((faction, shell, len(targets)))
+            jobs.extend((faction, shell, mortar, parse_point(t)) for t in targets)
+        results = iter(self.solve(jobs))
+        out = [{'faction': faction, 'shell': shell, 'solutions': [next(results) for _ in range(n)]}
+               for faction, shell, n in shape]
+        return out if isinstance(body, list) else out[0]
+
+    def handle_elevation(self, body):
+        if not isinstance(body, dict) or not isinstance(body.get('points'), list):
+            raise RequestError("Expected {\"points\": [...]}")
+        return {'elevations_m': self.elevations([parse_point(p) for p in body['points']])}
+
+    def handle_tables(self, _body=None):
+        tables = {}
+        for name, weapon in self.registry.tables.items():
+            weapon.load()
+            tables[name] = {'shells': weapon.shell_types, 'mils_per_circle': weapon.mils_per_circle}
+        return tables
+
+    def record(self, endpoint, seconds):
+        self.latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+        self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def stats(self):
+        endpoints = {}
+        for endpoint, samples in self.latencies.items():
+            p50, p90, p99 = np.percentile(np.array(samples) * 1000.0, [50, 90, 99])
+            endpoints[endpoint] = {'requests': self.counts[endpoint], 'p50_ms': round(float(p50), 3),
+                                   'p90_ms': round(float(p90), 3), 'p99_ms': round(float(p99), 3),
+                                   'max_ms': round(max(samples) * 1000.0, 3)}
+        lookups = self.hits + self.misses
+        return {'endpoints': endpoints, 'cache': {'entries': len(self._cache), 'hits': self.hits,
+                                                  'misses': self.misses,
+                                                  'hit_rate': round(self.hits / lookups, 4) if lookups else None}}
+
+
+# === HTTP front end ===
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class SolverServer:
+    """Minimal HTTP/1.1 (keep-alive, Content-Length bodies) in front of a SolverService.
+
+    Requests are handled on one worker thread, so a large batch doesn't stall
+    the event loop while other connections are read and answered; one thread
+    because the service's cache and statistics aren't locked.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='solver')
+        self.routes = {
+            ('POST', '/solve'): service.handle_solve,
+            ('POST', '/elevation'): service.handle_elevation,
+            ('GET', '/tables'): service.handle_tables,
+            ('GET', '/stats'): lambda _body=None: service.stats(),
+        }
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, *_ = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0) or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': 'Request body too large'}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                path = path.split('?', 1)[0]
+                status, payload = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.process, method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, payload, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def process(self, method, path, body):
+        # Runs on the worker thread: dispatch plus the endpoint's latency sample
+        start = time.perf_counter()
+        status, payload = self.dispatch(method, path, body)
+        if (method, path) in self.routes:
+            self.service.record(path, time.perf_counter() - start)
+        return status, payload
+
+    def dispatch(self, method, path, body):
+        handler = self.routes.get((method, path))
+        if handler is None:
+            known = any(p == path for _, p in self.routes)
+            return (405, {'error': f"{method} not allowed"}) if known else (404, {'error': f"No route {path}"})
+        try:
+            return 200, handler(json.loads(body) if body else None)
+        except (RequestError, ValueError, TypeError, KeyError) as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            # Last resort: answer this request and keep the connection (and the server) alive
+            traceback.print_exc(file=sys.stderr)
+            return 500, {'error': f"Internal error: {type(e).__name__}"}
+
+    async def _respond(self, writer, status, payload, close=False):
+        data = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve firing solutions over HTTP/JSON.")
+    parser.add_argument('--host', default='127.0.0.1', help='interface to listen on (0.0.0.0 for the LAN)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--tables-dir', help='folder of ballistic table CSVs')
+    parser.add_argument('--heightmap', help='heightmap covering the map (.png, .r16, .asc)')
+    parser.add_argument('--map-size', nargs=2, type=float, default=(5120.0, 5120.0), metavar=('W', 'H'),
+                        help='map width and height in meters (default: 5120 5120)')
+    parser.add_argument('--min-elevation-m', type=float, help='heightmap black level in meters')
+    parser.add_argument('--max-elevation-m', type=float, help='heightmap white level in meters')
+    parser.add_argument('--quantize-m', type=float, default=QUANTIZE_M, help='cache grid in meters (0 disables snapping)')
+    parser.add_argument('--cache-size', type=int, default=SOLUTION_CACHE_SIZE, help='solutions kept in the LRU')
+    args = parser.parse_args(argv)
+    heightmap = None
+    if args.heightmap:
+        from mortar_terrain import MAX_ELEVATION_M, MIN_ELEVATION_M, load_heightmap
+        lo = MIN_ELEVATION_M if args.min_elevation_m is None else args.min_elevation_m
+        hi = MAX_ELEVATION_M if args.max_elevation_m is None else args.max_elevation_m
+        heightmap = load_heightmap(args.heightmap, lo, hi)
+    registry = TableRegistry(args.tables_dir) if args.tables_dir else TableRegistry()
+    service = SolverService(registry, heightmap, args.map_size, args.cache_size, args.quantize_m)
+    print(f"Serving firing solutions on http://{args.host}:{args.port}/ ({', '.join(registry.names())})")
+    try:
+        asyncio.run(SolverServer(service).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import math
+import os
+import re
+
+import numpy as np
+from PIL import Image
+
+# Elevation range an image heightmap's darkest/brightest value maps to (meters)
+MIN_ELEVATION_M = 0.0
+MAX_ELEVATION_M = 512.0
+HEIGHTMAP_EXTENSIONS = ('.png', '.r16', '.asc')
+# Decoded PNG/.asc grids are kept here, next to the heightmap, like the table and tile caches
+HEIGHTMAP_CACHE_DIR = '.heightmap_cache'
+
+
+# === NumPy-backed heightmap ===
+class Heightmap:
+    """Elevation grid, stored raw and scaled on sampling: z = offset + scale * data.
+
+    data may be an np.memmap, in which case only the cells actually sampled
+    are read from disk.
+    """
+
+    def __init__(self, data, scale=1.0, offset=0.0, path=None):
+        self.data = data
+        self.scale = scale
+        self.offset = offset
+        self.path = path
+        self.height, self.width = data.shape
+
+    def sample(self, px, py, map_width_px, map_height_px):
+        """Bilinear elevation (m) at map pixel coordinates; scalars or arrays of any shape."""
+        px = np.asarray(px, dtype=np.float64)
+        py = np.asarray(py, dtype=np.float64)
+        # Pixel centers: heightmap cell (i, j) covers [i, i + 1) scaled to the map
+        fx = np.clip(px / map_width_px * self.width - 0.5, 0, self.width - 1)
+        fy = np.clip(py / map_height_px * self.height - 0.5, 0, self.height - 1)
+        x0 = fx.astype(np.intp)
+        y0 = fy.astype(np.intp)
+        x1 = np.minimum(x0 + 1, self.width - 1)
+        y1 = np.minimum(y0 + 1, self.height - 1)
+        tx = fx - x0
+        ty = fy - y0
+        d = self.data
+        top = d[y0, x0] * (1 - tx) + d[y0, x1] * tx
+        bottom = d[y1, x0] * (1 - tx) + d[y1, x1] * tx
+        return self.offset + self.scale * (top * (1 - ty) + bottom * ty)
+
+    @property
+    def file_backed(self):
+        return isinstance(self.data, np.memmap) and bool(self.data.filename)
+
+    def __getstate__(self):
+        # Memory-mapped grids travel to worker processes by file name, not by value
+        state = self.__dict__.copy()
+        if self.file_backed:
+            d = self.data
+            state['data'] = ('memmap', d.filename, d.dtype.str, d.shape, d.offset)
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state['data'], tuple):
+            _, filename, dtype, shape, offset = state['data']
+            state['data'] = np.memmap(filename, dtype=dtype, mode='r', shape=shape, offset=offset)
+        self.__dict__.update(state)
+
+    def elevation_range(self):
+        return self.offset + self.scale * float(self.data.min()), self.offset + self.scale * float(self.data.max())
+
+
+def heightmap_cache_path(path, cache_dir=None):
+    # <file name>-<size>-<mtime>.npy in HEIGHTMAP_CACHE_DIR, so an edited heightmap is decoded again
+    st = os.stat(path)
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), HEIGHTMAP_CACHE_DIR)
+    return os.path.join(cache_dir, f"{os.path.basename(path)}-{st.st_size}-{st.st_mtime_ns}.npy")
+
+
+def _cached_array(path, decode, cache_dir=None):
+    # Decode once into the heightmap cache and memory-map it afterwards; stays in RAM if it can't be written
+    cache_path = heightmap_cache_path(path, cache_dir)
+    try:
+        return np.load(cache_path, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    data = decode()
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Older versions of this file only, not other heightmaps sharing the prefix
+        stale = re.compile(rf"{re.escape(os.path.basename(path))}-\d+-\d+\.npy")
+        for name in os.listdir(cache_dir):
+            if stale.fullmatch(name):
+                os.remove(os.path.join(cache_dir, name))
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, data)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        return data
+    return np.load(cache_path, mmap_mode='r')
+
+
+def _decode_image(path):
+    img = Image.open(path)
+    if img.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+        # 16-bit grayscale; PIL widens some of these to 32-bit "I"
+        data = np.asarray(img)
+        return np.clip(data, 0, 65535).astype(np.uint16), 65535
+    return np.asarray(img.convert('L')), 255
+
+
+def _decode_asc(path):
+    # ESRI ASCII grid: "key value" header lines, then rows of elevations (north first)
+    header = {}
+    with open(path, encoding='utf-8') as f:
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            parts = line.split()
+            if len(parts) != 2 or not parts[0][0].isalpha():
+                f.seek(pos)
+                break
+            header[parts[0].lower()] = float(parts[1])
+        data = np.loadtxt(f, dtype=np.float32, ndmin=2)
+    if 'nodata_value' in header:
+        data[data == header['nodata_value']] = 0.0
+    return data
+
+
+def load_heightmap(path, min_elevation_m=MIN_ELEVATION_M, max_elevation_m=MAX_ELEVATION_M,
+                   width=None, height=None, cache_dir=None):
+    """Load a .png (8 or 16-bit), .r16 (raw little-endian uint16) or .asc heightmap.
+
+    Image formats map their full value range onto [min_elevation_m, max_elevation_m];
+    .asc grids are already in meters. width/height are only needed for
+    non-square .r16 files. .r16 files are memory-mapped in place; other
+    formats are decoded once into HEIGHTMAP_CACHE_DIR next to the file
+    unless cache_dir is given.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.r16':
+        count = os.path.getsize(path) // 2
+        if width is None or height is None:
+            width = height = int(round(count ** 0.5))
+        if width * height != count:
+            raise ValueError(f"{os.path.basename(path)}: {count} samples is not {width}x{height}")
+        data = np.memmap(path, dtype='<u2', mode='r', shape=(height, width))
+        return Heightmap(data, (max_elevation_m - min_elevation_m) / 65535, min_elevation_m, path)
+    if ext == '.asc':
+        return Heightmap(_cached_array(path, lambda: _decode_asc(path), cache_dir), path=path)
+    decoded = {}
+
+    def decode():
+        decoded['data'], decoded['max_value'] = _decode_image(path)
+        return decoded['data']
+    data = _cached_array(path, decode, cache_dir)
+    max_value = decoded.get('max_value', 65535 if data.dtype == np.uint16 else 255)
+    return Heightmap(data, (max_elevation_m - min_elevation_m) / max_value, min_elevation_m, path)
+
+
+# === Line-of-fire clearance ===
+GRAVITY = 9.81
+# Required gap between the shell and the terrain (m)
+CLEARANCE_MARGIN_M = 2.0
+# Terrain this close to either end is ignored: the shell is at ground level there
+CLEARANCE_END_SKIP_M = 25.0
+MAX_CLEARANCE_SAMPLES = 4096
+
+
+def find_obstruction(heightmap, mortar_px, target_px, map_width_px, map_height_px, m_per_px,
+                     mortar_z, target_z, tof_s, margin_m=CLEARANCE_MARGIN_M,
+                     end_skip_m=CLEARANCE_END_SKIP_M):
+    """First point where the shell's arc passes below the terrain, or None if it clears.
+
+    The arc is a drag-free parabola between the mortar and target that takes
+    the ring's time of flight, so lofted (longer TOF) solutions fly higher.
+    The path is sampled about once per heightmap cell in a single vectorized
+    lookup. Returns (px, py, distance_m, terrain_z, shell_z) in map pixels/meters.
+    """
+    mx, my = mortar_px
+    tx, ty = target_px
+    dist_m = math.hypot(tx - mx, ty - my) * m_per_px
+    if dist_m <= 2 * end_skip_m:
+        return None
+    cell_m = max(map_width_px / heightmap.width, map_height_px / heightmap.height) * m_per_px
+    n = int(min(max(dist_m / max(cell_m, 0.5), 16), MAX_CLEARANCE_SAMPLES))
+    u = np.linspace(0.0, 1.0, n + 1)[1:-1]
+    s = u * dist_m
+    keep = (s > end_skip_m) & (s < dist_m - end_skip_m)
+    u, s = u[keep], s[keep]
+    px = mx + (tx - mx) * u
+    py = my + (ty - my) * u
+    terrain = heightmap.sample(px, py, map_width_px, map_height_px)
+    shell = mortar_z + (target_z - mortar_z) * u + 0.5 * GRAVITY * tof_s ** 2 * u * (1 - u)
+    blocked = np.flatnonzero(terrain + margin_m > shell)
+    if not blocked.size:
+        return None
+    i = blocked[0]
+    return float(px[i]), float(py[i]), float(s[i]), float(terrain[i]), float(shell[i])
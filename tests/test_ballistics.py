@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+
+from mortar_ballistics import (TABLE_CACHE_DIR, TableRegistry, compile_dense_tables, interpolate_entry,
+                               load_ballistic_table)
+
+REGISTRY = TableRegistry()
+SHELLS = [(name, shell) for name in REGISTRY.names() for shell in REGISTRY.get(name).shell_types]
+
+
+@pytest.fixture(scope='module', params=SHELLS, ids=lambda p: '-'.join(p))
+def shell_tables(request):
+    name, shell = request.param
+    weapon = REGISTRY.get(name)
+    return weapon, shell, weapon.compiled[shell], compile_dense_tables(weapon.compiled)[shell]
+
+def test_dense_values_within_tolerance(shell_tables):
+    weapon, shell, table, dense = shell_tables
+    for dist_m in np.linspace(table.min_range, table.max_range, 997):
+        ring, entry = table.best_ring(dist_m, 0.0, weapon.dz_correction_factor, weapon.min_elevation_mil)
+        if ring is None:
+            continue
+        exact = interpolate_entry(entry, dist_m)
+        approx = dense.values(ring, dist_m)
+        for key, a, b in zip(('elevation_mil', 'tof_s', 'dispersion_m'), exact, approx):
+            assert abs(a - b) <= dense.tolerance[key] + 1e-9, (key, dist_m)
+
+
+def test_dense_solver_matches_exact_solver(shell_tables):
+    weapon, shell, table, dense = shell_tables
+    rng = np.random.default_rng(7)
+    dist_m = rng.uniform(0, table.max_range * 1.05, 5000)
+    dz = rng.uniform(-150, 150, dist_m.shape)
+    exact = weapon.solver(shell).solve_range(dist_m, dz)
+    approx = weapon.solver(shell, dense).solve_range(dist_m, dz)
+    # Nearest-grid elevations can tip a ring over min elevation right at its edge; anywhere else they agree
+    same = exact[0] == approx[0]
+    assert same.mean() > 0.99
+    valid = same & (exact[0] >= 0)
+    assert np.abs(exact[1][valid] - approx[1][valid]).max() <= dense.tolerance['elevation_mil'] + 1e-9
+    assert np.abs(exact[3][valid] - approx[3][valid]).max() <= dense.tolerance['tof_s'] + 1e-9
+    assert np.abs(exact[4][valid] - approx[4][valid]).max() <= dense.tolerance['dispersion_m'] + 1e-9
+
+
+def test_dense_lookup_agrees_with_best_ring(shell_tables):
+    weapon, shell, table, dense = shell_tables
+    agree = total = 0
+    for dist_m in np.linspace(0, table.max_range * 1.05, 499):
+        ring, _ = table.best_ring(dist_m, 0.0, weapon.dz_correction_factor, weapon.min_elevation_mil)
+        found = dense.lookup(dist_m, 0.0, weapon.dz_correction_factor, weapon.min_elevation_mil)
+        agree += ring == (found[0] if found is not None else None)
+        total += 1
+    assert agree / total > 0.99
+
+
+def test_dense_candidates_bracketed_by_their_ring(shell_tables):
+    weapon, shell, table, dense = shell_tables
+    for dist_m in np.linspace(table.min_range, table.max_range, 97):
+        rings = [c[0] for c in dense.candidates(dist_m, 0.0, weapon.dz_correction_factor, weapon.min_elevation_mil)]
+        assert rings == sorted(rings)
+        found = dense.lookup(dist_m, 0.0, weapon.dz_correction_factor, weapon.min_elevation_mil)
+        assert (found[0] if found is not None else None) == (rings[0] if rings else None)
+        for ring in rings:
+            a, b = table.bracket(ring, dist_m)
+            assert a['Range (m)'] <= dist_m <= b['Range (m)']
+    assert table.bracket(-1, table.min_range) is None
+    assert table.bracket(table.rings[0][0], table.max_range + 1) is None
+
+def test_registry_ignores_csvs_without_ballistic_columns(tmp_path):
+    header = "Shell Type,Charge Rings,Range (m),Elevation (mil),Time of Flight (sec),Dispersion Radius (m)\n"
+    (tmp_path / "mod.csv").write_text(header + "HE,0,100,1500,20.0,5\nHE,0,200,1400,19.0,6\n")
+    (tmp_path / "targets.csv").write_text("6500 3400,alpha\n7000 4000,bravo\n")
+    (tmp_path / "notes.csv").write_text("")
+    (tmp_path / "binary.csv").write_bytes(b"\xff\xfe\x00garbage")
+    assert TableRegistry(str(tmp_path)).names() == ["mod"]
+
+def write_table(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Shell Type,Charge Rings,Range (m),Elevation (mil),Time of Flight (sec),Dispersion Radius (m)\n")
+        f.writelines(f"{row}\n" for row in rows)
+
+
+def test_table_cache_named_after_size_and_mtime(tmp_path):
+    csv_path = tmp_path / "mod.csv"
+    write_table(csv_path, ["HE,0,100,1500,20.0,5", "HE,0,200,1400,19.0,6"])
+    cache_dir = tmp_path / TABLE_CACHE_DIR
+    load_ballistic_table(str(csv_path))
+    st = os.stat(csv_path)
+    assert os.listdir(cache_dir) == [f"mod-{st.st_size}-{st.st_mtime_ns}.npy"]
+    # An edited table is re-parsed and replaces its own stale cache
+    write_table(csv_path, ["HE,0,100,1500,20.0,5", "HE,0,300,1300,18.0,7"])
+    os.utime(csv_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    table = load_ballistic_table(str(csv_path))
+    st = os.stat(csv_path)
+    assert table['Range (m)'].tolist() == [100, 300]
+    assert os.listdir(cache_dir) == [f"mod-{st.st_size}-{st.st_mtime_ns}.npy"]
+
+
+def test_table_cache_keeps_other_tables_sharing_the_prefix(tmp_path):
+    write_table(tmp_path / "mod.csv", ["HE,0,100,1500,20.0,5", "HE,0,200,1400,19.0,6"])
+    write_table(tmp_path / "mod-extra.csv", ["Long Shell Name,1,100,1500,20.0,5", "Long Shell Name,1,200,1400,19.0,6"])
+    load_ballistic_table(str(tmp_path / "mod-extra.csv"))
+    load_ballistic_table(str(tmp_path / "mod.csv"))
+    names = sorted(os.listdir(tmp_path / TABLE_CACHE_DIR))
+    assert [n.rsplit('-', 2)[0] for n in names] == ["mod", "mod-extra"]
+    # Served from the cache, with the full shell name
+    assert load_ballistic_table(str(tmp_path / "mod-extra.csv"))['Shell Type'][0] == "Long Shell Name"
@@ -0,0 +1,45 @@
+import json
+
+from mortar_bench import REGRESSION_THRESHOLD, compare, main
+
+
+def report(**medians):
+    return {'meta': {}, 'results': {name: {'median_s': s, 'min_s': s, 'max_s': s, 'runs': 1}
+                                    for name, s in medians.items()}}
+
+
+def test_compare_reports_relative_change():
+    rows = compare(report(a=1.0, b=2.0, gone=1.0), report(a=1.25, b=1.0, new=1.0))
+    assert [(name, change) for name, _, _, change in rows] == [('a', 0.25), ('b', -0.5)]
+
+
+def write_reports(tmp_path, baseline, current):
+    paths = []
+    for name, data in (('baseline.json', baseline), ('current.json', current)):
+        path = tmp_path / name
+        path.write_text(json.dumps(data))
+        paths.append(str(path))
+    return paths
+
+
+def test_slowdown_past_threshold_fails(tmp_path, capsys):
+    slower = 1 + REGRESSION_THRESHOLD + 0.05
+    assert main(['compare', *write_reports(tmp_path, report(solve=1.0, load=1.0),
+                                           report(solve=slower, load=1.0))]) == 1
+    out = capsys.readouterr().out
+    assert 'solve' in out and 'REGRESSION' in out
+    assert '1 regression(s)' in out
+
+
+def test_slowdown_within_threshold_passes(tmp_path, capsys):
+    within = 1 + REGRESSION_THRESHOLD - 0.05
+    assert main(['compare', *write_reports(tmp_path, report(solve=1.0, load=2.0),
+                                           report(solve=within, load=1.0))]) == 0
+    out = capsys.readouterr().out
+    assert 'REGRESSION' not in out and 'faster' in out
+
+
+def test_threshold_option(tmp_path):
+    paths = write_reports(tmp_path, report(solve=1.0), report(solve=1.2))
+    assert main(['compare', *paths, '--threshold', '0.25']) == 0
+    assert main(['compare', *paths, '--threshold', '0.15']) == 1
@@ -0,0 +1,35 @@
+from mortar_cards import card_filename, card_tasks, read_missions
+
+
+def test_read_missions_csv():
+    lines = ["6500 3400,7000 4000,alpha", "", "6500 3400,7100 4100,bravo,2nd wave", "0 0,1 1"]
+    assert list(read_missions(lines)) == [
+        ((6500, 3400), (7000, 4000), 'alpha', ''),
+        ((6500, 3400), (7100, 4100), 'bravo,2nd wave', ''),
+        ((0, 0), (1, 1), '', ''),
+    ]
+
+
+def test_read_missions_csv_errors_keep_their_line():
+    missions = list(read_missions(["6500 3400", "6500 3400,x y,bad", "6500,3400,7000,4000"]))
+    assert [m[:3] for m in missions] == [(None, None, ''), (None, None, 'bad'), (None, None, '7000,4000')]
+    assert all(m[3] for m in missions)
+
+
+def test_read_missions_jsonl():
+    lines = ['{"mortar": "6500 3400", "target": "7000 4000", "id": 7}', '  ', '{"mortar": "6500 3400"}', 'not json']
+    missions = list(read_missions(lines, 'jsonl'))
+    assert missions[0] == ((6500, 3400), (7000, 4000), '7', '')
+    assert [m[:2] for m in missions[1:]] == [(None, None), (None, None)]
+    assert all(m[3] for m in missions[1:])
+
+
+def test_card_tasks_group_by_mortar_and_split():
+    missions = [((0, 0), (i, i), '', '') for i in range(5)] + [((9, 9), (1, 1), '', '')]
+    tasks = list(card_tasks(missions, per_task=2))
+    assert [[m[0] for m in task] for task in tasks] == [[0, 1], [2, 3], [4], [5]]
+
+
+def test_card_filename():
+    assert card_filename(3, 'Alpha / 1') == '00003-Alpha_1.png'
+    assert card_filename(12, '', 'jpg') == '00012.jpg'
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+
+from mortar_cli import read_targets, write_rows
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('6500 3400\n', (6500, 3400, '', '')),
+    ('6500 3400,alpha\n', (6500, 3400, 'alpha', '')),
+    ('6500 3400,alpha,north ridge\n', (6500, 3400, 'alpha,north ridge', '')),
+    ('6500,3400\n', (6500, 3400, '', '')),
+    ('6500,3400,alpha\n', (6500, 3400, 'alpha', '')),
+    ('02480 03659,b\n', (2480, 3659, 'b', '')),
+])
+def test_read_targets_csv_row_shapes(line, expected):
+    assert list(read_targets(io.StringIO(line), 'csv')) == [expected]
+
+
+def test_read_targets_csv_keeps_bad_rows_and_skips_blank_ones():
+    rows = list(read_targets(io.StringIO('6500 3400\n\nnope,x\n65 00 1\n'), 'csv'))
+    assert len(rows) == 3
+    assert rows[0] == (6500, 3400, '', '')
+    assert rows[1][:3] == (None, None, '') and rows[1][3]
+    assert rows[2][:2] == (None, None) and rows[2][3]
+
+
+def test_read_targets_jsonl():
+    lines = ['"6500 3400"\n', '{"grid": "100 200", "id": 7}\n', '{"x": 1, "z": 2}\n', '{"id": "x"}\n', '\n']
+    rows = list(read_targets(lines, 'jsonl'))
+    assert rows[:3] == [(6500, 3400, '', ''), (100, 200, '7', ''), (1, 2, '', '')]
+    assert rows[3][:3] == (None, None, 'x') and rows[3][3]
+    assert len(rows) == 4
+
+
+def test_write_rows_rounds_and_keeps_column_order():
+    out = io.StringIO()
+    write_rows([{'x': 1, 'z': 2, 'id': 'a', 'range_m': 10.26, 'azimuth_mil': 1.04, 'ring': 2,
+                 'elevation_mil': 1200.06, 'tof_s': 12.345, 'dispersion_m': 8.04, 'valid': True, 'error': ''}], out)
+    header, row = out.getvalue().splitlines()
+    assert header.startswith('x,z,id,range_m')
+    assert row == '1,2,a,10.3,1.0,2,1200.1,12.35,8.0,True,'
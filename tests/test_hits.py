@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+import pytest
+
+from mortar_hits import HitProbabilityCache, hit_probability, in_area, points_in_polygon, rounds_for_confidence
+
+SQUARE = [(-10, -10), (10, -10), (10, 10), (-10, 10)]
+# L shape: the square minus its top-right quarter
+L_SHAPE = [(-10, -10), (10, -10), (10, 0), (0, 0), (0, 10), (-10, 10)]
+
+
+def test_points_in_polygon():
+    points = np.array([(0, 0), (9.9, 9.9), (-9.9, 5), (10.1, 0), (0, -11), (5, 5), (-5, 5), (5, -5)])
+    assert points_in_polygon(points, SQUARE).tolist() == [True, True, True, False, False, True, True, True]
+    assert points_in_polygon(points, L_SHAPE).tolist() == [False, False, True, False, False, False, True, True]
+
+
+def test_in_area_circle():
+    points = np.array([(3, 4), (3, 4.1), (0, 0)])
+    assert in_area(points, ('circle', 5)).tolist() == [True, False, True]
+
+
+@pytest.mark.parametrize('radius, dispersion', [(15, 19), (15, 24), (5, 30)])
+def test_uniform_hit_probability_matches_area_ratio(radius, dispersion):
+    hit = hit_probability(dispersion, ('circle', radius))
+    expected = (radius / dispersion) ** 2
+    assert abs(hit.probability - expected) < 4 * hit.std_error
+    assert hit.expected_rounds == pytest.approx(1 / hit.probability)
+
+
+def test_normal_model_treats_radius_as_cep():
+    hit = hit_probability(20, ('circle', 20), model='normal')
+    assert abs(hit.probability - 0.5) < 4 * hit.std_error
+
+
+def test_polygon_area_probability():
+    # The L covers 3/4 of the square, which holds every round of a 10 m uniform dispersion
+    square = hit_probability(10, ('polygon', SQUARE))
+    shape = hit_probability(10, ('polygon', L_SHAPE))
+    assert square.probability == 1.0
+    assert abs(shape.probability - 0.75) < 4 * shape.std_error
+
+
+def test_zero_dispersion():
+    assert hit_probability(0, ('circle', 1)).probability == 1.0
+    miss = hit_probability(0, ('polygon', [(5, 5), (6, 5), (6, 6)]))
+    assert miss.probability == 0.0 and miss.expected_rounds == math.inf
+
+
+def test_rounds_for_confidence():
+    assert rounds_for_confidence(0.5) == 4
+    assert rounds_for_confidence(1.0) == 1
+    assert rounds_for_confidence(0.0) == math.inf
+
+
+def test_cache_is_keyed_on_dispersion():
+    cache = HitProbabilityCache(samples=20000)
+    area = ('circle', 15)
+    # Same ring and range, different table: 19 m vs 24 m dispersion must not share a result
+    narrow = cache.estimate(19.0, area)
+    wide = cache.estimate(24.0, area)
+    assert narrow.probability == pytest.approx(hit_probability(19.0, area).probability)
+    assert wide.probability == pytest.approx(hit_probability(24.0, area).probability)
+    assert narrow.probability > wide.probability + 0.15
+    # Dispersions within one rounding step share the cached estimate
+    assert cache.estimate(19.02, area) is narrow
+    assert cache.estimate(19.0, ('circle', 20)) is not narrow
+
+
+def test_cache_is_bounded_and_clearable():
+    cache = HitProbabilityCache(samples=100, cache_size=3)
+    for dispersion in (10, 11, 12, 13):
+        cache.estimate(dispersion, ('circle', 5))
+    assert len(cache._cache) == 3
+    first = cache.estimate(13, ('circle', 5))
+    cache.clear()
+    assert cache.estimate(13, ('circle', 5)) is not first
+
+
+def test_unknown_model_rejected():
+    with pytest.raises(ValueError):
+        HitProbabilityCache(model='gaussian')
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from mortar_ballistics import FiringSolutions, TableRegistry
+from mortar_planner import RELOAD_S, assign_tubes, plan_fire_mission, time_on_target_schedule
+
+
+def solutions(dispersion, tof, valid=None):
+    # Synthetic (tubes, targets) solution matrix
+    dispersion = np.asarray(dispersion, dtype=np.float64)
+    tof = np.asarray(tof, dtype=np.float64)
+    valid = np.ones(dispersion.shape, dtype=bool) if valid is None else np.asarray(valid)
+    zeros = np.zeros(dispersion.shape)
+    return FiringSolutions(zeros, zeros, np.where(valid, 1, -1), zeros + 900, zeros + 900, tof, dispersion, valid)
+
+
+def check_schedule(rounds, reload_s):
+    # Every round of a wave lands together; a tube's rounds are at least reload_s apart
+    impacts = {}
+    for r in rounds:
+        assert r.fire_time_s >= 0
+        assert r.impact_time_s == pytest.approx(r.fire_time_s + r.tof_s)
+        impacts.setdefault(r.wave, set()).add(round(r.impact_time_s, 9))
+    assert all(len(times) == 1 for times in impacts.values())
+    for tube in {r.tube for r in rounds}:
+        times = sorted(r.fire_time_s for r in rounds if r.tube == tube)
+        assert all(b - a >= reload_s - 1e-9 for a, b in zip(times, times[1:]))
+    assert min(r.fire_time_s for r in rounds) == pytest.approx(0.0)
+
+
+def test_assignment_prefers_tight_dispersion_and_spreads_load():
+    # Tube 0 is tighter on everything, but the load penalty hands some work to tube 1
+    sol = solutions([[10, 10, 10, 10], [15, 15, 15, 15]], np.full((2, 4), 20.0))
+    assignment = assign_tubes(sol, load_penalty_m=10.0)
+    assert sorted(np.bincount(assignment, minlength=2).tolist()) == [2, 2]
+    assert assign_tubes(sol, load_penalty_m=0.0).tolist() == [0, 0, 0, 0]
+
+
+def test_assignment_serves_constrained_targets_first():
+    # Target 1 is reachable only by tube 0; target 0 by both
+    sol = solutions([[5, 12], [6, 99]], np.full((2, 2), 20.0), valid=[[True, True], [True, False]])
+    assert assign_tubes(sol, load_penalty_m=10.0).tolist() == [1, 0]
+
+
+def test_unreachable_targets_are_unassigned():
+    sol = solutions([[5, 5]], [[20, 20]], valid=[[True, False]])
+    assert assign_tubes(sol).tolist() == [0, -1]
+    rounds, _ = time_on_target_schedule(sol, assign_tubes(sol))
+    assert [r.target for r in rounds] == [0]
+
+
+def test_time_on_target_schedule():
+    tof = [[25.0, 18.0, 30.0], [22.0, 19.0, 27.0]]
+    sol = solutions(np.full((2, 3), 10.0), tof)
+    assignment = np.array([0, 0, 1])
+    rounds, interval = time_on_target_schedule(sol, assignment, reload_s=4.0)
+    assert interval == pytest.approx((27.0 - 18.0) + 4.0)
+    assert sorted((r.tube, r.target, r.wave) for r in rounds) == [(0, 0, 0), (0, 1, 1), (1, 2, 0)]
+    check_schedule(rounds, 4.0)
+    wave0 = [r for r in rounds if r.wave == 0]
+    assert {r.impact_time_s for r in wave0} == {27.0}
+
+
+def test_empty_schedule():
+    sol = solutions([[5.0]], [[20.0]], valid=[[False]])
+    assert time_on_target_schedule(sol, assign_tubes(sol)) == ([], 0.0)
+
+
+def test_plan_fire_mission_with_real_tables():
+    registry = TableRegistry()
+    weapon = registry.get(registry.names()[0])
+    solver = weapon.solver(weapon.shell_types[0])
+    mortars = [(1000, 1000), (1100, 1000), (1000, 1150)]
+    rng = np.random.default_rng(11)
+    targets = np.array([(1000, 1000)]) + rng.uniform(-1500, 1500, (12, 2))
+    plan = plan_fire_mission(solver, mortars, targets, mortar_z=[10, 20, 30], target_z=rng.uniform(0, 80, 12))
+    valid = plan.solutions.valid
+    assert plan.solutions.ring.shape == (3, 12)
+    for target, tube in enumerate(plan.assignment):
+        assert (tube >= 0) == valid[:, target].any()
+        if tube >= 0:
+            assert valid[tube, target]
+    assert len(plan.schedule) == int((plan.assignment >= 0).sum())
+    check_schedule(plan.schedule, RELOAD_S)
+    for r in plan.schedule:
+        assert r.tof_s == pytest.approx(plan.solutions.tof_s[r.tube, r.target])
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from mortar_render import TILE_CACHE_DIR, TiledMap, map_tile_cache_path
+
+
+def save_map(path, size=64, value=0):
+    Image.fromarray(np.full((size, size, 3), value, dtype=np.uint8)).save(path)
+
+
+def test_tile_cache_path_named_after_size_and_mtime(tmp_path):
+    map_path = tmp_path / "altis.png"
+    save_map(map_path)
+    st = os.stat(map_path)
+    assert map_tile_cache_path(str(map_path)) == os.path.join(
+        str(tmp_path), TILE_CACHE_DIR, f"altis-{st.st_size}-{st.st_mtime_ns}")
+
+
+def test_tile_cache_rebuild_replaces_only_its_own_stale_caches(tmp_path):
+    maps = {}
+    for name in ("altis", "altis-winter"):
+        maps[name] = tmp_path / f"{name}.png"
+        save_map(maps[name])
+        with Image.open(maps[name]) as img:
+            TiledMap.build(img, map_tile_cache_path(str(maps[name])))
+    # Edit altis: its old cache goes, altis-winter's stays
+    save_map(maps["altis"], value=200)
+    st = os.stat(maps["altis"])
+    os.utime(maps["altis"], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    new_path = map_tile_cache_path(str(maps["altis"]))
+    with Image.open(maps["altis"]) as img:
+        tiled = TiledMap.build(img, new_path)
+    caches = sorted(os.listdir(tmp_path / TILE_CACHE_DIR))
+    assert caches == sorted([os.path.basename(new_path), os.path.basename(map_tile_cache_path(str(maps["altis-winter"])))])
+    assert TiledMap.load(new_path) is not None
+    assert tiled.get_region(64, 64, (0, 0, 8, 8)).getpixel((0, 0))[:3] == (200, 200, 200)
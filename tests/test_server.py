@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from mortar_server import SolverServer, SolverService, parse_point
+
+
+@pytest.fixture(scope='module')
+def server():
+    return SolverServer(SolverService())
+
+
+def post(server, path, body):
+    return server.dispatch('POST', path, body if isinstance(body, bytes) else json.dumps(body).encode())
+
+
+def test_parse_point_accepts_grid_strings_and_pairs():
+    assert parse_point("6500 3400") == (6500, 3400)
+    assert parse_point([6500.5, 3400]) == (6500.5, 3400.0)
+
+
+@pytest.mark.parametrize('body', [
+    b'{"mortar": [Infinity, 0], "target": "7000 4000"}',
+    b'{"mortar": "6500 3400", "targets": [[1e999, 10]]}',
+    b'{"mortar": "6500 3400", "target": [NaN, 10]}',
+])
+def test_solve_rejects_non_finite_coordinates(server, body):
+    status, payload = post(server, '/solve', body)
+    assert status == 400
+    assert 'finite' in payload['error']
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'target': '7000 4000'}, "mortar"),
+    ({'mortar': '6500 3400'}, "targets"),
+    ({'mortar': '6500 3400', 'target': 'x y'}, "numeric"),
+    ({'mortar': [1, 2, 3], 'target': '7000 4000'}, "Bad coordinate"),
+    ({'faction': 'Nope', 'mortar': '6500 3400', 'target': '7000 4000'}, "Unknown faction"),
+    ([1], "JSON object"),
+])
+def test_solve_validation_errors_are_400(server, body, message):
+    status, payload = post(server, '/solve', body)
+    assert status == 400
+    assert message in payload['error']
+
+
+def test_solve_batch_shape(server):
+    status, payload = post(server, '/solve', [{'mortar': '2000 2000', 'targets': ['2000 3000', '2000 9000']},
+                                              {'mortar': '2000 2000', 'target': [2500, 2000]}])
+    assert status == 200
+    assert [len(r['solutions']) for r in payload] == [2, 1]
+    first, too_far = payload[0]['solutions']
+    assert first['valid'] and first['range_m'] == pytest.approx(1000)
+    assert not too_far['valid'] and too_far['ring'] is None
+
+
+def test_unexpected_handler_error_is_500(server, monkeypatch):
+    def boom(_body=None):
+        raise RuntimeError("kaput")
+    monkeypatch.setitem(server.routes, ('GET', '/tables'), boom)
+    assert server.dispatch('GET', '/tables', b'') == (500, {'error': 'Internal error: RuntimeError'})
+
+
+def test_routes(server):
+    assert server.dispatch('GET', '/nope', b'')[0] == 404
+    assert server.dispatch('GET', '/solve', b'')[0] == 405
+    assert post(server, '/solve', b'{not json')[0] == 400
+
+
+def test_connection_survives_a_bad_request():
+    async def run():
+        tcp = await asyncio.start_server(SolverServer(SolverService()).handle_connection, '127.0.0.1', 0)
+        port = tcp.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        statuses = []
+        for body in (b'{"mortar": [Infinity, 0], "target": "1 1"}', b'{"mortar": "2000 2000", "target": "2000 3000"}'):
+            writer.write(b"POST /solve HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+            statuses.append(int((await reader.readline()).split()[1]))
+            headers = {}
+            while (line := await reader.readline()) != b'\r\n':
+                name, _, value = line.decode().partition(':')
+                headers[name.lower()] = value.strip()
+            await reader.readexactly(int(headers['content-length']))
+        writer.close()
+        tcp.close()
+        await tcp.wait_closed()
+        return statuses
+    assert asyncio.run(run()) == [400, 200]
+
+
+def test_requests_are_handled_off_the_event_loop(monkeypatch):
+    server = SolverServer(SolverService())
+    handled_on = []
+
+    def slow(_body=None):
+        handled_on.append(threading.get_ident())
+        time.sleep(0.3)
+        return {}
+    monkeypatch.setitem(server.routes, ('GET', '/tables'), slow)
+
+    async def run():
+        tcp = await asyncio.start_server(server.handle_connection, '127.0.0.1', 0)
+        port = tcp.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"GET /tables HTTP/1.1\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        # The loop keeps running while the handler sleeps
+        ticks = 0
+        response = asyncio.ensure_future(reader.read())
+        while not response.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        writer.close()
+        tcp.close()
+        await tcp.wait_closed()
+        return (await response).split(b' ', 2)[1], ticks
+    status, ticks = asyncio.run(run())
+    assert status == b'200'
+    assert ticks > 5
+    assert handled_on and handled_on[0] != threading.get_ident()
+    assert server.service.counts['/tables'] == 1
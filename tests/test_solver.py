@@ -0,0 +1,88 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from mortar_ballistics import DZ_CORRECTION_FACTOR, MIN_ELEVATION_MIL, FiringSolver, ShellTable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TABLE_FILES = ('natotable.csv', 'rutable.csv')
+
+
+def read_ring_data(path):
+    # {shell: {ring: rows}} in file order, parsed the way the original calculator did
+    ring_data = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                record = {'Shell Type': row['Shell Type'], 'Charge Rings': int(row['Charge Rings']),
+                          'Range (m)': int(row['Range (m)']), 'Elevation (mil)': float(row['Elevation (mil)']),
+                          'Time of Flight (sec)': float(row['Time of Flight (sec)']),
+                          'Dispersion Radius (m)': float(row['Dispersion Radius (m)'])}
+            except (KeyError, ValueError):
+                continue
+            ring_data.setdefault(record['Shell Type'], {}).setdefault(record['Charge Rings'], []).append(record)
+    return ring_data
+
+
+def interpolate(entry, dist_m, key):
+    a, b = entry
+    ratio = (dist_m - a['Range (m)']) / (b['Range (m)'] - a['Range (m)'])
+    return a[key] + ratio * (b[key] - a[key])
+
+
+def baseline_best_ring(rings, dist_m, dz, dz_correction_factor=DZ_CORRECTION_FACTOR,
+                       min_elevation=MIN_ELEVATION_MIL):
+    # The original MortarApp.get_best_ring: a linear scan over every bracket of every ring
+    best_ring = best_entry = None
+    for ring, data in rings.items():
+        for a, b in zip(data, data[1:]):
+            if a['Range (m)'] <= dist_m <= b['Range (m)']:
+                elev = interpolate((a, b), dist_m, 'Elevation (mil)')
+                if elev + dz * dz_correction_factor >= min_elevation and (best_ring is None or ring < best_ring):
+                    best_ring, best_entry = ring, (a, b)
+    return best_ring, best_entry
+
+
+TABLES = {name: read_ring_data(os.path.join(ROOT, name)) for name in TABLE_FILES}
+SHELLS = [(name, shell) for name, ring_data in TABLES.items() for shell in sorted(ring_data)]
+
+
+def samples(rings, seed=3):
+    # Random distances plus every 50 m (table rows sit on round ranges), and random height differences
+    max_range = max(row['Range (m)'] for rows in rings.values() for row in rows)
+    rng = np.random.default_rng(seed)
+    dist_m = np.concatenate([rng.uniform(0, max_range * 1.05, 2000), np.arange(0, max_range + 50, 50.0)])
+    return dist_m, rng.uniform(-100, 100, dist_m.shape)
+
+
+@pytest.mark.parametrize('name, shell', SHELLS)
+def test_solver_matches_baseline_lookup(name, shell):
+    ring_data = TABLES[name]
+    dist_m, dz = samples(ring_data[shell])
+    ring, elev, raw, tof, disp = FiringSolver(ring_data, shell).solve_range(dist_m, dz)
+    for i, (d, h) in enumerate(zip(dist_m.tolist(), dz.tolist())):
+        expected_ring, entry = baseline_best_ring(ring_data[shell], d, h)
+        if expected_ring is None:
+            assert ring[i] == -1 and np.isnan(elev[i])
+            continue
+        assert ring[i] == expected_ring
+        assert raw[i] == pytest.approx(interpolate(entry, d, 'Elevation (mil)'))
+        assert elev[i] == pytest.approx(raw[i] + h * DZ_CORRECTION_FACTOR)
+        assert tof[i] == pytest.approx(interpolate(entry, d, 'Time of Flight (sec)'))
+        assert disp[i] == pytest.approx(interpolate(entry, d, 'Dispersion Radius (m)'))
+
+
+@pytest.mark.parametrize('name, shell', SHELLS)
+def test_shell_table_matches_baseline_lookup(name, shell):
+    rings = TABLES[name][shell]
+    table = ShellTable(rings)
+    for d, h in zip(*(a.tolist() for a in samples(rings, seed=5))):
+        expected_ring, expected_entry = baseline_best_ring(rings, d, h)
+        ring, entry = table.best_ring(d, h)
+        assert ring == expected_ring
+        if ring is not None:
+            # The bracket can differ only when d sits exactly on a row shared by both
+            for key in ('Elevation (mil)', 'Time of Flight (sec)', 'Dispersion Radius (m)'):
+                assert interpolate(entry, d, key) == pytest.approx(interpolate(expected_entry, d, key))
@@ -0,0 +1,181 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from mortar_ballistics import DZ_CORRECTION_FACTOR, DenseShellTable, ShellTable
+from mortar_calculator_full import MortarApp
+from mortar_terrain import (CLEARANCE_MARGIN_M, HEIGHTMAP_CACHE_DIR, Heightmap, find_obstruction,
+                            heightmap_cache_path, load_heightmap)
+
+
+def test_r16_is_memory_mapped_and_scaled(tmp_path):
+    grid = np.array([[0, 65535, 32768], [100, 200, 300]], dtype='<u2')
+    path = tmp_path / "terrain.r16"
+    grid.tofile(path)
+    hm = load_heightmap(str(path), 0.0, 1000.0, width=3, height=2)
+    assert isinstance(hm.data, np.memmap)
+    assert hm.data.tolist() == grid.tolist()
+    assert hm.elevation_range() == pytest.approx((0.0, 1000.0))
+    assert not os.path.exists(tmp_path / HEIGHTMAP_CACHE_DIR)
+
+
+def test_r16_square_by_default_and_size_checked(tmp_path):
+    path = tmp_path / "square.r16"
+    np.arange(16, dtype='<u2').tofile(path)
+    assert load_heightmap(str(path)).data.shape == (4, 4)
+    with pytest.raises(ValueError):
+        load_heightmap(str(path), width=5, height=3)
+
+
+def test_asc_grid_in_meters(tmp_path):
+    path = tmp_path / "terrain.asc"
+    path.write_text("ncols 3\nnrows 2\nxllcorner 0\nyllcorner 0\ncellsize 10\nNODATA_value -9999\n"
+                    "1.5 2.5 -9999\n10 20 30\n")
+    hm = load_heightmap(str(path), cache_dir=str(tmp_path / "cache"))
+    assert hm.data.tolist() == [[1.5, 2.5, 0.0], [10.0, 20.0, 30.0]]
+    assert (hm.scale, hm.offset) == (1.0, 0.0)
+
+
+@pytest.mark.parametrize('dtype, top', [(np.uint8, 255), (np.uint16, 65535)])
+def test_png_maps_full_range_onto_elevations(tmp_path, dtype, top):
+    path = tmp_path / "terrain.png"
+    Image.fromarray(np.array([[0, top], [top, 0]], dtype=dtype)).save(path)
+    hm = load_heightmap(str(path), 100.0, 600.0)
+    assert hm.sample(0.5, 0.5, 2, 2) == pytest.approx(100.0)
+    assert hm.sample(1.5, 0.5, 2, 2) == pytest.approx(600.0)
+
+
+def test_decoded_grid_cached_in_cache_dir(tmp_path):
+    path = tmp_path / "terrain.png"
+    Image.fromarray(np.full((4, 4), 7, dtype=np.uint8)).save(path)
+    first = load_heightmap(str(path))
+    cache_path = heightmap_cache_path(str(path))
+    assert os.path.dirname(cache_path) == str(tmp_path / HEIGHTMAP_CACHE_DIR)
+    assert os.listdir(tmp_path / HEIGHTMAP_CACHE_DIR) == [os.path.basename(cache_path)]
+    assert sorted(os.listdir(tmp_path)) == [HEIGHTMAP_CACHE_DIR, "terrain.png"]
+    assert first.file_backed and first.data.filename == os.path.abspath(cache_path)
+    # An edited heightmap is decoded again and replaces only its own stale cache
+    (tmp_path / HEIGHTMAP_CACHE_DIR / "terrain.png.bak-1-2.npy").write_bytes(b"")
+    Image.fromarray(np.full((4, 4), 9, dtype=np.uint8)).save(path)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert load_heightmap(str(path)).data[0, 0] == 9
+    assert sorted(os.listdir(tmp_path / HEIGHTMAP_CACHE_DIR)) == sorted(
+        [os.path.basename(heightmap_cache_path(str(path))), "terrain.png.bak-1-2.npy"])
+
+
+def test_bilinear_sampling():
+    hm = Heightmap(np.array([[0.0, 10.0], [20.0, 30.0]]), scale=2.0, offset=5.0)
+    # A 2x2 grid over a 100x100 px map: cell centers at 25 and 75 px
+    assert hm.sample(25, 25, 100, 100) == pytest.approx(5.0)
+    assert hm.sample(75, 75, 100, 100) == pytest.approx(5.0 + 2 * 30.0)
+    assert hm.sample(50, 25, 100, 100) == pytest.approx(5.0 + 2 * 5.0)
+    assert hm.sample(50, 50, 100, 100) == pytest.approx(5.0 + 2 * 15.0)
+    # Beyond the outer cell centers values are clamped to the edge
+    assert hm.sample(0, 0, 100, 100) == pytest.approx(5.0)
+    assert hm.sample(200, 100, 100, 100) == pytest.approx(5.0 + 2 * 30.0)
+
+
+def test_sampling_keeps_array_shape():
+    hm = Heightmap(np.arange(12, dtype=np.float32).reshape(3, 4))
+    px = np.array([[10.0, 20.0], [30.0, 39.0]])
+    z = hm.sample(px, px / 2, 40, 30)
+    assert z.shape == (2, 2)
+    assert z[0, 0] == pytest.approx(hm.sample(10.0, 5.0, 40, 30))
+
+
+def ridge_heightmap(height_m=100.0):
+    # 100 x 10 cells over a 1000 x 100 px map: a north-south ridge across x = 480..520 px
+    data = np.zeros((10, 100), dtype=np.float32)
+    data[:, 48:52] = height_m
+    return Heightmap(data)
+
+
+def test_ridge_blocks_low_arc_only():
+    hm = ridge_heightmap()
+    args = (hm, (100, 50), (900, 50), 1000, 100, 1.0, 0.0, 0.0)
+    # 8 s over 800 m peaks at ~78 m, below the ridge; 20 s peaks at ~490 m
+    blocked = find_obstruction(*args, tof_s=8.0)
+    assert blocked is not None
+    px, py, s, terrain, shell = blocked
+    assert 470 <= px <= 500 and py == pytest.approx(50)
+    assert s == pytest.approx(px - 100)
+    assert terrain + CLEARANCE_MARGIN_M > shell
+    assert find_obstruction(*args, tof_s=20.0) is None
+    assert find_obstruction(ridge_heightmap(0.0), *args[1:], tof_s=8.0) is None
+
+
+class FiringRingApp:
+    # Just enough of MortarApp for its ring choice and clearance fallback
+    ring_candidates = MortarApp.ring_candidates
+    ring_values = MortarApp.ring_values
+    get_best_ring = MortarApp.get_best_ring
+    get_firing_ring = MortarApp.get_firing_ring
+
+    def __init__(self, shell_table, heightmap):
+        self.shell_table = shell_table
+        self.weapon = SimpleNamespace(dz_correction_factor=DZ_CORRECTION_FACTOR, min_elevation_mil=0)
+        self.heightmap = heightmap
+        self.clearance_check = True
+        self.use_dense_tables = False
+        self.mortar, self.target = (100, 50), (900, 50)
+        self.map_width_px, self.map_height_px, self.m_per_px = 1000, 100, 1.0
+        self._best_ring_cache = (None, None)
+        self._firing_ring_cache = (None, None)
+
+    def get_weapon_table(self):
+        return self.weapon
+
+    def get_current_table(self):
+        return 'Test'
+
+    def get_current_shell(self):
+        return 'HE'
+
+    def get_current_shell_table(self):
+        return self.shell_table
+
+    def get_dense_shell_table(self):
+        return DenseShellTable(self.shell_table) if self.use_dense_tables else None
+
+
+def ring_rows(ring, tof_s):
+    return [{'Charge Rings': ring, 'Range (m)': r, 'Elevation (mil)': elev,
+             'Time of Flight (sec)': tof_s, 'Dispersion Radius (m)': 10.0}
+            for r, elev in ((500, 1200 - 100 * ring), (1000, 1100 - 100 * ring))]
+
+
+def test_firing_ring_falls_back_to_a_ring_that_clears():
+    table = ShellTable({0: ring_rows(0, 8.0), 1: ring_rows(1, 9.0), 2: ring_rows(2, 20.0)})
+    app = FiringRingApp(table, ridge_heightmap())
+    ring, entry, obstruction, blocked_rings = app.get_firing_ring(800.0, 0.0, 0.0, 0.0)
+    assert ring == 2 and entry is not None and obstruction is None
+    assert [r for r, _ in blocked_rings] == [0, 1]
+    # Without the check (or the terrain) the lowest ring is used as before
+    app = FiringRingApp(table, ridge_heightmap())
+    app.clearance_check = False
+    assert app.get_firing_ring(800.0, 0.0, 0.0, 0.0)[:3] == (0, table.best_ring(800.0, 0.0, min_elevation=0)[1], None)
+
+
+def test_firing_ring_uses_dense_grid_when_enabled():
+    table = ShellTable({0: ring_rows(0, 8.0), 1: ring_rows(1, 9.0), 2: ring_rows(2, 20.0)})
+    app = FiringRingApp(table, ridge_heightmap())
+    exact = app.get_firing_ring(800.0, 0.0, 0.0, 0.0)
+    app.use_dense_tables = True
+    dense = app.get_firing_ring(800.0, 0.0, 0.0, 0.0)
+    assert dense is not exact
+    assert dense[0] == exact[0] == 2 and dense[1] == table.bracket(2, 800.0)
+    # The dispersion comes from the grid; this table is linear, so both agree
+    assert app.ring_values(2, dense[1], 800.0) == pytest.approx(DenseShellTable(table).values(2, 800.0))
+
+
+def test_firing_ring_reports_first_obstruction_when_no_ring_clears():
+    table = ShellTable({0: ring_rows(0, 8.0), 1: ring_rows(1, 9.0)})
+    app = FiringRingApp(table, ridge_heightmap(1000.0))
+    ring, entry, obstruction, blocked_rings = app.get_firing_ring(800.0, 0.0, 0.0, 0.0)
+    assert (ring, entry) == (None, None)
+    assert [r for r, _ in blocked_rings] == [0, 1]
+    assert obstruction == blocked_rings[0][1]